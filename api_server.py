@@ -0,0 +1,534 @@
+# -*- coding: utf-8 -*-
+"""HTTP/JSON API к базе задач на asyncio (только стандартная библиотека).
+
+Запросы принимает цикл asyncio, а работа с SQLite идет в пулах потоков:
+чтение - в workers потоках на соединениях только для чтения из пула
+ConnectionManager (в режиме WAL они не ждут запись), запись - в одном
+потоке с отдельным соединением. Маршруты:
+
+    GET    /tasks?search=&status=&category=&limit=&after=&sort=&desc=1
+                                                            список в порядке (sort, id)
+    POST   /tasks                                           новая задача (JSON)
+    GET    /tasks/<id>
+    PATCH  /tasks/<id>                                      изменить поля задачи (JSON)
+    DELETE /tasks/<id>
+    GET    /search?q=&limit=&include_archive=1              поиск по релевантности
+    GET    /calendar/<ГГГГ-ММ-ДД>                           задачи и повторения серий на день
+    GET    /calendar/<ГГГГ-ММ>                              количество задач по дням
+    GET    /stats
+    GET    /series                                          серии повторяющихся задач
+    POST   /series                                          новая серия (JSON)
+    DELETE /series/<id>
+    PATCH  /series/<id>/<ГГГГ-ММ-ДД>                        статус одного повторения (JSON)
+    GET    /occurrences?from=&to=                           повторения серий в [from, to)
+
+Список листается по ключу: ответ содержит next - ключ последней задачи,
+который передается в after следующего запроса вместе с теми же sort и desc;
+страница выбирается по индексу с этого ключа, и ее стоимость не зависит от
+глубины. sort - id, title, due_date (по умолчанию), status или category.
+Повторения серий вычисляются только для запрошенного окна, поэтому окно
+/occurrences ограничено MAX_WINDOW_DAYS днями. Ответы на GET
+помечаются ETag с версией данных (Database.change_version) и датой; при совпадении
+If-None-Match сервер отвечает 304, не выполняя запрос.
+"""
+import asyncio
+import json
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from urllib.parse import parse_qsl, urlsplit
+
+from database import DEFAULT_SORT, SERIES_FIELDS, SORT_COLUMNS, Database, task_sort_key
+
+TASK_FIELDS = ("id", "title", "description", "due_date", "status", "category")
+DAY_FIELDS = ("id", "title", "description", "status", "category")
+OCCURRENCE_FIELDS = ("series_id", "date", "title", "description", "status", "category")
+# Поля тела POST /series и их типы
+SERIES_TYPES = {"title": str, "description": str, "category": str, "start_date": str, "frequency": str,
+                "interval": int, "weekdays": list, "month_day": int, "until_date": str, "count": int}
+TYPE_NAMES = {str: "строка", int: "число", list: "список"}
+MAX_WINDOW_DAYS = 366
+# Статус "Просрочено" принимается, но база пересчитывает его по дате
+STATUSES = ("Новая", "В процессе", "Выполнено", "Просрочено")
+CATEGORIES = ("Работа", "Учеба", "Личное", "Семья", "Общие")
+# id в SQLite - 64-битное целое; больший id вызвал бы OverflowError
+MAX_ID = 2**63 - 1
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+MAX_BODY = 2**20
+
+REASONS = {200: "OK", 201: "Created", 204: "No Content", 304: "Not Modified", 400: "Bad Request",
+           404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large",
+           500: "Internal Server Error"}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class NotModified(Exception):
+    """Данные не менялись с версии из If-None-Match"""
+
+
+def task_dict(row, fields=TASK_FIELDS):
+    return dict(zip(fields, row))
+
+
+def etag(version):
+    # Просрочка повторений серий вычисляется по текущей дате, без записи в базу
+    return f'"{version}-{date.today().isoformat()}"'
+
+
+def parse_iso_date(value, field):
+    try:
+        return date.fromisoformat(value).isoformat()
+    except (TypeError, ValueError):
+        raise HTTPError(400, f"{field}: ожидается дата ГГГГ-ММ-ДД") from None
+
+
+def parse_id(match, message):
+    """id из адреса; id вне диапазона SQLite - как несуществующий"""
+    value = int(match["id"])
+    if value > MAX_ID:
+        raise HTTPError(404, message)
+    return value
+
+
+def check_choice(fields, field, choices):
+    if field in fields and fields[field] not in choices:
+        raise HTTPError(400, f"{field}: одно из {', '.join(choices)}")
+
+
+def parse_limit(query, default=DEFAULT_LIMIT):
+    try:
+        limit = int(query.get("limit", default))
+    except ValueError:
+        raise HTTPError(400, "limit: ожидается число") from None
+    if not 1 <= limit <= MAX_LIMIT:
+        raise HTTPError(400, f"limit: от 1 до {MAX_LIMIT}")
+    return limit
+
+
+def parse_sort(query):
+    column = query.get("sort", DEFAULT_SORT[0])
+    if column not in SORT_COLUMNS:
+        raise HTTPError(400, f"sort: один из {', '.join(SORT_COLUMNS)}")
+    return column, query.get("desc") == "1"
+
+
+def format_after(row, column):
+    """Ключ страницы для строки: "значение,id" или "id" при sort=id"""
+    return ",".join(str(value) for value in task_sort_key(row, column))
+
+
+def parse_after(value, column):
+    """Ключ страницы "значение,id" (или "id") -> task_sort_key"""
+    try:
+        if column == "id":
+            sort_value, task_id = None, value
+        else:
+            # Значение (например, название) может содержать запятые, id - нет
+            sort_value, separator, task_id = value.rpartition(",")
+            if not separator:
+                raise ValueError
+        task_id = int(task_id)
+        if abs(task_id) > MAX_ID:
+            raise ValueError
+        if column == "id":
+            return (task_id,)
+        if column == "due_date":
+            sort_value = parse_iso_date(sort_value, "after")
+        return sort_value, task_id
+    except ValueError:
+        raise HTTPError(400, "after: ожидается ключ значение,id") from None
+
+
+def task_fields(body, required):
+    """Поля задачи из тела запроса с проверкой типов"""
+    if not isinstance(body, dict):
+        raise HTTPError(400, "ожидается объект JSON")
+    unknown = set(body) - set(TASK_FIELDS[1:])
+    if unknown:
+        raise HTTPError(400, f"неизвестные поля: {', '.join(sorted(unknown))}")
+    for field in required:
+        if field not in body:
+            raise HTTPError(400, f"{field}: обязательное поле")
+    for field, value in body.items():
+        if not isinstance(value, str) and not (field == "description" and value is None):
+            raise HTTPError(400, f"{field}: ожидается строка")
+    if "title" in body and not body["title"].strip():
+        raise HTTPError(400, "title: пустое название")
+    check_choice(body, "status", STATUSES)
+    check_choice(body, "category", CATEGORIES)
+    fields = dict(body)
+    if "due_date" in fields:
+        fields["due_date"] = parse_iso_date(fields["due_date"], "due_date")
+    return fields
+
+
+def series_dict(row):
+    series = dict(zip(SERIES_FIELDS, row))
+    series["weekdays"] = [int(day) for day in series["weekdays"].split(",")] if series["weekdays"] else []
+    return series
+
+
+def series_fields(body):
+    """Поля новой серии из тела запроса с проверкой типов"""
+    if not isinstance(body, dict):
+        raise HTTPError(400, "ожидается объект JSON")
+    unknown = set(body) - set(SERIES_TYPES)
+    if unknown:
+        raise HTTPError(400, f"неизвестные поля: {', '.join(sorted(unknown))}")
+    for field in ("title", "start_date", "frequency"):
+        if field not in body:
+            raise HTTPError(400, f"{field}: обязательное поле")
+    for field, value in body.items():
+        # bool - подкласс int, но числом здесь не считается
+        if value is not None and (not isinstance(value, SERIES_TYPES[field]) or isinstance(value, bool)):
+            raise HTTPError(400, f"{field}: ожидается {TYPE_NAMES[SERIES_TYPES[field]]}")
+    if not all(type(day) is int for day in body.get("weekdays") or ()):
+        raise HTTPError(400, "weekdays: ожидается список чисел")
+    if not body["title"].strip():
+        raise HTTPError(400, "title: пустое название")
+    if body.get("category") is not None:
+        check_choice(body, "category", CATEGORIES)
+    fields = dict(body)
+    for field in ("start_date", "until_date"):
+        if fields.get(field) is not None:
+            fields[field] = parse_iso_date(fields[field], field)
+    return fields
+
+
+# Обработчики чтения: (db, match, query) -> данные ответа
+def list_tasks(db, match, query):
+    limit = parse_limit(query)
+    sort = parse_sort(query)
+    after = parse_after(query["after"], sort[0]) if query.get("after") else None
+    rows = db.get_tasks_page(query.get("search", ""), query.get("status", "Все"),
+                             query.get("category", "Все"), after, limit + 1, sort)
+    # Лишняя строка показывает, есть ли следующая страница
+    more = len(rows) > limit
+    rows = rows[:limit]
+    next_key = format_after(rows[-1], sort[0]) if more else None
+    return {"tasks": [task_dict(row) for row in rows], "next": next_key}
+
+
+def get_task(db, match, query):
+    row = db.get_task(parse_id(match, "задача не найдена"))
+    if row is None:
+        raise HTTPError(404, "задача не найдена")
+    return task_dict(row)
+
+
+def search_tasks(db, match, query):
+    if not query.get("q", "").strip():
+        raise HTTPError(400, "q: пустой запрос")
+    rows = db.search_tasks(query["q"], parse_limit(query, 50), query.get("include_archive") == "1")
+    return {"tasks": [task_dict(row) for row in rows]}
+
+
+def day_tasks(db, match, query):
+    day = parse_iso_date(match["day"], "дата")
+    next_day = (date.fromisoformat(day) + timedelta(days=1)).isoformat()
+    return {"date": day, "tasks": [task_dict(row, DAY_FIELDS) for row in db.get_tasks_by_date(day)],
+            "occurrences": [task_dict(row, OCCURRENCE_FIELDS) for row in db.get_occurrences(day, next_day)]}
+
+
+def month_counts(db, match, query):
+    year, month = int(match["year"]), int(match["month"])
+    if not 1 <= month <= 12:
+        raise HTTPError(404, "нет такого месяца")
+    return {"year": year, "month": month, "days": db.get_month_day_counts(year, month)}
+
+
+def task_stats(db, match, query):
+    status_stats, category_stats = db.get_task_stats()
+    return {"status": status_stats, "category": category_stats}
+
+
+def list_series(db, match, query):
+    return {"series": [series_dict(row) for row in db.get_series()]}
+
+
+def list_occurrences(db, match, query):
+    for field in ("from", "to"):
+        if field not in query:
+            raise HTTPError(400, f"{field}: обязательный параметр")
+    start, end = parse_iso_date(query["from"], "from"), parse_iso_date(query["to"], "to")
+    if not 0 < (date.fromisoformat(end) - date.fromisoformat(start)).days <= MAX_WINDOW_DAYS:
+        raise HTTPError(400, f"to: позже from не больше чем на {MAX_WINDOW_DAYS} дней")
+    return {"occurrences": [task_dict(row, OCCURRENCE_FIELDS) for row in db.get_occurrences(start, end)]}
+
+
+# Обработчики записи: (db, match, body) -> (код, данные ответа)
+def create_task(db, match, body):
+    fields = task_fields(body, ("title", "due_date"))
+    with db.transaction():
+        task_id = db.add_task(fields["title"], fields.get("description", ""), fields["due_date"],
+                              fields.get("category", "Общие"))
+        if "status" in fields:
+            db.set_status_bulk([task_id], fields["status"])
+    return 201, task_dict(db.get_task(task_id))
+
+
+def update_task(db, match, body):
+    fields = task_fields(body, ())
+    task_id = parse_id(match, "задача не найдена")
+    with db.transaction():
+        row = db.get_task(task_id)
+        if row is None:
+            raise HTTPError(404, "задача не найдена")
+        task = dict(task_dict(row), **fields)
+        db.update_task(*(task[field] for field in TASK_FIELDS))
+        # Статус после записи может отличаться от переданного (просрочка)
+        row = db.get_task(task_id)
+    return 200, task_dict(row)
+
+
+def delete_task(db, match, body):
+    task_id = parse_id(match, "задача не найдена")
+    with db.transaction():
+        if db.get_task(task_id) is None:
+            raise HTTPError(404, "задача не найдена")
+        db.delete_task(task_id)
+    return 204, None
+
+
+def create_series(db, match, body):
+    fields = series_fields(body)
+    try:
+        series_id = db.add_series(
+            fields["title"], fields.get("description", ""), fields.get("category", "Общие"),
+            fields["start_date"], fields["frequency"], interval=fields.get("interval", 1),
+            weekdays=fields.get("weekdays") or (), month_day=fields.get("month_day"),
+            until_date=fields.get("until_date"), count=fields.get("count"))
+    except ValueError as e:
+        raise HTTPError(400, str(e)) from None
+    return 201, series_dict(db.get_series(series_id)[0])
+
+
+def delete_series(db, match, body):
+    if not db.delete_series(parse_id(match, "серия не найдена")):
+        raise HTTPError(404, "серия не найдена")
+    return 204, None
+
+
+def update_occurrence(db, match, body):
+    if not isinstance(body, dict) or set(body) != {"status"} or not isinstance(body["status"], str):
+        raise HTTPError(400, "ожидается объект JSON с полем status")
+    check_choice(body, "status", STATUSES)
+    series_id = parse_id(match, "нет такого повторения")
+    day = parse_iso_date(match["day"], "дата")
+    if not db.set_occurrence_status(series_id, day, body["status"]):
+        raise HTTPError(404, "нет такого повторения")
+    return 200, {"series_id": series_id, "date": day, "status": body["status"]}
+
+
+ROUTES = [
+    (re.compile(r"/tasks"), {"GET": list_tasks, "POST": create_task}),
+    (re.compile(r"/tasks/(?P<id>\d+)"), {"GET": get_task, "PATCH": update_task, "DELETE": delete_task}),
+    (re.compile(r"/search"), {"GET": search_tasks}),
+    (re.compile(r"/calendar/(?P<day>\d{4}-\d{2}-\d{2})"), {"GET": day_tasks}),
+    (re.compile(r"/calendar/(?P<year>\d{4})-(?P<month>\d{2})"), {"GET": month_counts}),
+    (re.compile(r"/stats"), {"GET": task_stats}),
+    (re.compile(r"/series"), {"GET": list_series, "POST": create_series}),
+    (re.compile(r"/series/(?P<id>\d+)"), {"DELETE": delete_series}),
+    (re.compile(r"/series/(?P<id>\d+)/(?P<day>\d{4}-\d{2}-\d{2})"), {"PATCH": update_occurrence}),
+    (re.compile(r"/occurrences"), {"GET": list_occurrences}),
+]
+
+
+class TaskServer:
+    """HTTP-сервер задач, встраиваемый в любой цикл asyncio.
+
+    start() открывает базу (с миграциями) и начинает принимать соединения,
+    close() останавливает прием и закрывает соединения с базой.
+    """
+
+    def __init__(self, db_path="tasks.db", host="127.0.0.1", port=8080, workers=4):
+        self.db_path = db_path
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.db = None
+        self.server = None
+        self._readers = None
+        self._writer = None
+        self._sweeper = None
+        self._local = threading.local()
+
+    async def start(self):
+        # Основное соединение готовит схему и держит общий менеджер соединений
+        self.db = Database(self.db_path)
+        self.db.prune_change_log()
+        # Каждому потоку чтения - свое соединение из пула
+        self.db.connections.readers = max(self.db.connections.readers, self.workers)
+        self._readers = ThreadPoolExecutor(self.workers, thread_name_prefix="api-read")
+        self._writer = ThreadPoolExecutor(1, thread_name_prefix="api-write")
+        self.server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        self._sweeper = asyncio.create_task(self._sweep_daily())
+        return self
+
+    async def serve_forever(self):
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def close(self):
+        self._sweeper.cancel()
+        self.server.close()
+        await self.server.wait_closed()
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._writer, self._close_writer)
+        self._writer.shutdown()
+        self._readers.shutdown()
+        self.db.close()
+
+    def _close_writer(self):
+        db = getattr(self._local, "db", None)
+        if db is not None:
+            db.close()
+
+    def _read(self, handler, match, query, if_none_match):
+        # Соединение из пула на время запроса; версия и данные читаются в
+        # одной транзакции, то есть из одного снимка базы
+        db = Database(self.db_path, read_only=True)
+        try:
+            with db.transaction():
+                version = db.change_version()
+                if if_none_match == etag(version):
+                    raise NotModified
+                return 200, handler(db, match, query), version
+        finally:
+            db.close()
+
+    def _writer_db(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            # Отдельное соединение, привязанное к потоку записи
+            db = self._local.db = Database(self.db_path, dedicated=True)
+        return db
+
+    def _write(self, handler, match, body):
+        db = self._writer_db()
+        status, data = handler(db, match, body)
+        return status, data, db.change_version()
+
+    async def _sweep_daily(self):
+        # Просроченные задачи отмечаются, а журнал изменений обрезается в начале каждых суток
+        loop = asyncio.get_running_loop()
+        while True:
+            now = datetime.now()
+            midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+            await asyncio.sleep((midnight - now).total_seconds() + 1)
+            await loop.run_in_executor(self._writer, self._sweep)
+
+    def _sweep(self):
+        db = self._writer_db()
+        db.sweep_overdue()
+        db.prune_change_log()
+
+    async def dispatch(self, method, target, headers, body):
+        url = urlsplit(target)
+        for pattern, handlers in ROUTES:
+            match = pattern.fullmatch(url.path)
+            if match:
+                break
+        else:
+            raise HTTPError(404, "нет такого адреса")
+        handler = handlers.get(method)
+        if handler is None:
+            raise HTTPError(405, f"метод {method} не поддерживается")
+
+        loop = asyncio.get_running_loop()
+        if method == "GET":
+            query = dict(parse_qsl(url.query))
+            return await loop.run_in_executor(self._readers, self._read, handler, match.groupdict(), query,
+                                              headers.get("if-none-match"))
+        try:
+            data = json.loads(body) if body else {}
+        except ValueError:
+            raise HTTPError(400, "тело запроса - не JSON") from None
+        return await loop.run_in_executor(self._writer, self._write, handler, match.groupdict(), data)
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request = await read_request(reader)
+                if request is None:
+                    break
+                method, target, version, headers, body = request
+                extra = {}
+                try:
+                    status, data, data_version = await self.dispatch(method, target, headers, body)
+                    extra["ETag"] = etag(data_version)
+                except NotModified:
+                    status, data = 304, None
+                    extra["ETag"] = headers["if-none-match"]
+                except HTTPError as e:
+                    status, data = e.status, {"error": str(e)}
+                except Exception as e:
+                    status, data = 500, {"error": f"{type(e).__name__}: {e}"}
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+                writer.write(response(status, data, extra, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except HTTPError as e:
+            writer.write(response(e.status, {"error": str(e)}, {}, False))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+async def read_request(reader):
+    """Разобрать запрос: (метод, адрес, версия, заголовки, тело) или None при закрытии"""
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        # Адрес должен быть в %-кодировке, но UTF-8 без нее тоже принимается
+        method, target, version = line.decode("utf-8", "replace").split()
+    except ValueError:
+        raise HTTPError(400, "неверная строка запроса") from None
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get("content-length", 0))
+    except ValueError:
+        raise HTTPError(400, "неверный Content-Length") from None
+    if length > MAX_BODY:
+        raise HTTPError(413, "слишком большое тело запроса")
+    body = await reader.readexactly(length) if length else b""
+    return method, target, version, headers, body
+
+
+def response(status, data, headers, keep_alive):
+    body = b"" if data is None else json.dumps(data, ensure_ascii=False).encode("utf-8")
+    lines = [f"HTTP/1.1 {status} {REASONS[status]}", f"Content-Length: {len(body)}",
+             "Connection: " + ("keep-alive" if keep_alive else "close")]
+    if data is not None:
+        lines.append("Content-Type: application/json; charset=utf-8")
+    lines.extend(f"{name}: {value}" for name, value in headers.items())
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body
+
+
+async def serve(db_path="tasks.db", host="127.0.0.1", port=8080, workers=4, started=None):
+    """Запустить сервер и обслуживать запросы до отмены задачи"""
+    server = await TaskServer(db_path, host, port, workers).start()
+    if started is not None:
+        started(server)
+    try:
+        await server.serve_forever()
+    finally:
+        await server.close()
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""Нагрузочный тест HTTP API (api_server.py).
+
+Сервер запускается отдельным процессом (python -m task_manager serve) на
+синтетической базе. Клиенты - concurrency соединений keep-alive на asyncio,
+каждое отправляет запросы одного сценария подряд в течение duration секунд.
+Для каждого сценария выводятся запросов в секунду и задержки p50 и p99.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_api --rows 100000 --concurrency 16 --duration 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from urllib.parse import quote
+
+from benchmarks.common import create_database, remove_database
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+async def request(reader, writer, method, path, headers=None, body=None):
+    lines = [f"{method} {path} HTTP/1.1", "Host: localhost"]
+    data = json.dumps(body).encode() if body is not None else b""
+    if data:
+        lines.append(f"Content-Length: {len(data)}")
+    lines.extend(f"{name}: {value}" for name, value in (headers or {}).items())
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode() + data)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    response_headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode().partition(":")
+        response_headers[name.strip().lower()] = value.strip()
+    payload = await reader.readexactly(int(response_headers.get("content-length", 0)))
+    return status, response_headers, payload
+
+
+class Scenario:
+    """Сценарий: next_request(state) -> (метод, адрес, заголовки, тело)"""
+
+    def __init__(self, name, next_request, expected=(200,)):
+        self.name = name
+        self.next_request = next_request
+        self.expected = expected
+
+
+def first_page(state):
+    return "GET", "/tasks?limit=100", None, None
+
+
+def deep_pages(state):
+    # Листание вперед по ключу next; в конце списка - с начала
+    after = state.get("next")
+    path = "/tasks?limit=100" + (f"&after={quote(after)}" if after else "")
+    return "GET", path, None, None
+
+
+def cached_stats(state):
+    headers = {"If-None-Match": state["etag"]} if "etag" in state else None
+    return "GET", "/stats", headers, None
+
+
+def search(state):
+    return "GET", "/search?q=" + quote(random.choice(["отчет", "проект", "deploy", "встреча"])), None, None
+
+
+def month(state):
+    return "GET", f"/calendar/2024-{random.randint(1, 12):02d}", None, None
+
+
+def set_status(state):
+    task_id = random.randint(1, state["rows"])
+    status = random.choice(["Новая", "В процессе", "Выполнено"])
+    return "PATCH", f"/tasks/{task_id}", None, {"status": status}
+
+
+SCENARIOS = [
+    Scenario("GET /tasks (1 стр.)", first_page),
+    Scenario("GET /tasks?after=", deep_pages),
+    Scenario("GET /stats, 304", cached_stats, (200, 304)),
+    Scenario("GET /search", search),
+    Scenario("GET /calendar/месяц", month),
+    Scenario("PATCH /tasks/<id>", set_status),
+]
+
+
+async def client(port, scenario, rows, deadline, latencies):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    state = {"rows": rows}
+    try:
+        while time.perf_counter() < deadline:
+            method, path, headers, body = scenario.next_request(state)
+            started = time.perf_counter()
+            status, response_headers, payload = await request(reader, writer, method, path, headers, body)
+            latencies.append(time.perf_counter() - started)
+            if status not in scenario.expected:
+                raise RuntimeError(f"{method} {path}: {status} {payload[:200]!r}")
+            if "etag" in response_headers:
+                state["etag"] = response_headers["etag"]
+            if path.startswith("/tasks?"):
+                state["next"] = json.loads(payload)["next"]
+    finally:
+        writer.close()
+
+
+async def load(port, scenario, rows, concurrency, duration):
+    latencies = []
+    started = time.perf_counter()
+    deadline = started + duration
+    await asyncio.gather(*(client(port, scenario, rows, deadline, latencies) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return (len(latencies) / elapsed, latencies[len(latencies) // 2] * 1000,
+            latencies[int(len(latencies) * 0.99)] * 1000)
+
+
+def run(rows, concurrency, duration, workers):
+    db = create_database(rows)
+    db.close()
+    env = dict(os.environ, PYTHONPATH=PROJECT_DIR)
+    server = subprocess.Popen([sys.executable, "-m", "task_manager", "--db", db.db_path, "serve", "--port", "0",
+                               "--workers", str(workers)], cwd=PROJECT_DIR, env=env, stdout=subprocess.PIPE,
+                              text=True)
+    try:
+        port = int(json.loads(server.stdout.readline())["listening"].rsplit(":", 1)[1])
+        print(f"\n{rows} задач, {concurrency} соединений, {workers} потоков чтения")
+        print(f"{'сценарий':>22} {'запросов/с':>11} {'p50, мс':>8} {'p99, мс':>8}")
+        for scenario in SCENARIOS:
+            rps, p50, p99 = asyncio.run(load(port, scenario, rows, concurrency, duration))
+            print(f"{scenario.name:>22} {rps:>11.0f} {p50:>8.1f} {p99:>8.1f}")
+    finally:
+        server.terminate()
+        server.wait()
+        remove_database(db)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+    run(args.rows, args.concurrency, args.duration, args.workers)
+
+
+if __name__ == "__main__":
+    main()
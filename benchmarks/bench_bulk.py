@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""Пакетная запись против commit на каждую строку.
+
+Вставляет одни и те же строки в пустую базу тремя способами: add_task с
+commit (и fsync) на каждую задачу, add_task внутри одного transaction() и
+add_tasks_bulk (executemany в одной транзакции). Выводит строк в секунду.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_bulk --rows 100000
+"""
+import argparse
+import time
+
+from benchmarks.common import create_database, remove_database, generate_rows
+
+
+def per_row(db, rows):
+    for title, description, due_date, status, category in rows:
+        db.add_task(title, description, due_date, category)
+
+
+def grouped(db, rows):
+    with db.transaction():
+        per_row(db, rows)
+
+
+def bulk(db, rows):
+    db.add_tasks_bulk(rows)
+
+
+METHODS = [
+    ("commit на строку", per_row),
+    ("transaction()", grouped),
+    ("add_tasks_bulk", bulk),
+]
+
+
+def run(count):
+    rows = list(generate_rows(count))
+    print(f"{count} задач")
+    print(f"{'способ':>18} {'время, с':>9} {'строк/с':>10}")
+    for name, insert in METHODS:
+        db = create_database(0)
+        try:
+            started = time.perf_counter()
+            insert(db, rows)
+            elapsed = time.perf_counter() - started
+            assert db.count_tasks() == count
+            print(f"{name:>18} {elapsed:>9.2f} {count / elapsed:>10.0f}")
+        finally:
+            remove_database(db)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    args = parser.parse_args()
+    run(args.rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""Журнал изменений: стоимость проверки в простое и задержка доставки.
+
+Писатель - отдельное соединение (как другой процесс или скрипт) - меняет
+случайные задачи с паузами; читатель каждые interval мс проверяет PRAGMA
+data_version и при ее смене применяет журнал к TaskStore. Выводятся
+стоимость проверки без изменений, задержка от фиксации изменения до его
+появления в хранилище и время apply_changes в зависимости от числа
+измененных задач.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_changes --rows 100000 --interval 500
+"""
+import argparse
+import random
+import threading
+import time
+
+from benchmarks.common import create_database, remove_database, measure
+from database import Database
+from task_store import TaskStore
+
+
+def writer(db_path, count, committed, rnd):
+    db = Database(db_path, dedicated=True)
+    try:
+        for _ in range(count):
+            time.sleep(rnd.uniform(0.2, 1.5))
+            task_id = rnd.randint(1, 1000)
+            db.set_status_bulk([task_id], rnd.choice(["В процессе", "Выполнено"]))
+            committed.append((task_id, time.perf_counter()))
+    finally:
+        db.close()
+
+
+def run(rows, interval, changes):
+    db = create_database(rows)
+    try:
+        store = TaskStore(db)
+        # Миллисекунды на 1000 вызовов - это микросекунды на вызов
+        idle_us = measure(lambda: [db.data_version() for _ in range(1000)])
+        print(f"\n{rows} задач, проверка каждые {interval} мс")
+        print(f"проверка data_version без изменений: {idle_us:.1f} мкс")
+
+        committed = []
+        thread = threading.Thread(target=writer, args=(db.db_path, changes, committed, random.Random(1)))
+        version = db.data_version()
+        thread.start()
+        latencies = []
+        while thread.is_alive() or len(latencies) < len(committed):
+            time.sleep(interval / 1000)
+            if db.data_version() == version:
+                continue
+            version = db.data_version()
+            task_ids = store.apply_changes() or set()
+            now = time.perf_counter()
+            latencies.extend(now - at for task_id, at in committed[len(latencies):] if task_id in task_ids)
+        latencies.sort()
+        print(f"задержка доставки ({len(latencies)} изменений): медиана {latencies[len(latencies) // 2] * 1000:.0f} мс, "
+              f"максимум {latencies[-1] * 1000:.0f} мс")
+
+        writer_db = Database(db.db_path, dedicated=True)
+        print(f"{'изменено задач':>15} {'apply_changes, мс':>18}")
+        for size in (1, 100, 10_000):
+            task_ids = random.Random(size).sample(range(1, rows + 1), size)
+
+            def change_and_apply():
+                writer_db.set_category_bulk(task_ids, random.choice(["Работа", "Личное"]))
+                started = time.perf_counter()
+                store.apply_changes()
+                return time.perf_counter() - started
+
+            timings = sorted(change_and_apply() for _ in range(5))
+            print(f"{size:>15} {timings[2] * 1000:>18.2f}")
+        writer_db.close()
+    finally:
+        remove_database(db)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--interval", type=int, default=500)
+    parser.add_argument("--changes", type=int, default=10)
+    args = parser.parse_args()
+    run(args.rows, args.interval, args.changes)
+
+
+if __name__ == "__main__":
+    main()
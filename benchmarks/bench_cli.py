@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""Время запуска командной строки python -m task_manager.
+
+Каждый замер - отдельный процесс от старта интерпретатора до выхода.
+Для сравнения запускается "python -c pass" (голый интерпретатор). Также
+проверяется, что команды не загружают tkinter и matplotlib.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_cli --sizes 1000 100000
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.common import create_database
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHECK_IMPORTS = ("import runpy, sys; sys.argv = ['task_manager'] + sys.argv[1:]\n"
+                 "try:\n"
+                 "    runpy.run_module('task_manager', run_name='__main__', alter_sys=True)\n"
+                 "except SystemExit:\n"
+                 "    pass\n"
+                 "heavy = [name for name in ('tkinter', 'matplotlib') if name in sys.modules]\n"
+                 "sys.stderr.write(' '.join(heavy))\n")
+
+
+def launch(args, directory):
+    env = dict(os.environ, PYTHONPATH=PROJECT_DIR)
+    started = time.perf_counter()
+    subprocess.run([sys.executable] + args, cwd=directory, env=env, check=True,
+                   stdout=subprocess.DEVNULL)
+    return time.perf_counter() - started
+
+
+def heavy_modules(command, directory):
+    env = dict(os.environ, PYTHONPATH=PROJECT_DIR)
+    return subprocess.run([sys.executable, "-c", CHECK_IMPORTS] + command, cwd=directory, env=env,
+                          check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                          text=True).stderr.split()
+
+
+def median_ms(values):
+    return sorted(values)[len(values) // 2] * 1000
+
+
+def run(sizes, repeat):
+    commands = [
+        ("python -c pass", ["-c", "pass"]),
+        ("stats", ["-m", "task_manager", "stats"]),
+        ("list --limit 100", ["-m", "task_manager", "list", "--limit", "100"]),
+        ("search отчет", ["-m", "task_manager", "search", "отчет"]),
+        ("add", ["-m", "task_manager", "add", "Задача", "--due", "01.01.2025"]),
+    ]
+    for size in sizes:
+        directory = tempfile.mkdtemp()
+        try:
+            db = create_database(size, directory)
+            db.close()
+            os.replace(db.db_path, os.path.join(directory, "tasks.db"))
+
+            print(f"\n{size} задач")
+            print(f"{'команда':>18} {'запуск, мс':>11} {'tkinter/matplotlib':>19}")
+            for name, args in commands:
+                elapsed = median_ms([launch(args, directory) for _ in range(repeat)])
+                heavy = heavy_modules(args[2:], directory) if args[0] == "-m" else []
+                print(f"{name:>18} {elapsed:>11.0f} {', '.join(heavy) or 'нет':>19}")
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=9)
+    args = parser.parse_args()
+    run(args.sizes, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""Настройки соединений: журнал по умолчанию против WAL и PRAGMAS.
+
+1. Открытие окна редактирования: прежний путь (новое соединение с базой на
+   каждый двойной щелчок) против соединения из пула и TaskStore.
+2. Параллельные чтение и запись: несколько потоков читают страницы списка
+   и счетчики месяца, один поток обновляет задачи с commit на каждую.
+   Сравниваются журнал отката с настройками по умолчанию и WAL с PRAGMAS.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_connections --size 100000 --readers 4 --seconds 3
+"""
+import argparse
+import random
+import sqlite3
+import threading
+import time
+
+from benchmarks.common import create_database, remove_database, measure
+from connections import configure
+from task_store import TaskStore
+
+READ_QUERIES = [
+    ("SELECT id, title, description, due_date, status, category FROM tasks "
+     "WHERE (due_date, id) > (?, 0) ORDER BY due_date, id LIMIT 50", lambda rnd: (f"2024-{rnd.randint(1, 12):02d}-01",)),
+    ("SELECT due_date, status, COUNT(*) FROM tasks WHERE due_date BETWEEN ? AND ? GROUP BY due_date, status",
+     lambda rnd: (f"2024-{rnd.randint(1, 12):02d}-01", f"2024-{rnd.randint(1, 12):02d}-31")),
+]
+
+
+def edit_dialog_latency(db, store, repeat):
+    task_ids = random.Random(1).sample(range(1, store.count_tasks() + 1), repeat)
+    select = "SELECT * FROM tasks WHERE id = ?"
+
+    def fresh_connection():
+        for task_id in task_ids:
+            conn = sqlite3.connect(db.db_path)
+            conn.execute(select, (task_id,)).fetchone()
+            conn.close()
+
+    def pooled():
+        for task_id in task_ids:
+            with db.connections.reader() as conn:
+                conn.execute(select, (task_id,)).fetchone()
+
+    def in_memory():
+        for task_id in task_ids:
+            store.get_task(task_id)
+
+    print(f"\nОткрытие окна редактирования (мкс на задачу, {repeat} задач)")
+    for name, func in (("новое соединение", fresh_connection), ("пул чтения", pooled),
+                       ("TaskStore", in_memory)):
+        print(f"{name:>18} {measure(func, 5) * 1000 / repeat:>10.1f}")
+
+
+def contention(path, connect, readers, seconds):
+    stop = threading.Event()
+    reads = [0] * readers
+    writes = [0]
+    errors = [0]
+
+    def reader(index):
+        rnd = random.Random(index)
+        conn = connect(path, True)
+        while not stop.is_set():
+            sql, params = rnd.choice(READ_QUERIES)
+            try:
+                conn.execute(sql, params(rnd)).fetchall()
+                reads[index] += 1
+            except sqlite3.OperationalError:
+                errors[0] += 1
+        conn.close()
+
+    def writer():
+        rnd = random.Random(0)
+        conn = connect(path, False)
+        total = conn.execute("SELECT MAX(id) FROM tasks").fetchone()[0]
+        while not stop.is_set():
+            try:
+                conn.execute("UPDATE tasks SET status = ? WHERE id = ?",
+                             (rnd.choice(["Новая", "В процессе", "Выполнено"]), rnd.randint(1, total)))
+                conn.commit()
+                writes[0] += 1
+            except sqlite3.OperationalError:
+                conn.rollback()
+                errors[0] += 1
+        conn.close()
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    threads.append(threading.Thread(target=writer))
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return sum(reads) / seconds, writes[0] / seconds, errors[0]
+
+
+def default_connect(path, read_only):
+    return sqlite3.connect(path, check_same_thread=False)
+
+
+def tuned_connect(path, read_only):
+    if read_only:
+        return configure(sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False))
+    return configure(sqlite3.connect(path, check_same_thread=False))
+
+
+def run(size, readers, seconds):
+    db = create_database(size)
+    try:
+        store = TaskStore(db)
+        edit_dialog_latency(db, store, 1000)
+        path = db.db_path
+        db.close()
+
+        print(f"\nПараллельно: {readers} потоков чтения, 1 поток записи, {seconds} с")
+        print(f"{'режим':>18} {'чтений/с':>10} {'записей/с':>10} {'ошибок':>7}")
+        for name, journal, connect in (("журнал отката", "DELETE", default_connect),
+                                       ("WAL + PRAGMAS", "WAL", tuned_connect)):
+            conn = sqlite3.connect(path)
+            conn.execute(f"PRAGMA journal_mode = {journal}")
+            conn.close()
+            read_rate, write_rate, errors = contention(path, connect, readers, seconds)
+            print(f"{name:>18} {read_rate:>10.0f} {write_rate:>10.0f} {errors:>7}")
+    finally:
+        remove_database(db)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=100_000)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=3)
+    args = parser.parse_args()
+    run(args.size, args.readers, args.seconds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""Скорость импорта CSV в формате экспорта.
+
+Файл готовится экспортом синтетической базы. Замеряются: проверка файла
+без записи (dry-run), импорт в пустую базу (новые задачи, отложенная
+индексация FTS и счетчиков) и upsert по ID: в исходную базу (задачи
+совпадают, запись пропускается) и в базу из предыдущего шага (у задач с теми
+же ID другие данные, каждая строка переписывается). Выводит строк в секунду.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_import --rows 100000 1000000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import csv_io
+from benchmarks.common import create_database, remove_database
+
+
+def timed(func):
+    started = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - started
+
+
+def run(sizes):
+    for size in sizes:
+        source = create_database(size)
+        fd, filename = tempfile.mkstemp(suffix=".csv")
+        os.close(fd)
+        target = create_database(0)
+        try:
+            csv_io.export_tasks(source, filename)
+            print(f"\n{size} строк, файл {os.path.getsize(filename) / 2**20:.0f} МБ")
+            print(f"{'режим':>22} {'время, с':>9} {'строк/с':>10}")
+            steps = [
+                ("проверка (dry-run)", lambda: csv_io.import_tasks(target, filename, dry_run=True)),
+                ("импорт в пустую базу", lambda: csv_io.import_tasks(target, filename)),
+                ("upsert, без изменений", lambda: csv_io.import_tasks(source, filename, upsert=True)),
+                ("upsert, все изменены", lambda: csv_io.import_tasks(target, filename, upsert=True)),
+            ]
+            for name, step in steps:
+                result, elapsed = timed(step)
+                rows = result.inserted + result.updated
+                assert rows == size and not result.errors
+                print(f"{name:>22} {elapsed:>9.2f} {rows / elapsed:>10.0f}")
+            assert target.count_tasks() == size
+        finally:
+            remove_database(source)
+            remove_database(target)
+            os.unlink(filename)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000])
+    args = parser.parse_args()
+    run(args.rows)
+
+
+if __name__ == "__main__":
+    main()
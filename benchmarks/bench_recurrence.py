@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""Повторяющиеся задачи: стоимость развертывания окна при разной длине серий.
+
+Для каждой длины истории добавляются три серии (ежедневная, по понедельникам,
+средам и пятницам, ежемесячная), начавшиеся столько лет назад, и каждое
+третье прошедшее повторение отмечается выполненным (исключения). Выводятся
+число повторений, которые пришлось бы хранить копиями, число исключений и
+время выборок календаря: повторения на месяц и на день и счетчики месяца
+TaskStore.get_month_day_counts вместе с задачами. Время не должно расти с
+длиной истории.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_recurrence --rows 100000 --years 1 10 50
+"""
+import argparse
+from datetime import date, timedelta
+
+from benchmarks.common import create_database, remove_database, measure
+from database import month_range
+from recurrence import make_rule, occurrences
+from task_store import TaskStore
+
+SERIES = [
+    ("Зарядка", "daily", {}),
+    ("Планерка", "weekly", {"weekdays": (0, 2, 4)}),
+    ("Отчет", "monthly", {"month_day": 31}),
+]
+
+
+def add_series(db, years, today):
+    """Серии длиной years лет до today; возвращает (повторений, исключений)"""
+    start = date(today.year - years, today.month, 1)
+    total = marked = 0
+    with db.transaction():
+        for title, frequency, rule in SERIES:
+            series_id = db.add_series(title, "", "Общие", start.isoformat(), frequency, **rule)
+            for number, day in enumerate(occurrences(make_rule(start, frequency, **rule), start, today)):
+                total += 1
+                if number % 3 == 0:
+                    db.set_occurrence_status(series_id, day.isoformat(), "Выполнено")
+                    marked += 1
+    return total, marked
+
+
+def run(rows, years_list, repeat):
+    db = create_database(rows)
+    try:
+        store = TaskStore(db)
+        today = date.today()
+        month_start, month_end = month_range(today.year, today.month)
+        day = today.isoformat()
+        next_day = (today + timedelta(days=1)).isoformat()
+
+        print(f"\n{rows} задач, {len(SERIES)} серии, окно - {today.year}-{today.month:02d}")
+        print(f"{'лет':>4} {'повторений':>11} {'исключений':>11} {'месяц, мс':>10} {'день, мс':>9} "
+              f"{'счетчики, мс':>13}")
+        for years in years_list:
+            total, marked = add_series(db, years, today)
+            month_ms = measure(lambda: db.get_occurrences(month_start, month_end), repeat)
+            day_ms = measure(lambda: db.get_occurrences(day, next_day), repeat)
+            counts_ms = measure(lambda: store.get_month_day_counts(today.year, today.month), repeat)
+            print(f"{years:>4} {total:>11} {marked:>11} {month_ms:>10.3f} {day_ms:>9.3f} {counts_ms:>13.3f}")
+            for series_id, *_ in db.get_series():
+                db.delete_series(series_id)
+    finally:
+        remove_database(db)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--years", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    run(args.rows, args.years, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""Сравнение задержки поиска: FTS5 против LIKE '%term%'.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_search --sizes 10000 100000 1000000
+"""
+import argparse
+
+from benchmarks.common import create_database, remove_database, measure
+
+SEARCH_TERMS = ["отчет", "кварт", "deploy rev", "клиент договор"]
+
+
+def run(sizes, repeat):
+    print(f"{'строк':>10} {'запрос':>18} {'LIKE, мс':>10} {'FTS5, мс':>10} {'ускорение':>10}")
+    for size in sizes:
+        db = create_database(size)
+        try:
+            if not db.fts_enabled:
+                print("FTS5 недоступен в этой сборке SQLite, сравнение невозможно")
+                return
+            for term in SEARCH_TERMS:
+                db.fts_enabled = False
+                like_ms = measure(lambda: db.get_all_tasks(term), repeat)
+                db.fts_enabled = True
+                fts_ms = measure(lambda: db.get_all_tasks(term), repeat)
+                print(f"{size:>10} {term:>18} {like_ms:>10.2f} {fts_ms:>10.2f} {like_ms / fts_ms:>9.1f}x")
+            ranked_ms = measure(lambda: db.search_tasks(SEARCH_TERMS[0]), repeat)
+            print(f"{size:>10} {'bm25 top-50':>18} {'':>10} {ranked_ms:>10.2f}")
+        finally:
+            remove_database(db)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    run(args.sizes, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""Колоночный снимок против CSV для выгрузки всей таблицы задач.
+
+Для каждого размера базы: время записи и размер файла CSV, снимка без
+сжатия и со сжатием; время загрузки для анализа (CSV - разбор всех строк,
+снимок - отображение в память или распаковка) и время типичного запроса
+по загруженным данным: число задач по месяцам и статусам.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_snapshot --sizes 100000 1000000
+"""
+import argparse
+import csv
+import os
+import tempfile
+import time
+from collections import Counter
+
+import numpy as np
+
+import csv_io
+import snapshot
+from benchmarks.common import create_database, remove_database
+
+
+def timed(func):
+    started = time.perf_counter()
+    result = func()
+    return result, (time.perf_counter() - started) * 1000
+
+
+def load_csv(filename):
+    with open(filename, newline='', encoding='utf-8') as f:
+        reader = csv.reader(f, delimiter=';')
+        next(reader)
+        return list(reader)
+
+
+def csv_month_counts(rows):
+    return Counter((row[3][3:], row[4]) for row in rows)
+
+
+def snapshot_month_counts(tasks):
+    months = tasks.due_dates().astype("datetime64[M]").astype(np.int64)
+    keys = months * len(tasks.status_values) + tasks.status
+    values, counts = np.unique(keys, return_counts=True)
+    return dict(zip(values.tolist(), counts.tolist()))
+
+
+def run(sizes):
+    for size in sizes:
+        db = create_database(size)
+        directory = tempfile.mkdtemp()
+        paths = {name: os.path.join(directory, name) for name in ("tasks.csv", "plain.npz", "packed.npz")}
+        try:
+            print(f"\n{size} задач")
+            print(f"{'формат':>18} {'запись, мс':>11} {'МБ':>6} {'загрузка, мс':>13} {'запрос, мс':>11}")
+
+            _, write_ms = timed(lambda: csv_io.export_tasks(db, paths["tasks.csv"]))
+            rows, load_ms = timed(lambda: load_csv(paths["tasks.csv"]))
+            _, query_ms = timed(lambda: csv_month_counts(rows))
+            del rows
+            size_mb = os.path.getsize(paths["tasks.csv"]) / 2**20
+            print(f"{'CSV':>18} {write_ms:>11.0f} {size_mb:>6.1f} {load_ms:>13.1f} {query_ms:>11.1f}")
+
+            for name, label, compressed in (("plain.npz", "снимок (mmap)", False),
+                                            ("packed.npz", "снимок, сжатый", True)):
+                _, write_ms = timed(lambda: snapshot.write_snapshot(db, paths[name], compressed=compressed))
+                tasks, load_ms = timed(lambda: snapshot.load_snapshot(paths[name]))
+                _, query_ms = timed(lambda: snapshot_month_counts(tasks))
+                del tasks
+                size_mb = os.path.getsize(paths[name]) / 2**20
+                print(f"{label:>18} {write_ms:>11.0f} {size_mb:>6.1f} {load_ms:>13.1f} {query_ms:>11.1f}")
+        finally:
+            remove_database(db)
+            for path in paths.values():
+                if os.path.exists(path):
+                    os.unlink(path)
+            os.rmdir(directory)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    args = parser.parse_args()
+    run(args.sizes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""Время холодного запуска приложения до первого интерактивного окна.
+
+Каждый замер - отдельный процесс: import task_manager, создание окна и
+root.update() (окно отрисовано и готово к вводу). Режим "до" воспроизводит
+прежний запуск: pyplot и backend_tkagg импортируются при загрузке модуля,
+а вкладка статистики строится и рисуется сразу. Режим "после" - текущий,
+с отложенной вкладкой. Без дисплея меряется только время импорта.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_startup --sizes 1000 100000
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.common import create_database
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r"""
+import json, sys, time
+started = time.perf_counter()
+eager = sys.argv[1] == "eager"
+if eager:
+    import matplotlib.pyplot, matplotlib.backends.backend_tkagg, charts
+import tkinter as tk
+import task_manager
+result = {"import": time.perf_counter() - started}
+try:
+    root = tk.Tk()
+except tk.TclError:
+    print(json.dumps(result))
+    sys.exit()
+app = task_manager.TaskManagerApp(root)
+if eager:
+    app.create_stats_tab()
+    app.update_stats()
+root.update()
+result["window"] = time.perf_counter() - started
+root.destroy()
+print(json.dumps(result))
+"""
+
+
+def launch(directory, mode):
+    env = dict(os.environ, PYTHONPATH=PROJECT_DIR)
+    output = subprocess.run([sys.executable, "-c", CHILD, mode], cwd=directory, env=env,
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output)
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2] * 1000 if values else None
+
+
+def run(sizes, repeat):
+    for size in sizes:
+        directory = tempfile.mkdtemp()
+        try:
+            db = create_database(size, directory)
+            db.close()
+            os.replace(db.db_path, os.path.join(directory, "tasks.db"))
+
+            print(f"\n{size} задач")
+            print(f"{'режим':>8} {'импорт, мс':>11} {'окно, мс':>10}")
+            for mode, title in (("eager", "до"), ("lazy", "после")):
+                runs = [launch(directory, mode) for _ in range(repeat)]
+                import_ms = median([r["import"] for r in runs])
+                window_ms = median([r["window"] for r in runs if "window" in r])
+                window = f"{window_ms:>10.0f}" if window_ms is not None else f"{'нет дисплея':>10}"
+                print(f"{title:>8} {import_ms:>11.0f} {window}")
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    run(args.sizes, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""Хранилище задач в памяти против прямых запросов к SQLite.
+
+Для каждого размера базы выводит объем памяти TaskStore и задержку
+основных путей чтения (список, календарь, статистика).
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_store --sizes 10000 100000 1000000
+"""
+import argparse
+import time
+import tracemalloc
+
+from benchmarks.common import create_database, remove_database, measure
+from task_store import TaskStore
+
+READ_PATHS = [
+    ("список, 1-я страница", lambda source: source.get_tasks_paged()[:30]),
+    ("список, фильтр статуса", lambda source: source.get_all_tasks(status_filter="В процессе")),
+    ("список, статус+категория",
+     lambda source: source.get_all_tasks(status_filter="Новая", category_filter="Учеба")),
+    ("месяц календаря", lambda source: source.get_month_day_counts(2024, 3)),
+    ("день календаря", lambda source: source.get_tasks_by_date("2024-03-15")),
+    ("статистика", lambda source: source.get_task_stats()),
+]
+
+
+def run(sizes, repeat):
+    for size in sizes:
+        db = create_database(size)
+        try:
+            started = time.perf_counter()
+            store = TaskStore(db)
+            load_ms = (time.perf_counter() - started) * 1000
+
+            # Память меряется отдельной загрузкой: tracemalloc замедляет ее в разы
+            tracemalloc.start()
+            measured = TaskStore(db)
+            memory = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            del measured
+
+            print(f"\n{size} задач: загрузка {load_ms:.0f} мс, "
+                  f"память {memory / 2**20:.1f} МБ ({memory / size:.0f} байт на задачу)")
+            print(f"{'запрос':>26} {'SQLite, мс':>11} {'память, мс':>11} {'ускорение':>10}")
+            for name, read in READ_PATHS:
+                sql_ms = measure(lambda: read(db), repeat)
+                store_ms = measure(lambda: read(store), repeat)
+                print(f"{name:>26} {sql_ms:>11.3f} {store_ms:>11.3f} {sql_ms / store_ms:>9.1f}x")
+        finally:
+            remove_database(db)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    run(args.sizes, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
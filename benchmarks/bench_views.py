@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""Переключение сохраненных видов: запрос к базе против кэша результатов.
+
+Для каждого вида (поиск с фильтрами и сортировкой) сравнивается полный
+запрос Database.get_all_tasks и повторное открытие того же вида через
+ResultCache: проверка версии данных и строки из TaskStore по id.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_views --sizes 100000 1000000
+"""
+import argparse
+
+from benchmarks.common import create_database, remove_database, measure
+from database import ResultCache
+from task_store import TaskStore
+
+VIEWS = [
+    ("отчет", "Все", "Все", ("due_date", False)),
+    ("проект", "Выполнено", "Все", ("title", True)),
+    ("deploy", "Все", "Работа", ("id", False)),
+    ("встреча", "Просрочено", "Личное", ("category", False)),
+]
+
+
+def open_cached(db, store, cache, view):
+    task_ids = cache.get(view, db.change_version())
+    return [store.get_task(task_id) for task_id in task_ids]
+
+
+def run(sizes, repeat):
+    for size in sizes:
+        db = create_database(size)
+        try:
+            store = TaskStore(db)
+            cache = ResultCache()
+            for view in VIEWS:
+                cache.put(view, db.change_version(), (row[0] for row in db.get_all_tasks(*view)))
+
+            print(f"\n{size} задач")
+            print(f"{'вид':>40} {'задач':>7} {'запрос, мс':>11} {'кэш, мс':>9}")
+            for view in VIEWS:
+                count = len(open_cached(db, store, cache, view))
+                query_ms = measure(lambda: db.get_all_tasks(*view), repeat)
+                cached_ms = measure(lambda: open_cached(db, store, cache, view), repeat)
+                name = f"{view[0]}, {view[1]}, {view[2]}, {view[3][0]}"
+                print(f"{name:>40} {count:>7} {query_ms:>11.2f} {cached_ms:>9.2f}")
+        finally:
+            remove_database(db)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    run(args.sizes, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
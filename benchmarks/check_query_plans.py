@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""Проверка планов запросов: каждый горячий запрос Database использует индекс.
+
+Запросы перехватываются через trace callback во время вызова методов
+Database, поэтому проверяется именно тот SQL, который выполняет приложение.
+
+Запуск из корня проекта:
+    python -m benchmarks.check_query_plans
+"""
+import sys
+
+from benchmarks.common import create_database, remove_database
+
+def read_pages(result):
+    """Дочитывает первую и следующую (keyset) страницы результата"""
+    return result[0], result[result.page_size]
+
+
+HOT_CALLS = [
+    ("get_all_tasks()", lambda db: db.get_all_tasks()),
+    ("get_all_tasks(search)", lambda db: db.get_all_tasks("отчет")),
+    ("get_all_tasks(status)", lambda db: db.get_all_tasks(status_filter="Выполнено")),
+    ("get_all_tasks(category)", lambda db: db.get_all_tasks(category_filter="Работа")),
+    ("get_all_tasks(status, category)",
+     lambda db: db.get_all_tasks(status_filter="Новая", category_filter="Учеба")),
+    ("get_tasks_paged", lambda db: read_pages(db.get_tasks_paged(page_size=100))),
+    ("get_tasks_paged(status)",
+     lambda db: read_pages(db.get_tasks_paged(status_filter="Просрочено", page_size=100))),
+    ("get_tasks_paged(sort=title desc)",
+     lambda db: read_pages(db.get_tasks_paged(page_size=100, sort=("title", True)))),
+    ("get_tasks_paged(sort=category)",
+     lambda db: read_pages(db.get_tasks_paged(page_size=100, sort=("category", False)))),
+    ("get_tasks_paged(status, sort=title)",
+     lambda db: read_pages(db.get_tasks_paged(status_filter="Выполнено", page_size=100,
+                                              sort=("title", False)))),
+    ("get_tasks_paged(category, sort=status desc)",
+     lambda db: read_pages(db.get_tasks_paged(category_filter="Работа", page_size=100,
+                                              sort=("status", True)))),
+    ("get_tasks_by_date", lambda db: db.get_tasks_by_date("2024-03-15")),
+    ("get_tasks_by_month", lambda db: db.get_tasks_by_month(2024, 3)),
+    ("get_month_day_counts", lambda db: db.get_month_day_counts(2024, 3)),
+    ("get_task_stats", lambda db: db.get_task_stats()),
+]
+
+
+def find_problems(plan, paged=False):
+    """Возвращает строки плана с полным сканированием tasks или сортировкой.
+
+    Для страницы (запрос с LIMIT) сортировкой считается и ORDER BY: страница
+    должна читаться по индексу в порядке ключа, без сортировки всей выборки.
+    """
+    problems = []
+    for row in plan:
+        detail = row[-1]
+        if detail.startswith("SCAN tasks") and "INDEX" not in detail:
+            problems.append(detail)
+        elif "USE TEMP B-TREE FOR GROUP BY" in detail:
+            problems.append(detail)
+        elif paged and "USE TEMP B-TREE" in detail and "ORDER BY" in detail:
+            problems.append(detail)
+    return problems
+
+
+def check(db):
+    failed = False
+    for name, call in HOT_CALLS:
+        statements = []
+        db.conn.set_trace_callback(statements.append)
+        try:
+            call(db)
+        finally:
+            db.conn.set_trace_callback(None)
+
+        for sql in statements:
+            if not sql.lstrip().upper().startswith("SELECT"):
+                continue
+            plan = db.conn.execute("EXPLAIN QUERY PLAN " + sql).fetchall()
+            problems = find_problems(plan, paged="LIMIT" in sql)
+            print(f"[{'FAIL' if problems else ' OK '}] {name}")
+            for row in plan:
+                print(f"         {row[-1]}")
+            failed = failed or bool(problems)
+    return not failed
+
+
+def main():
+    db = create_database(10_000)
+    try:
+        # Без статистики планировщик может предпочесть сканирование
+        db.conn.execute("ANALYZE")
+        ok = check(db)
+    finally:
+        remove_database(db)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""Общие утилиты для бенчмарков: генерация тестовой базы и замер времени"""
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+from database import Database
+
+WORDS = [
+    "отчет", "квартал", "встреча", "клиент", "проект", "бюджет", "план", "звонок",
+    "документ", "договор", "презентация", "ремонт", "покупка", "экзамен", "лекция",
+    "курсовая", "тренировка", "врач", "подарок", "поездка", "release", "deploy",
+    "review", "backup", "invoice", "meeting", "design", "refactor", "support", "sprint",
+]
+SYLLABLES = ["ка", "ло", "ми", "ре", "ту", "за", "пи", "но", "вер", "дат", "ст", "ор", "ба", "ки", "ну"]
+STATUSES = ["Новая", "В процессе", "Выполнено"]
+CATEGORIES = ["Работа", "Учеба", "Личное", "Семья", "Общие"]
+
+
+def generate_rows(count, seed=42, start=date(2023, 1, 1), days=3 * 365):
+    """Генерирует строки (title, description, due_date, status, category)"""
+    rnd = random.Random(seed)
+    # Словарь из тысяч "слов", чтобы поисковые термины были избирательными,
+    # а слова из WORDS встречались примерно в каждой десятой задаче
+    vocabulary = sorted({"".join(rnd.choices(SYLLABLES, k=rnd.randint(3, 5))) for _ in range(20000)})
+
+    def text(words):
+        return " ".join(rnd.choice(WORDS) if rnd.random() < 0.03 else rnd.choice(vocabulary)
+                        for _ in range(words))
+
+    for _ in range(count):
+        title = text(rnd.randint(2, 4))
+        description = text(rnd.randint(0, 12))
+        due_date = (start + timedelta(days=rnd.randrange(days))).isoformat()
+        yield title, description, due_date, rnd.choice(STATUSES), rnd.choice(CATEGORIES)
+
+
+def create_database(count, directory=None, seed=42):
+    """Создает временную базу с count задачами и возвращает открытый Database"""
+    fd, path = tempfile.mkstemp(suffix=".db", dir=directory)
+    os.close(fd)
+    os.unlink(path)
+    db = Database(path)
+    # Вставка с отложенной индексацией: иначе триггеры (в том числе
+    # просрочки - почти все даты в прошлом) срабатывают на каждую строку
+    with db.deferred_indexing():
+        db.add_tasks_bulk(generate_rows(count, seed))
+    return db
+
+
+def remove_database(db):
+    """Закрывает соединение и удаляет файлы временной базы"""
+    db.close()
+    for suffix in ("", "-wal", "-shm", "-journal"):
+        try:
+            os.unlink(db.db_path + suffix)
+        except FileNotFoundError:
+            pass
+
+
+def measure(func, repeat=5):
+    """Возвращает медианное время выполнения func в миллисекундах"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2]
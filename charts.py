@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""Диаграммы вкладки статистики.
+
+Модуль импортирует matplotlib, поэтому task_manager загружает его только при
+первом открытии вкладки. Используется Agg напрямую, без backend_tkagg и
+pyplot: картинка рисуется в память и выводится на tk.Canvas как PhotoImage.
+"""
+import math
+import tkinter as tk
+
+import numpy as np
+from matplotlib import colormaps
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.colors import TABLEAU_COLORS
+from matplotlib.figure import Figure
+
+BACKGROUND = '#f5f7fa'
+
+
+def status_colors(count):
+    return ['#3498db', '#2ecc71', '#e74c3c', '#f39c12', '#9b59b6'][:count]
+
+
+def category_colors(count):
+    # Генерируем цвета на основе количества категорий
+    colors = list(TABLEAU_COLORS.values())
+    if count > len(colors):
+        colors = list(colormaps['tab20'].colors)
+    return colors[:count]
+
+
+class PieChart:
+    """Круговая диаграмма вкладки статистики.
+
+    Figure и холст создаются один раз. Если набор подписей не изменился,
+    у существующих секторов меняются только углы и тексты; иначе диаграмма
+    перестраивается на том же Figure. Те же данные не перерисовываются.
+    """
+    STARTANGLE = 90
+    LABEL_DISTANCE = 1.1
+    PCT_DISTANCE = 0.6
+
+    def __init__(self, parent, title, title_size, dpi, colors, explode=0.0):
+        self.title = title
+        self.title_size = title_size
+        self.colors = colors
+        self.explode = explode
+        self.stats = None
+        self.wedges, self.texts, self.autotexts = [], [], []
+        self.image = None
+        self._render_id = None
+
+        self.figure = Figure(figsize=(6, 4), dpi=dpi, facecolor=BACKGROUND)
+        self.ax = self.figure.add_subplot(111, facecolor=BACKGROUND)
+        self.agg = FigureCanvasAgg(self.figure)
+
+        # Размер холста задает упаковка, а не картинка - иначе окно
+        # растягивалось бы под каждый новый рисунок
+        width, height = self.agg.get_width_height()
+        self.widget = tk.Canvas(parent, width=width, height=height, bg=BACKGROUND, highlightthickness=0)
+        self.widget.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        self.image_item = self.widget.create_image(0, 0, anchor=tk.NW)
+        self.widget.bind("<Configure>", self.on_resize)
+
+    @staticmethod
+    def format_pct(pct, total):
+        return f'{pct:.1f}%\n({round(pct*total/100)})'
+
+    def update(self, stats):
+        """Показать новые данные; возвращает False, если они не изменились"""
+        if stats == self.stats:
+            return False
+        if self.stats and stats and list(stats) == list(self.stats):
+            self.move_wedges(stats)
+        else:
+            self.draw(stats)
+        self.stats = dict(stats)
+        self.schedule_render()
+        return True
+
+    def on_resize(self, event):
+        if event.width < 2 or event.height < 2:
+            return
+        dpi = self.figure.dpi
+        self.figure.set_size_inches(event.width / dpi, event.height / dpi, forward=False)
+        self.schedule_render()
+
+    def schedule_render(self):
+        # Несколько изменений подряд (данные, размер) дают одну отрисовку
+        if self._render_id is None:
+            self._render_id = self.widget.after_idle(self.render)
+
+    def render(self):
+        """Отрисовать Figure через Agg и вывести на холст"""
+        self._render_id = None
+        self.agg.draw()
+        width, height = self.agg.get_width_height()
+        rgb = np.asarray(self.agg.buffer_rgba())[:, :, :3]
+        ppm = b'P6 %d %d 255\n' % (width, height) + rgb.tobytes()
+        self.image = tk.PhotoImage(master=self.widget, width=width, height=height, data=ppm, format='PPM')
+        self.widget.itemconfigure(self.image_item, image=self.image)
+
+    def draw(self, stats):
+        """Построить диаграмму заново на том же Figure"""
+        self.ax.clear()
+        self.wedges, self.texts, self.autotexts = [], [], []
+
+        if not stats:
+            self.ax.text(0.5, 0.5, 'Нет данных', ha='center', va='center',
+                    fontsize=12, fontweight='bold', color='#7f8c8d')
+            self.ax.set_axis_off()
+            return
+
+        total = sum(stats.values())
+        self.ax.set_axis_on()
+        self.wedges, self.texts, self.autotexts = self.ax.pie(
+            stats.values(),
+            labels=stats.keys(),
+            autopct=lambda p: self.format_pct(p, total),
+            explode=[self.explode] * len(stats),
+            colors=self.colors(len(stats)),
+            shadow=True,
+            startangle=self.STARTANGLE,
+            labeldistance=self.LABEL_DISTANCE,
+            pctdistance=self.PCT_DISTANCE,
+            textprops={'fontsize': 10}
+        )
+
+        # Делаем подписи жирными
+        for text in self.texts:
+            text.set_fontweight('bold')
+
+        for autotext in self.autotexts:
+            autotext.set_fontweight('bold')
+            autotext.set_fontsize(10)
+
+        self.ax.set_title(self.title, fontsize=self.title_size, fontweight='bold', color='#2c3e50', pad=10)
+        self.ax.axis('equal')
+
+    def move_wedges(self, stats):
+        """Обновить углы секторов и подписи на месте (как их расставляет ax.pie)"""
+        values = list(stats.values())
+        total = sum(values)
+        theta = self.STARTANGLE
+        for wedge, text, autotext, value in zip(self.wedges, self.texts, self.autotexts, values):
+            span = 360 * value / total
+            mid = math.radians(theta + span / 2)
+            dx, dy = math.cos(mid), math.sin(mid)
+            x, y = self.explode * dx, self.explode * dy
+
+            wedge.set_center((x, y))
+            wedge.set_theta1(theta)
+            wedge.set_theta2(theta + span)
+
+            text.set_position((x + self.LABEL_DISTANCE * dx, y + self.LABEL_DISTANCE * dy))
+            text.set_horizontalalignment('left' if x + self.LABEL_DISTANCE * dx > 0 else 'right')
+            autotext.set_position((x + self.PCT_DISTANCE * dx, y + self.PCT_DISTANCE * dy))
+            autotext.set_text(self.format_pct(100 * value / total, total))
+            theta += span
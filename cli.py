@@ -0,0 +1,314 @@
+# -*- coding: utf-8 -*-
+"""Командная строка для менеджера задач без графического интерфейса.
+
+Запуск: python -m task_manager <команда> ...  (без команды открывается окно).
+Модуль не импортирует tkinter и matplotlib и работает прямо с Database.
+Результаты выводятся в JSON, списки задач - в NDJSON (задача на строку),
+чтобы их было удобно разбирать из скриптов.
+"""
+import argparse
+import json
+import sqlite3
+import sys
+from datetime import datetime, timedelta
+from itertools import islice
+
+from database import ARCHIVE_AFTER_DAYS, DEFAULT_SORT, IDS_SQL, SERIES_FIELDS, SORT_COLUMNS, Database, ids_param
+from recurrence import FREQUENCIES
+
+TASK_FIELDS = ("id", "title", "description", "due_date", "status", "category")
+OCCURRENCE_FIELDS = ("series_id", "date", "title", "description", "status", "category")
+STATUSES = ["Новая", "В процессе", "Выполнено"]
+CATEGORIES = ["Работа", "Учеба", "Личное", "Семья", "Общие"]
+# Команды, которые только читают: база открывается без sweep_overdue и без
+# обрезки журнала изменений, чтобы не ждать блокировку записи
+READ_COMMANDS = {"list", "views", "search", "stats", "export", "series", "occurrences"}
+
+
+def parse_date(text):
+    """Дата ДД.ММ.ГГГГ или ГГГГ-ММ-ДД в формате базы"""
+    for pattern in ("%d.%m.%Y", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(text, pattern).strftime("%Y-%m-%d")
+        except ValueError:
+            pass
+    raise argparse.ArgumentTypeError(f"неверная дата {text!r}, ожидается ДД.ММ.ГГГГ или ГГГГ-ММ-ДД")
+
+
+def task_dict(row):
+    return dict(zip(TASK_FIELDS, row))
+
+
+def write_json(value, out):
+    out.write(json.dumps(value, ensure_ascii=False) + "\n")
+
+
+def write_tasks(rows, args, out):
+    """Вывести задачи: NDJSON по мере чтения из курсора или один массив JSON"""
+    rows = islice(rows, args.limit) if args.limit else rows
+    if args.format == "json":
+        write_json([task_dict(row) for row in rows], out)
+        return
+    for row in rows:
+        out.write(json.dumps(task_dict(row), ensure_ascii=False) + "\n")
+
+
+def existing_ids(db, task_ids):
+    cursor = db.conn.execute(f"SELECT id FROM tasks WHERE id IN {IDS_SQL}", (ids_param(task_ids),))
+    return sorted(row[0] for row in cursor)
+
+
+def command_add(db, args, out):
+    with db.transaction():
+        task_id = db.add_task(args.title, args.description, args.due, args.category)
+        if args.status != "Новая":
+            db.set_status_bulk([task_id], args.status)
+    write_json(task_dict(db.get_task(task_id)), out)
+
+
+def command_list(db, args, out):
+    conditions = (args.search, args.status, args.category, (args.sort, args.desc))
+    if args.view:
+        view = db.get_saved_view(args.view)
+        if view is None:
+            raise ValueError(f"Вид не найден: {args.view}")
+        conditions = view.conditions
+    write_tasks(db.iter_tasks(*conditions), args, out)
+
+
+def command_views(db, args, out):
+    for view in db.get_saved_views():
+        write_json({"name": view.name, "search": view.search_term, "status": view.status_filter,
+                    "category": view.category_filter, "sort": view.sort[0], "desc": view.sort[1]}, out)
+
+
+def command_search(db, args, out):
+    write_tasks(db.search_tasks(args.term, args.limit or 50, args.include_archive), args, out)
+
+
+def command_done(db, args, out):
+    found = existing_ids(db, args.ids)
+    db.set_status_bulk(found, "Выполнено")
+    write_json({"updated": found, "missing": sorted(set(args.ids) - set(found))}, out)
+    return 0 if len(found) == len(set(args.ids)) else 1
+
+
+def command_delete(db, args, out):
+    found = existing_ids(db, args.ids)
+    db.delete_tasks_bulk(found)
+    write_json({"deleted": found, "missing": sorted(set(args.ids) - set(found))}, out)
+    return 0 if len(found) == len(set(args.ids)) else 1
+
+
+def command_stats(db, args, out):
+    status_stats, category_stats = db.get_task_stats()
+    write_json({"total": db.count_tasks(), "status": status_stats, "category": category_stats}, out)
+
+
+def command_export(db, args, out):
+    if args.snapshot:
+        import snapshot
+        count = snapshot.write_snapshot(db, args.file, compressed=args.compressed)
+    else:
+        import csv_io
+        count = csv_io.export_tasks(db, args.file, args.search, args.status, args.category,
+                                    include_archive=args.include_archive)
+    write_json({"exported": count, "file": args.file}, out)
+
+
+def command_import(db, args, out):
+    if args.snapshot:
+        import snapshot
+        write_json({"imported": snapshot.import_snapshot(db, args.file, upsert=args.upsert)}, out)
+        return 0
+    import csv_io
+    result = csv_io.import_tasks(db, args.file, upsert=args.upsert, dry_run=args.dry_run)
+    write_json({"inserted": result.inserted, "updated": result.updated, "dry_run": args.dry_run,
+                "errors": [{"record": record, "error": error} for record, error in result.errors]}, out)
+    return 1 if result.errors else 0
+
+
+def command_archive(db, args, out):
+    write_json({"archived": db.archive_completed(args.days), "in_archive": db.count_archived()}, out)
+
+
+def command_restore(db, args, out):
+    write_json({"restored": db.restore_tasks(args.ids)}, out)
+
+
+def command_series_add(db, args, out):
+    series_id = db.add_series(args.title, args.description, args.category, args.start, args.every,
+                              interval=args.interval, weekdays=args.weekdays, month_day=args.month_day,
+                              until_date=args.until, count=args.count)
+    write_json(dict(zip(SERIES_FIELDS, db.get_series(series_id)[0])), out)
+
+
+def command_series(db, args, out):
+    for row in db.get_series():
+        write_json(dict(zip(SERIES_FIELDS, row)), out)
+
+
+def command_series_delete(db, args, out):
+    deleted = [series_id for series_id in args.ids if db.delete_series(series_id)]
+    write_json({"deleted": deleted, "missing": sorted(set(args.ids) - set(deleted))}, out)
+    return 0 if len(deleted) == len(set(args.ids)) else 1
+
+
+def command_occurrences(db, args, out):
+    # --to включительно, окно get_occurrences - полуоткрытое
+    end = (datetime.strptime(args.to, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
+    for row in db.get_occurrences(args.start, end):
+        write_json(dict(zip(OCCURRENCE_FIELDS, row)), out)
+
+
+def command_occurrence(db, args, out):
+    found = db.set_occurrence_status(args.series_id, args.date, args.status)
+    write_json({"series_id": args.series_id, "date": args.date, "status": args.status, "updated": found}, out)
+    return 0 if found else 1
+
+
+def command_serve(db, args, out):
+    import asyncio
+    import api_server
+
+    def started(server):
+        write_json({"listening": f"http://{server.host}:{server.port}"}, out)
+        out.flush()
+
+    try:
+        asyncio.run(api_server.serve(args.db, args.host, args.port, args.workers, started))
+    except KeyboardInterrupt:
+        pass
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m task_manager",
+                                     description="Менеджер задач: команды для скриптов (вывод в JSON)")
+    parser.add_argument("--db", default="tasks.db", help="файл базы (по умолчанию tasks.db)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def filters(command):
+        command.add_argument("--search", default="", help="строка поиска")
+        command.add_argument("--status", default="Все", choices=["Все"] + STATUSES + ["Просрочено"])
+        command.add_argument("--category", default="Все", choices=["Все"] + CATEGORIES)
+
+    def listing(command):
+        command.add_argument("--limit", type=int, default=0, help="не больше N задач")
+        command.add_argument("--format", choices=["ndjson", "json"], default="ndjson")
+
+    add = commands.add_parser("add", help="добавить задачу")
+    add.add_argument("title")
+    add.add_argument("--due", required=True, type=parse_date, help="ДД.ММ.ГГГГ или ГГГГ-ММ-ДД")
+    add.add_argument("--description", default="")
+    add.add_argument("--category", default="Общие", choices=CATEGORIES)
+    add.add_argument("--status", default="Новая", choices=STATUSES)
+    add.set_defaults(handler=command_add)
+
+    list_command = commands.add_parser("list", help="задачи с фильтрами (по умолчанию в порядке даты)")
+    filters(list_command)
+    listing(list_command)
+    list_command.add_argument("--sort", default=DEFAULT_SORT[0], choices=list(SORT_COLUMNS),
+                              help="столбец сортировки (при равенстве - по id)")
+    list_command.add_argument("--desc", action="store_true", help="по убыванию")
+    list_command.add_argument("--view", help="условия сохраненного вида вместо фильтров")
+    list_command.set_defaults(handler=command_list)
+
+    views = commands.add_parser("views", help="сохраненные виды списка")
+    views.set_defaults(handler=command_views)
+
+    search = commands.add_parser("search", help="поиск по релевантности")
+    search.add_argument("term")
+    search.add_argument("--include-archive", action="store_true", help="искать и в архиве")
+    listing(search)
+    search.set_defaults(handler=command_search)
+
+    for name, handler, text in (("done", command_done, "отметить задачи выполненными"),
+                                ("delete", command_delete, "удалить задачи")):
+        command = commands.add_parser(name, help=text)
+        command.add_argument("ids", type=int, nargs="+", metavar="ID")
+        command.set_defaults(handler=handler)
+
+    stats = commands.add_parser("stats", help="количество задач по статусам и категориям")
+    stats.set_defaults(handler=command_stats)
+
+    export = commands.add_parser("export", help="выгрузить задачи в CSV или снимок .npz")
+    export.add_argument("file")
+    filters(export)
+    export.add_argument("--snapshot", action="store_true", help="колоночный снимок всех задач")
+    export.add_argument("--compressed", action="store_true", help="сжатый снимок")
+    export.add_argument("--include-archive", action="store_true", help="CSV: вместе с архивом")
+    export.set_defaults(handler=command_export)
+
+    import_command = commands.add_parser("import", help="загрузить задачи из CSV или снимка .npz")
+    import_command.add_argument("file")
+    import_command.add_argument("--upsert", action="store_true", help="обновлять задачи с тем же ID")
+    import_command.add_argument("--dry-run", action="store_true", help="только проверить CSV")
+    import_command.add_argument("--snapshot", action="store_true", help="файл - снимок .npz")
+    import_command.set_defaults(handler=command_import)
+
+    archive = commands.add_parser("archive", help="перенести старые выполненные задачи в архив")
+    archive.add_argument("--days", type=int, default=ARCHIVE_AFTER_DAYS,
+                         help=f"старше скольких дней (по умолчанию {ARCHIVE_AFTER_DAYS})")
+    archive.set_defaults(handler=command_archive)
+
+    restore = commands.add_parser("restore", help="вернуть задачи из архива")
+    restore.add_argument("ids", type=int, nargs="+", metavar="ID")
+    restore.set_defaults(handler=command_restore)
+
+    series_add = commands.add_parser("series-add", help="добавить серию повторяющихся задач")
+    series_add.add_argument("title")
+    series_add.add_argument("--start", required=True, type=parse_date, help="дата первого повторения")
+    series_add.add_argument("--every", required=True, choices=FREQUENCIES, help="периодичность")
+    series_add.add_argument("--interval", type=int, default=1, help="каждые N дней, недель или месяцев")
+    series_add.add_argument("--weekdays", type=int, nargs="+", default=(), metavar="DAY",
+                            help="weekly: дни недели, 0 - понедельник (по умолчанию день --start)")
+    series_add.add_argument("--month-day", type=int, help="monthly: число месяца (по умолчанию из --start)")
+    series_add.add_argument("--until", type=parse_date, help="последняя дата серии")
+    series_add.add_argument("--count", type=int, help="не больше N повторений")
+    series_add.add_argument("--description", default="")
+    series_add.add_argument("--category", default="Общие", choices=CATEGORIES)
+    series_add.set_defaults(handler=command_series_add)
+
+    series = commands.add_parser("series", help="серии повторяющихся задач")
+    series.set_defaults(handler=command_series)
+
+    series_delete = commands.add_parser("series-delete", help="удалить серии вместе с отметками повторений")
+    series_delete.add_argument("ids", type=int, nargs="+", metavar="ID")
+    series_delete.set_defaults(handler=command_series_delete)
+
+    occurrences = commands.add_parser("occurrences", help="повторения серий за период")
+    occurrences.add_argument("--from", dest="start", required=True, type=parse_date)
+    occurrences.add_argument("--to", required=True, type=parse_date, help="включительно")
+    occurrences.set_defaults(handler=command_occurrences)
+
+    occurrence = commands.add_parser("occurrence", help="изменить статус одного повторения серии")
+    occurrence.add_argument("series_id", type=int, metavar="SERIES")
+    occurrence.add_argument("date", type=parse_date)
+    occurrence.add_argument("--status", default="Выполнено", choices=STATUSES)
+    occurrence.set_defaults(handler=command_occurrence)
+
+    serve = commands.add_parser("serve", help="HTTP/JSON API к базе (см. api_server.py)")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8080, help="0 - любой свободный порт")
+    serve.add_argument("--workers", type=int, default=4, help="потоков чтения")
+    serve.set_defaults(handler=command_serve)
+    return parser
+
+
+def main(argv=None, out=None):
+    args = build_parser().parse_args(argv)
+    out = out or sys.stdout
+    writes = args.command not in READ_COMMANDS
+    db = None
+    try:
+        # Открытие тоже может упасть, например с "database is locked"
+        db = Database(args.db, sweep=writes)
+        if writes:
+            db.prune_change_log()
+        return args.handler(db, args, out) or 0
+    except (OSError, ValueError, sqlite3.Error) as e:
+        write_json({"error": str(e)}, sys.stderr)
+        return 1
+    finally:
+        if db is not None:
+            db.close()
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""Общие соединения с файлом базы.
+
+На каждый файл заводится один ConnectionManager: одно соединение для
+записи и небольшой пул соединений только для чтения для фоновых потоков.
+Все соединения настраиваются одинаково (PRAGMAS); журнал переводится в
+режим WAL, в котором чтение не блокируется записью и наоборот.
+"""
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+# Настройки соединения. synchronous=NORMAL в режиме WAL не теряет
+# целостность при сбое, но не делает fsync на каждый commit
+PRAGMAS = {
+    "synchronous": "NORMAL",
+    "cache_size": -16384,           # 16 МБ страничного кэша
+    "mmap_size": 256 * 2**20,       # чтение через отображение файла в память
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,
+}
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+
+def configure(conn, pragmas=PRAGMAS):
+    """Применить PRAGMA к соединению"""
+    for name, value in pragmas.items():
+        conn.execute(f"PRAGMA {name} = {value}")
+    return conn
+
+
+class ConnectionManager:
+    """Соединения с одним файлом базы.
+
+    Соединение для записи одно; его держат (и освобождают) экземпляры
+    Database, последний release_writer закрывает все соединения. Соединения
+    только для чтения создаются по требованию, не больше readers штук, и
+    после освобождения возвращаются в пул; при исчерпании пула acquire_reader
+    ждет свободное.
+    """
+
+    def __init__(self, db_path, readers=4):
+        self.db_path = db_path
+        self.readers = readers
+        self._writer = None
+        self._writer_users = 0
+        self._created = 0
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self.closed = False
+
+    @classmethod
+    def for_path(cls, db_path):
+        """Общий менеджер для файла (один на процесс)"""
+        key = os.path.abspath(db_path)
+        with _managers_lock:
+            manager = _managers.get(key)
+            if manager is None:
+                manager = _managers[key] = cls(db_path)
+            return manager
+
+    def acquire_writer(self):
+        with self._lock:
+            if self._writer is None:
+                self._writer = configure(sqlite3.connect(self.db_path))
+                self._writer.execute("PRAGMA journal_mode = WAL")
+            self._writer_users += 1
+            return self._writer
+
+    def release_writer(self):
+        with self._lock:
+            self._writer_users -= 1
+            if self._writer_users > 0:
+                return
+        self.close()
+
+    def connect(self):
+        """Отдельное настроенное соединение (закрывает вызывающий)"""
+        return configure(sqlite3.connect(self.db_path))
+
+    def acquire_reader(self, timeout=None):
+        """Соединение только для чтения; можно передавать в другой поток"""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            create = self._created < self.readers
+            if create:
+                self._created += 1
+        if not create:
+            return self._idle.get(timeout=timeout)
+        try:
+            # as_uri экранирует "#", "?" и "%" в пути, иначе они разбирались бы как части URI
+            uri = Path(self.db_path).resolve().as_uri() + "?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            return configure(conn)
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+
+    def release_reader(self, conn):
+        if self.closed:
+            conn.close()
+            return
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    @contextmanager
+    def reader(self):
+        conn = self.acquire_reader()
+        try:
+            yield conn
+        finally:
+            self.release_reader(conn)
+
+    def close(self):
+        """Закрыть соединение для записи и свободные соединения пула"""
+        with _managers_lock:
+            if _managers.get(os.path.abspath(self.db_path)) is self:
+                del _managers[os.path.abspath(self.db_path)]
+        with self._lock:
+            self.closed = True
+            while True:
+                try:
+                    self._idle.get_nowait().close()
+                except queue.Empty:
+                    break
+                self._created -= 1
+            # Писатель закрывается последним: он переносит WAL в базу и удаляет его
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+            self._writer_users = 0
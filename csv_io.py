@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""Экспорт и импорт задач в CSV (разделитель ';', даты ДД.ММ.ГГГГ).
+
+Функции рассчитаны на выполнение в фоновом потоке со своим соединением:
+строки читаются из курсора порциями по chunk_size, поэтому память не
+зависит от числа задач, а ход работы сообщается через progress.
+"""
+import csv
+import os
+from collections import namedtuple
+from contextlib import nullcontext
+from datetime import datetime
+from itertools import islice
+
+from database import IDS_SQL, ids_param
+
+CSV_HEADER = ['ID', 'Название', 'Описание', 'Дата', 'Статус', 'Категория']
+CHUNK_SIZE = 5000
+
+
+class ImportCancelled(Exception):
+    """Импорт отменен пользователем"""
+
+
+def export_tasks(db, filename, search_term="", status_filter="Все", category_filter="Все",
+                 chunk_size=CHUNK_SIZE, progress=None, cancelled=None, include_archive=False):
+    """Записать задачи с фильтрами в filename.
+
+    progress(done, total) вызывается после каждой порции, cancelled() -
+    перед каждой. Файл пишется во временный и заменяет filename только
+    при успешном завершении. include_archive добавляет задачи из архива.
+    Возвращает число строк или None при отмене.
+    """
+    total = db.count_tasks(search_term, status_filter, category_filter, include_archive)
+    cursor = db.iter_export_rows(search_term, status_filter, category_filter, include_archive)
+    partial = filename + ".part"
+    done = 0
+    completed = False
+    try:
+        with open(partial, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f, delimiter=';')
+            writer.writerow(CSV_HEADER)
+            while not (cancelled is not None and cancelled()):
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    completed = True
+                    break
+                writer.writerows(rows)
+                done += len(rows)
+                if progress is not None:
+                    progress(done, total)
+        if completed:
+            os.replace(partial, filename)
+            return done
+        return None
+    finally:
+        cursor.close()
+        if os.path.exists(partial):
+            os.remove(partial)
+
+
+ImportResult = namedtuple("ImportResult", "inserted updated errors")
+
+IMPORT_BATCH_SIZE = 20000
+DEFAULT_STATUS = "Новая"
+DEFAULT_CATEGORY = "Общие"
+
+
+class DateConverter:
+    """ДД.ММ.ГГГГ -> ГГГГ-ММ-ДД с проверкой.
+
+    Дат в файле на порядки меньше, чем строк, поэтому каждая различная
+    строка проверяется strptime один раз, а дальше берется из словаря.
+    """
+
+    def __init__(self):
+        self.cache = {}
+
+    def __call__(self, text):
+        try:
+            return self.cache[text]
+        except KeyError:
+            pass
+        try:
+            value = datetime.strptime(text.strip(), "%d.%m.%Y").strftime("%Y-%m-%d")
+        except ValueError:
+            value = None
+        self.cache[text] = value
+        return value
+
+
+def parse_rows(lines, start_line, convert_date):
+    """Проверить и преобразовать порцию строк CSV.
+
+    Возвращает (строки с id, строки без id, ошибки); строка задачи -
+    (id, title, description, due_date, status, category), ошибка -
+    (номер записи, считая заголовок первой, текст).
+    """
+    with_id, without_id, errors = [], [], []
+    for line_no, row in enumerate(lines, start_line):
+        if len(row) != len(CSV_HEADER):
+            errors.append((line_no, f"ожидается {len(CSV_HEADER)} полей, получено {len(row)}"))
+            continue
+        task_id, title, description, due_date, status, category = row
+        if not title.strip():
+            errors.append((line_no, "пустое название"))
+            continue
+        iso_date = convert_date(due_date)
+        if iso_date is None:
+            errors.append((line_no, f"неверная дата {due_date!r}"))
+            continue
+        status = status or DEFAULT_STATUS
+        category = category or DEFAULT_CATEGORY
+        if task_id.strip():
+            try:
+                task_id = int(task_id)
+            except ValueError:
+                errors.append((line_no, f"неверный ID {task_id!r}"))
+                continue
+            with_id.append((task_id, title, description, iso_date, status, category))
+        else:
+            without_id.append((title, description, iso_date, status, category))
+    return with_id, without_id, errors
+
+
+def import_tasks(db, filename, upsert=False, dry_run=False, batch_size=IMPORT_BATCH_SIZE,
+                 progress=None, cancelled=None):
+    """Загрузить задачи из CSV в формате export_tasks.
+
+    Файл читается потоком порциями по batch_size строк. Без upsert все
+    строки добавляются новыми задачами (ID из файла не используется) с
+    отложенной индексацией FTS и счетчиков. С upsert строки с ID обновляют
+    существующие задачи или добавляются с этим ID. dry_run только проверяет
+    файл и считает, что было бы добавлено и обновлено. Весь импорт - одна
+    транзакция: при ошибке или отмене база не меняется. progress(done,
+    total) получает прочитанные и всего байт. Возвращает ImportResult или
+    None при отмене.
+    """
+    if dry_run:
+        scope = nullcontext()
+    elif upsert:
+        scope = db.transaction()
+    else:
+        scope = db.deferred_indexing()
+
+    try:
+        result = _import_batches(db, filename, upsert, dry_run, scope, batch_size, progress, cancelled)
+    except ImportCancelled:
+        return None
+    return result
+
+
+def _import_batches(db, filename, upsert, dry_run, scope, batch_size, progress, cancelled):
+    total = os.path.getsize(filename)
+    inserted = updated = 0
+    errors = []
+    convert_date = DateConverter()
+    with open(filename, newline='', encoding='utf-8-sig') as f, scope:
+        reader = csv.reader(f, delimiter=';')
+        header = next(reader, None)
+        if header != CSV_HEADER:
+            raise ValueError(f"Неверный заголовок файла: {header}")
+        line_no = 2
+        while True:
+            if cancelled is not None and cancelled():
+                # Исключение откатывает транзакцию импорта
+                raise ImportCancelled
+            lines = list(islice(reader, batch_size))
+            if not lines:
+                break
+            with_id, without_id, batch_errors = parse_rows(lines, line_no, convert_date)
+            line_no += len(lines)
+            errors.extend(batch_errors)
+
+            if not upsert:
+                without_id.extend(row[1:] for row in with_id)
+                with_id = []
+            if with_id:
+                cursor = db.conn.execute(f"SELECT COUNT(*) FROM tasks WHERE id IN {IDS_SQL}",
+                                         (ids_param(row[0] for row in with_id),))
+                existing = cursor.fetchone()[0]
+                updated += existing
+                inserted += len(with_id) - existing
+            inserted += len(without_id)
+
+            if not dry_run:
+                if with_id:
+                    db.upsert_tasks_bulk(with_id)
+                if without_id:
+                    db.add_tasks_bulk(without_id)
+            if progress is not None:
+                progress(f.buffer.tell(), total)
+    return ImportResult(inserted, updated, errors)
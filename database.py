@@ -0,0 +1,1468 @@
+# -*- coding: utf-8 -*-
+import bisect
+import functools
+import json
+import re
+import sqlite3
+import unicodedata
+from array import array
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
+from datetime import date
+
+from connections import ConnectionManager
+from recurrence import Rule, make_rule, occurrences, occurs_on
+
+TASKS_TABLE_SQL = '''
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    title TEXT NOT NULL,
+    description TEXT,
+    due_date TEXT NOT NULL,
+    status TEXT DEFAULT 'Новая',
+    category TEXT DEFAULT 'Общие',
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+)
+'''
+
+TASKS_COLUMNS = ["id", "title", "description", "due_date", "status", "category", "created_at"]
+
+
+def _migration_1_unify_schema(cursor):
+    """Приводит таблицу tasks к единой схеме.
+
+    Ранние версии приложения создавали таблицу без category, с
+    необязательной due_date, английскими статусами и датами ДД.ММ.ГГГГ.
+    Такая таблица пересоздается с переносом всех строк и их id.
+    """
+    cursor.execute("PRAGMA table_info(tasks)")
+    columns = {row[1]: row for row in cursor.fetchall()}
+    if not columns:
+        cursor.execute(TASKS_TABLE_SQL)
+        return
+
+    # notnull - четвертое поле PRAGMA table_info
+    if set(columns) != set(TASKS_COLUMNS) or not columns["due_date"][3]:
+        cursor.execute(TASKS_TABLE_SQL.replace("tasks", "tasks_migrated", 1))
+        expressions = {
+            "due_date": "COALESCE(due_date, date(created_at), date('now'))"
+                        if "created_at" in columns else "COALESCE(due_date, date('now'))",
+            "status": "COALESCE(status, 'Новая')",
+            "category": "COALESCE(category, 'Общие')",
+        }
+        copied = [column for column in TASKS_COLUMNS if column in columns]
+        cursor.execute(
+            f"INSERT INTO tasks_migrated ({', '.join(copied)}) "
+            f"SELECT {', '.join(expressions.get(column, column) for column in copied)} FROM tasks")
+        cursor.execute("DROP TABLE tasks")
+        cursor.execute("ALTER TABLE tasks_migrated RENAME TO tasks")
+
+    cursor.execute('''
+    UPDATE tasks
+    SET due_date = substr(due_date, 7, 4) || '-' || substr(due_date, 4, 2) || '-' || substr(due_date, 1, 2)
+    WHERE due_date GLOB '[0-9][0-9].[0-9][0-9].[0-9][0-9][0-9][0-9]'
+    ''')
+    cursor.execute("UPDATE tasks SET status = 'Новая' WHERE status = 'Pending'")
+
+
+def _migration_2_indexes(cursor):
+    """Индексы под основные запросы.
+
+    idx_tasks_due покрывает выборки календаря по дате и диапазону дат и
+    сортировку списка по due_date; индексы по статусу и категории
+    обслуживают фильтры списка (с сортировкой по дате) и GROUP BY статистики.
+    """
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tasks_due ON tasks (due_date, status, category, title)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tasks_status_due ON tasks (status, due_date)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tasks_category_due ON tasks (category, due_date)")
+
+
+def _migration_3_list_order_index(cursor):
+    """Индекс в точном порядке списка задач (due_date, id) для постраничной выборки"""
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tasks_due_id ON tasks (due_date)")
+
+
+def _migration_4_stat_counters(cursor):
+    """Счетчики задач по статусам и категориям, поддерживаемые триггерами.
+
+    Каждое изменение задачи меняет не больше четырех строк task_counters,
+    и статистика читается из них без GROUP BY по всей таблице. NULL хранится
+    как пустая строка, чтобы UPSERT находил существующую строку.
+    """
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS task_counters (
+        dimension TEXT NOT NULL,
+        value TEXT NOT NULL,
+        count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (dimension, value)
+    ) WITHOUT ROWID
+    ''')
+    cursor.execute("DELETE FROM task_counters")
+    for dimension in ("status", "category"):
+        cursor.execute(f"INSERT INTO task_counters (dimension, value, count) "
+                       f"SELECT '{dimension}', IFNULL({dimension}, ''), COUNT(*) FROM tasks "
+                       f"GROUP BY IFNULL({dimension}, '')")
+
+    increment = '''
+        INSERT INTO task_counters (dimension, value, count) VALUES ('{dimension}', IFNULL(new.{dimension}, ''), 1)
+        ON CONFLICT (dimension, value) DO UPDATE SET count = count + 1;'''
+    decrement = '''
+        UPDATE task_counters SET count = count - 1
+        WHERE dimension = '{dimension}' AND value = IFNULL(old.{dimension}, '');'''
+    both = ("status", "category")
+
+    cursor.execute("CREATE TRIGGER IF NOT EXISTS tasks_counters_ai AFTER INSERT ON tasks BEGIN"
+                   + "".join(increment.format(dimension=d) for d in both) + "\nEND")
+    cursor.execute("CREATE TRIGGER IF NOT EXISTS tasks_counters_ad AFTER DELETE ON tasks BEGIN"
+                   + "".join(decrement.format(dimension=d) for d in both) + "\nEND")
+    cursor.execute("CREATE TRIGGER IF NOT EXISTS tasks_counters_au AFTER UPDATE OF status, category ON tasks "
+                   "WHEN old.status IS NOT new.status OR old.category IS NOT new.category BEGIN"
+                   + "".join(decrement.format(dimension=d) + increment.format(dimension=d) for d in both)
+                   + "\nEND")
+
+
+def _migration_5_fts_update_when_changed(cursor):
+    """Триггер FTS на UPDATE срабатывает только при изменении текста.
+
+    Прежний триггер переиндексировал задачу при любом UPDATE, в котором
+    упомянуты title и description, даже если они не менялись (сохранение из
+    окна редактирования, upsert при импорте). Новый триггер создает
+    create_search_index.
+    """
+    cursor.execute("DROP TRIGGER IF EXISTS tasks_fts_au")
+
+
+def _migration_6_change_counter(cursor):
+    """Счетчик изменений таблицы tasks для проверки актуальности кэшей.
+
+    Триггеры увеличивают task_changes.version при каждом изменении задачи,
+    кто бы ни писал в базу. Та же версия - те же данные, поэтому клиент
+    может сравнить ее с запомненной вместо повторного запроса.
+    """
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS task_changes (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        version INTEGER NOT NULL
+    )
+    ''')
+    cursor.execute("INSERT OR IGNORE INTO task_changes (id, version) VALUES (1, 0)")
+    for name, event in (("ai", "INSERT"), ("au", "UPDATE"), ("ad", "DELETE")):
+        cursor.execute(f"CREATE TRIGGER IF NOT EXISTS tasks_changes_{name} AFTER {event} ON tasks BEGIN "
+                       f"UPDATE task_changes SET version = version + 1; END")
+
+
+# Статус "Просрочено" хранится в таблице: его получают незавершенные задачи
+# (ACTIVE_STATUSES) с прошедшей датой. При записи задачи его вычисляет сам
+# INSERT или UPDATE (overdue_status_sql), при смене дня - Database.sweep_overdue
+OVERDUE = "Просрочено"
+ACTIVE_STATUSES = ("Новая", "В процессе")
+TODAY_SQL = "date('now', 'localtime')"
+
+
+def overdue_status_sql(status, due_date):
+    """Выражение записываемого статуса задачи с учетом просрочки.
+
+    Незавершенная задача с прошедшей датой становится просроченной, а
+    просроченная с датой не раньше сегодняшней - снова новой.
+    """
+    active = ", ".join(f"'{status}'" for status in ACTIVE_STATUSES)
+    return (f"CASE WHEN {status} IN ({active}) AND {due_date} < {TODAY_SQL} THEN '{OVERDUE}' "
+            f"WHEN {status} = '{OVERDUE}' AND {due_date} >= {TODAY_SQL} THEN '{ACTIVE_STATUSES[0]}' "
+            f"ELSE {status} END")
+
+
+def overdue_status(status, due_date, today=None):
+    """overdue_status_sql для значений в памяти: статус, который запишет база"""
+    today = today or date.today().isoformat()
+    if status in ACTIVE_STATUSES and due_date < today:
+        return OVERDUE
+    if status == OVERDUE and due_date >= today:
+        return ACTIVE_STATUSES[0]
+    return status
+
+
+def _migration_7_overdue_status(cursor):
+    """Статус "Просрочено" в базе вместо вычисления при отображении.
+
+    Задача становится просроченной при добавлении или изменении с прошедшей
+    датой и снова новой, если ее дату перенесли на сегодня или позже.
+    Фильтр по статусу, счетчики task_counters и календарь видят его как
+    обычный статус. Статус вычисляют сами INSERT и UPDATE, поэтому миграция
+    только отмечает уже просроченные задачи.
+    """
+    status = overdue_status_sql("status", "due_date")
+    cursor.execute(f"UPDATE tasks SET status = {status} WHERE status IS NOT {status}")
+
+
+# Архив: выполненные задачи старше ARCHIVE_AFTER_DAYS переносятся из tasks в
+# tasks_archive (Database.archive_completed). Список, счетчики и статистика
+# работают только с tasks; поиск и экспорт включают архив по запросу, а
+# календарь обращается к нему сам для дат, которые в архиве есть
+ARCHIVE_TABLE = "tasks_archive"
+ARCHIVE_AFTER_DAYS = 90
+ARCHIVE_BATCH_SIZE = 5000
+DONE = "Выполнено"
+
+
+def _migration_8_archive(cursor):
+    """Таблица архива выполненных задач с индексом (due_date, id)"""
+    cursor.execute(f'''
+    CREATE TABLE IF NOT EXISTS {ARCHIVE_TABLE} (
+        id INTEGER PRIMARY KEY,
+        title TEXT NOT NULL,
+        description TEXT,
+        due_date TEXT NOT NULL,
+        status TEXT,
+        category TEXT,
+        created_at TEXT,
+        archived_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_archive_due_id ON {ARCHIVE_TABLE} (due_date)")
+
+
+def _migration_9_sort_indexes(cursor):
+    """Индексы под сортировку списка по столбцам (и с фильтром статуса или категории).
+
+    Индекс по столбцу неявно продолжается rowid (id), поэтому хранит строки
+    в порядке ключа (столбец, id) и обслуживает постраничную выборку в обе
+    стороны. Пустые статус и категория заменяются значениями по умолчанию:
+    NULL в ключе страницы не сравнивается.
+    """
+    cursor.execute("UPDATE tasks SET status = 'Новая' WHERE status IS NULL")
+    cursor.execute("UPDATE tasks SET category = 'Общие' WHERE category IS NULL")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tasks_title ON tasks (title)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks (status)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tasks_category ON tasks (category)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tasks_status_title ON tasks (status, title)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tasks_category_title ON tasks (category, title)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tasks_status_category ON tasks (status, category)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tasks_category_status ON tasks (category, status)")
+
+
+def _migration_10_saved_views(cursor):
+    """Сохраненные виды списка: именованные условия поиска, фильтров и сортировки"""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS saved_views (
+        name TEXT PRIMARY KEY,
+        search_term TEXT NOT NULL DEFAULT '',
+        status_filter TEXT NOT NULL DEFAULT 'Все',
+        category_filter TEXT NOT NULL DEFAULT 'Все',
+        sort_column TEXT NOT NULL DEFAULT 'due_date',
+        sort_desc INTEGER NOT NULL DEFAULT 0
+    )
+    ''')
+
+
+# Сколько последних записей журнала изменений хранится в базе
+CHANGE_LOG_KEEP = 10000
+
+
+def _migration_11_change_log(cursor):
+    """Журнал изменений задач для других процессов, открывших ту же базу.
+
+    Триггеры добавляют в task_log id каждой добавленной, измененной или
+    удаленной задачи; seq (AUTOINCREMENT) только растет, поэтому читатель
+    запоминает последний прочитанный seq и получает изменения после него.
+    task_id NULL означает "изменилось все" (массовая загрузка).
+    """
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS task_log (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        task_id INTEGER
+    )
+    ''')
+    for name, event, row in (("ai", "INSERT", "new"), ("au", "UPDATE", "new"), ("ad", "DELETE", "old")):
+        cursor.execute(f"CREATE TRIGGER IF NOT EXISTS tasks_log_{name} AFTER {event} ON tasks BEGIN "
+                       f"INSERT INTO task_log (task_id) VALUES ({row}.id); END")
+
+
+def _migration_12_recurring_series(cursor):
+    """Повторяющиеся задачи: правило серии и исключения для отдельных повторений.
+
+    Серия хранится одной строкой task_series (см. recurrence.py); end_date -
+    последняя возможная дата повторения с учетом until_date и count, NULL у
+    бесконечной серии. В series_exceptions записываются только повторения со
+    статусом, отличным от вычисляемого по дате. Триггеры увеличивают
+    task_changes.version, как и изменения задач.
+    """
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS task_series (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        title TEXT NOT NULL,
+        description TEXT,
+        category TEXT NOT NULL DEFAULT 'Общие',
+        start_date TEXT NOT NULL,
+        frequency TEXT NOT NULL CHECK (frequency IN ('daily', 'weekly', 'monthly')),
+        interval INTEGER NOT NULL DEFAULT 1 CHECK (interval >= 1),
+        weekdays TEXT,
+        month_day INTEGER,
+        until_date TEXT,
+        count INTEGER,
+        end_date TEXT,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_series_start ON task_series (start_date)")
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS series_exceptions (
+        series_id INTEGER NOT NULL,
+        occurrence_date TEXT NOT NULL,
+        status TEXT NOT NULL,
+        PRIMARY KEY (series_id, occurrence_date)
+    ) WITHOUT ROWID
+    ''')
+    for table in ("task_series", "series_exceptions"):
+        for name, event in (("ai", "INSERT"), ("au", "UPDATE"), ("ad", "DELETE")):
+            cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {table}_changes_{name} AFTER {event} ON {table} "
+                           f"BEGIN UPDATE task_changes SET version = version + 1; END")
+
+
+# Построчные триггеры, которые массовые операции (deferred_indexing,
+# sweep_overdue) выключают флагом trigger_flags на время своей транзакции.
+# DROP и CREATE TRIGGER меняли бы схему, и все соединения, в том числе в
+# других процессах, заново готовили бы свои запросы
+GATED_TRIGGERS = ("tasks_fts_ai", "tasks_counters_ai", "tasks_changes_ai", "tasks_log_ai",
+                  "tasks_counters_au", "tasks_changes_au", "tasks_log_au")
+TRIGGERS_ON = "(SELECT enabled FROM trigger_flags)"
+
+
+def _gated_trigger_sql(sql):
+    """SQL триггера с условием TRIGGERS_ON в WHEN"""
+    head, begin, body = sql.partition(" BEGIN")
+    if " WHEN " in head:
+        head = head.replace(" WHEN ", f" WHEN {TRIGGERS_ON} AND (", 1) + ")"
+    else:
+        head += f" WHEN {TRIGGERS_ON}"
+    return head + begin + body
+
+
+def _migration_13_trigger_flags(cursor):
+    """Флаг trigger_flags.enabled, которым выключаются GATED_TRIGGERS.
+
+    Флаг меняется только внутри транзакции массовой операции, поэтому другие
+    соединения всегда видят его включенным, а прерванная операция
+    откатывается вместе с ним.
+    """
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS trigger_flags (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        enabled INTEGER NOT NULL
+    )
+    ''')
+    cursor.execute("INSERT OR IGNORE INTO trigger_flags (id, enabled) VALUES (1, 1)")
+    names = ", ".join(f"'{name}'" for name in GATED_TRIGGERS)
+    cursor.execute(f"SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND name IN ({names})")
+    for name, sql in cursor.fetchall():
+        cursor.execute(f"DROP TRIGGER {name}")
+        cursor.execute(_gated_trigger_sql(sql))
+
+
+# Миграции схемы по порядку: MIGRATIONS[n] переводит базу с версии n на n + 1.
+# Новые миграции добавляются только в конец списка.
+MIGRATIONS = [
+    _migration_1_unify_schema,
+    _migration_2_indexes,
+    _migration_3_list_order_index,
+    _migration_4_stat_counters,
+    _migration_5_fts_update_when_changed,
+    _migration_6_change_counter,
+    _migration_7_overdue_status,
+    _migration_8_archive,
+    _migration_9_sort_indexes,
+    _migration_10_saved_views,
+    _migration_11_change_log,
+    _migration_12_recurring_series,
+    _migration_13_trigger_flags,
+]
+
+
+def month_range(year, month):
+    """Границы месяца [начало, начало следующего) в формате due_date"""
+    start_date = f"{year}-{month:02d}-01"
+    if month == 12:
+        end_date = f"{year+1}-01-01"
+    else:
+        end_date = f"{year}-{month+1:02d}-01"
+    return start_date, end_date
+
+
+def merge_day_counts(day_counts, other):
+    """Добавить к счетчикам {день: {статус: количество}} счетчики other"""
+    for day, statuses in other.items():
+        merged = day_counts.setdefault(day, {})
+        for status, count in statuses.items():
+            merged[status] = merged.get(status, 0) + count
+    return day_counts
+
+
+# Столбцы task_series в порядке Database.get_series
+SERIES_FIELDS = ("id", "title", "description", "category", "start_date", "frequency", "interval", "weekdays",
+                 "month_day", "until_date", "count", "end_date")
+RULE_COLUMNS = "start_date, frequency, interval, weekdays, month_day, end_date"
+
+
+def _series_rule(start_date, frequency, interval, weekdays, month_day, end_date):
+    """Правило серии из столбцов RULE_COLUMNS"""
+    return Rule(date.fromisoformat(start_date), frequency, interval,
+                tuple(int(day) for day in weekdays.split(",")) if weekdays else (), month_day,
+                date.fromisoformat(end_date) if end_date else None)
+
+
+# Столбцы, по которым сортируется список, и их места в строке get_all_tasks.
+# Порядок списка - (столбец, по убыванию); при равных значениях строки идут по id
+SORT_COLUMNS = {"id": 0, "title": 1, "due_date": 3, "status": 4, "category": 5}
+DEFAULT_SORT = ("due_date", False)
+
+
+def sort_key_columns(column):
+    """Столбцы ключа порядка: сам столбец и id, делающий ключ уникальным"""
+    if column not in SORT_COLUMNS:
+        raise ValueError(f"Сортировка по столбцу {column!r} не поддерживается")
+    return ("id",) if column == "id" else (column, "id")
+
+
+def task_sort_key(row, column="due_date"):
+    """Ключ порядка списка задач (column, id) для строки get_all_tasks"""
+    if column == "id":
+        return (row[0],)
+    return row[SORT_COLUMNS[column]], row[0]
+
+
+@functools.total_ordering
+class Descending:
+    """Ключ с обратным сравнением: bisect по списку, упорядоченному по убыванию"""
+    __slots__ = ("key",)
+
+    def __init__(self, key):
+        self.key = key
+
+    def __eq__(self, other):
+        return self.key == other.key
+
+    def __lt__(self, other):
+        return other.key < self.key
+
+
+def sort_order(sort):
+    """Функция ключа строки для порядка sort = (столбец, по убыванию)"""
+    column, descending = sort
+    if descending:
+        return lambda row: Descending(task_sort_key(row, column))
+    return lambda row: task_sort_key(row, column)
+
+
+def order_by_sql(sort):
+    """ORDER BY и условие "после ключа" для порядка sort"""
+    column, descending = sort
+    columns = sort_key_columns(column)
+    direction = " DESC" if descending else ""
+    order_by = ", ".join(name + direction for name in columns)
+    after = f"({', '.join(columns)}) {'<' if descending else '>'} ({', '.join('?' * len(columns))})"
+    return order_by, after
+
+
+class PagedResult:
+    """Упорядоченный результат, дочитываемый страницами.
+
+    Ведет себя как список: поддерживает len(), индексы, срезы и итерацию,
+    но строки, к которым еще не обращались, из базы не читаются. Страницы
+    запрашиваются функцией fetch_page(after, limit) по ключу последней
+    загруженной строки (keyset), поэтому изменения таблицы, сделанные после
+    открытия результата, не сбивают дочитывание. insert_row и remove_row
+    поддерживают результат в актуальном состоянии без повторного запроса.
+    Порядок sort = (столбец, по убыванию), по умолчанию (due_date, id).
+    fetch_ids() - id всех строк результата без чтения самих строк.
+    """
+
+    def __init__(self, fetch_page, total, page_size=500, rows=None, sort=DEFAULT_SORT, fetch_ids=None):
+        self.fetch_page = fetch_page
+        self.fetch_ids = fetch_ids
+        self.total = total
+        self.page_size = page_size
+        self.rows = rows if rows is not None else []
+        self.sort = sort
+        self._order = sort_order(sort)
+        self._exhausted = fetch_page is None or len(self.rows) >= total
+
+    @classmethod
+    def from_rows(cls, rows, sort=DEFAULT_SORT):
+        """Результат поверх уже загруженного списка строк (без копирования)"""
+        return cls(None, len(rows), rows=rows, sort=sort)
+
+    def __len__(self):
+        return self.total
+
+    def _fetch_until(self, count):
+        while len(self.rows) < count and not self._exhausted:
+            wanted = max(self.page_size, count - len(self.rows))
+            after = task_sort_key(self.rows[-1], self.sort[0]) if self.rows else None
+            page = self.fetch_page(after, wanted)
+            self.rows.extend(page)
+            if len(page) < wanted:
+                # Таблица могла измениться между COUNT и выборкой
+                self._exhausted = True
+                self.total = len(self.rows)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self.total)
+            self._fetch_until(max(start, stop))
+            return self.rows[start:stop:step]
+        if index < 0:
+            index += self.total
+        self._fetch_until(index + 1)
+        return self.rows[index]
+
+    def __iter__(self):
+        index = 0
+        while True:
+            self._fetch_until(index + 1)
+            if index >= len(self.rows):
+                return
+            yield self.rows[index]
+            index += 1
+
+    def ids(self):
+        """id всех строк результата; недочитанные строки не загружаются"""
+        if self._exhausted or self.fetch_ids is None:
+            return [row[0] for row in self]
+        return self.fetch_ids()
+
+    def _loaded(self, key):
+        """Попадает ли ключ в уже загруженную часть результата"""
+        return self._exhausted or (self.rows and key <= self._order(self.rows[-1]))
+
+    def insert_row(self, row):
+        """Вставить строку на ее место по порядку; возвращает индекс"""
+        key = self._order(row)
+        index = bisect.bisect_left(self.rows, key, key=self._order)
+        self.total += 1
+        if self._loaded(key):
+            self.rows.insert(index, row)
+        # Иначе строка придет со следующей страницей
+        return index
+
+    def remove_row(self, task_id, old_row=None):
+        """Удалить строку задачи; возвращает ее индекс или None.
+
+        old_row - известная прежняя строка, по ключу которой строка
+        находится двоичным поиском; без нее загруженная часть
+        просматривается целиком.
+        """
+        if old_row is not None:
+            key = self._order(old_row)
+            index = bisect.bisect_left(self.rows, key, key=self._order)
+            if index < len(self.rows) and self.rows[index][0] == task_id:
+                del self.rows[index]
+                self.total -= 1
+                return index
+            if not self._loaded(key):
+                # Строка еще не загружена, но входит в результат
+                self.total -= 1
+            return None
+
+        for index, row in enumerate(self.rows):
+            if row[0] == task_id:
+                del self.rows[index]
+                self.total -= 1
+                return index
+        return None
+
+
+class SavedView(namedtuple("SavedView", "name search_term status_filter category_filter sort")):
+    """Сохраненный вид списка задач (строка saved_views)"""
+    __slots__ = ()
+
+    @property
+    def conditions(self):
+        """Условия вида: (строка поиска, статус, категория, сортировка)"""
+        return self.search_term, self.status_filter, self.category_filter, self.sort
+
+
+class ResultCache:
+    """Кэш результатов списка (id задач по порядку) с вытеснением LRU.
+
+    Запись помнит версию данных (Database.change_version), при которой
+    получен результат, и выдается только при той же версии: любое
+    изменение tasks делает ее устаревшей без явной инвалидации. Хранится
+    не больше max_entries записей, id - компактным массивом array("q").
+    """
+
+    def __init__(self, max_entries=16):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+
+    def get(self, key, version):
+        """id результата для условий key или None, если его нет или он устарел"""
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] != version:
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, key, version, task_ids):
+        self.entries[key] = (version, array("q", task_ids))
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+
+# Набор id одним параметром: JSON-массив, разобранный json_each. Так любое
+# число id помещается в один запрос без лимита на количество параметров
+IDS_SQL = "(SELECT value FROM json_each(?))"
+
+
+def ids_param(task_ids):
+    return json.dumps([int(task_id) for task_id in task_ids])
+
+
+# Слова так, как их выделяет токенайзер unicode61: буквы и цифры
+WORD_RE = re.compile(r"[^\W_]+")
+
+
+class Database:
+    def __init__(self, db_path='tasks.db', read_only=False, dedicated=False, sweep=True):
+        self.db_path = db_path
+        self.read_only = read_only
+        self.dedicated = dedicated
+        self._transaction_depth = 0
+        self.connections = ConnectionManager.for_path(db_path)
+        if dedicated:
+            # Отдельное соединение для записи из фонового потока
+            self.conn = self.connections.connect()
+            cursor = self.conn.execute("SELECT 1 FROM sqlite_master WHERE type='trigger' AND name='tasks_fts_ai'")
+            self.fts_enabled = cursor.fetchone() is not None
+        elif read_only:
+            # Соединение из пула только для чтения, например для фоновых
+            # потоков: схема уже подготовлена основным соединением
+            self.conn = self.connections.acquire_reader()
+            cursor = self.conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='tasks_fts'")
+            self.fts_enabled = cursor.fetchone() is not None
+        else:
+            self.conn = self.connections.acquire_writer()
+            self.fts_enabled = False
+            self.migrate()
+            self.create_search_index()
+            # sweep=False - для открытия только ради чтения: без записи оно не
+            # ждет блокировку. Журнал изменений обрезают окно, сервер и CLI
+            if sweep:
+                self.sweep_overdue()
+
+    def schema_version(self):
+        """Текущая версия схемы (PRAGMA user_version)"""
+        return self.conn.execute("PRAGMA user_version").fetchone()[0]
+
+    def migrate(self):
+        """Применяет к базе все миграции новее ее версии схемы.
+
+        Каждая миграция выполняется в отдельной транзакции вместе с
+        обновлением PRAGMA user_version, поэтому прерванное обновление
+        не оставляет базу в промежуточном состоянии.
+        """
+        version = self.schema_version()
+        for target, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+            cursor = self.conn.cursor()
+            try:
+                cursor.execute("BEGIN")
+                migration(cursor)
+                cursor.execute(f"PRAGMA user_version = {target}")
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+
+    def create_search_index(self):
+        """Создает полнотекстовый индекс FTS5 по названию и описанию задач.
+
+        Индекс хранится во внешней content-таблице tasks_fts и синхронизируется
+        триггерами на INSERT/UPDATE/DELETE. Если SQLite собран без FTS5,
+        поиск продолжает работать через LIKE.
+        """
+        cursor = self.conn.cursor()
+        try:
+            # Триггеры пропадают при пересоздании таблицы tasks миграцией,
+            # в этом случае индекс нужно построить заново
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type='trigger' AND name='tasks_fts_ai'")
+            in_sync = cursor.fetchone() is not None
+
+            cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5(
+                title, description,
+                content='tasks', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2'
+            )
+            ''')
+        except sqlite3.OperationalError:
+            # FTS5 не скомпилирован в эту сборку SQLite
+            self.conn.rollback()
+            self.fts_enabled = False
+            return
+
+        cursor.executescript('''
+        CREATE TRIGGER IF NOT EXISTS tasks_fts_ai AFTER INSERT ON tasks
+        WHEN (SELECT enabled FROM trigger_flags) BEGIN
+            INSERT INTO tasks_fts(rowid, title, description)
+            VALUES (new.id, new.title, new.description);
+        END;
+        CREATE TRIGGER IF NOT EXISTS tasks_fts_ad AFTER DELETE ON tasks BEGIN
+            INSERT INTO tasks_fts(tasks_fts, rowid, title, description)
+            VALUES ('delete', old.id, old.title, old.description);
+        END;
+        CREATE TRIGGER IF NOT EXISTS tasks_fts_au AFTER UPDATE OF title, description ON tasks
+        WHEN old.title IS NOT new.title OR old.description IS NOT new.description BEGIN
+            INSERT INTO tasks_fts(tasks_fts, rowid, title, description)
+            VALUES ('delete', old.id, old.title, old.description);
+            INSERT INTO tasks_fts(rowid, title, description)
+            VALUES (new.id, new.title, new.description);
+        END;
+        ''')
+
+        # Индекс создан впервые для существующей базы - заполняем его
+        if not in_sync:
+            cursor.execute("INSERT INTO tasks_fts(tasks_fts) VALUES ('rebuild')")
+
+        # Индекс архива: задачи в архиве только добавляются и удаляются
+        cursor.execute(f"SELECT 1 FROM sqlite_master WHERE type='trigger' AND name='{ARCHIVE_TABLE}_fts_ai'")
+        archive_in_sync = cursor.fetchone() is not None
+        cursor.executescript(f'''
+        CREATE VIRTUAL TABLE IF NOT EXISTS {ARCHIVE_TABLE}_fts USING fts5(
+            title, description,
+            content='{ARCHIVE_TABLE}', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        );
+        CREATE TRIGGER IF NOT EXISTS {ARCHIVE_TABLE}_fts_ai AFTER INSERT ON {ARCHIVE_TABLE} BEGIN
+            INSERT INTO {ARCHIVE_TABLE}_fts(rowid, title, description)
+            VALUES (new.id, new.title, new.description);
+        END;
+        CREATE TRIGGER IF NOT EXISTS {ARCHIVE_TABLE}_fts_ad AFTER DELETE ON {ARCHIVE_TABLE} BEGIN
+            INSERT INTO {ARCHIVE_TABLE}_fts({ARCHIVE_TABLE}_fts, rowid, title, description)
+            VALUES ('delete', old.id, old.title, old.description);
+        END;
+        ''')
+        if not archive_in_sync:
+            cursor.execute(f"INSERT INTO {ARCHIVE_TABLE}_fts({ARCHIVE_TABLE}_fts) VALUES ('rebuild')")
+        self.conn.commit()
+        self.fts_enabled = True
+
+    @staticmethod
+    def build_match_query(search_term):
+        """Преобразует строку поиска в запрос FTS5 с поиском по префиксу.
+
+        Каждое слово экранируется как фраза и получает '*', слова
+        объединяются через AND: "отч квар" найдет "Отчет за квартал".
+        """
+        tokens = [token.replace('"', '""') for token in search_term.split()]
+        return " ".join(f'"{token}"*' for token in tokens if token)
+
+    @staticmethod
+    def _fold(text):
+        """Приводит текст к виду, в котором его сравнивает unicode61"""
+        folded = []
+        # lower, а не casefold: unicode61 не раскрывает "ß" в "ss"
+        for ch in text.lower():
+            # remove_diacritics затрагивает только латиницу: "é" -> "e", но "ё" остается "ё"
+            base = unicodedata.normalize("NFD", ch)[0]
+            folded.append(base if base < "\u0250" else ch)
+        return "".join(folded)
+
+    def matches_search(self, search_term, title, description):
+        """Проверяет в памяти, подходит ли задача под строку поиска.
+
+        Повторяет семантику get_all_tasks: при FTS5 каждое слово запроса
+        должно быть префиксом слова в названии или описании (слово с
+        разделителями внутри - фразой), без FTS5 - подстрокой, как в LIKE.
+        """
+        if not self.fts_enabled:
+            term = search_term.lower()
+            return term in title.lower() or term in (description or "").lower()
+
+        # Слово запроса без букв и цифр (", *) дает в MATCH пустую фразу: рядом
+        # с другими словами она ни на что не влияет, а одна не находит ничего
+        phrases = [WORD_RE.findall(self._fold(token)) for token in search_term.split()]
+        phrases = [phrase for phrase in phrases if phrase]
+        if not phrases:
+            return False
+        columns = [WORD_RE.findall(self._fold(text or "")) for text in (title, description)]
+        return all(any(self._phrase_in(phrase, words) for words in columns) for phrase in phrases)
+
+    @staticmethod
+    def _phrase_in(phrase, words):
+        """Ищет фразу в списке слов; последнее слово фразы - префикс"""
+        last = len(phrase) - 1
+        for start in range(len(words) - last):
+            if (words[start:start + last] == phrase[:last]
+                    and words[start + last].startswith(phrase[last])):
+                return True
+        return False
+
+    def _search_clause(self, search_term, table="tasks"):
+        """Возвращает условие WHERE и параметры для строки поиска"""
+        match_query = self.build_match_query(search_term) if self.fts_enabled else ""
+        if match_query:
+            return f"id IN (SELECT rowid FROM {table}_fts WHERE {table}_fts MATCH ?)", [match_query]
+        return "(title LIKE ? OR description LIKE ?)", [f"%{search_term}%", f"%{search_term}%"]
+
+    def get_matching_ids(self, search_term):
+        """Множество id задач, подходящих под строку поиска"""
+        clause, params = self._search_clause(search_term)
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT id FROM tasks WHERE " + clause, params)
+        return {row[0] for row in cursor}
+
+    @contextmanager
+    def transaction(self):
+        """Группирует изменения в одну транзакцию (один commit и fsync).
+
+        Методы изменения внутри блока не фиксируют транзакцию сами. При
+        исключении все изменения блока откатываются. Вложенные блоки
+        входят во внешний.
+        """
+        if self._transaction_depth == 0 and not self.conn.in_transaction:
+            self.conn.execute("BEGIN")
+        self._transaction_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self._transaction_depth -= 1
+            if self._transaction_depth == 0:
+                self.conn.rollback()
+            raise
+        self._transaction_depth -= 1
+        if self._transaction_depth == 0:
+            self.conn.commit()
+
+    @contextmanager
+    def deferred_indexing(self):
+        """Транзакция для массовой вставки новых задач с отложенной индексацией.
+
+        На время блока выключаются триггеры GATED_TRIGGERS (FTS, счетчики,
+        версия и журнал изменений). После него новые строки (id больше
+        прежнего максимума) добавляются в FTS и в счетчики запросами по всему
+        набору, версия увеличивается один раз, а просроченные задачи отмечает
+        sweep_overdue - в той же транзакции. Внутри блока допустима только
+        вставка новых задач без явного id.
+        """
+        with self.transaction(), self._triggers_off():
+            cursor = self.conn.cursor()
+            cursor.execute("SELECT IFNULL(MAX(id), 0) FROM tasks")
+            last_id = cursor.fetchone()[0]
+
+            yield self
+
+            if self.fts_enabled:
+                cursor.execute("INSERT INTO tasks_fts(rowid, title, description) "
+                               "SELECT id, title, description FROM tasks WHERE id > ?", (last_id,))
+            for dimension in ("status", "category"):
+                cursor.execute(f"INSERT INTO task_counters (dimension, value, count) "
+                               f"SELECT '{dimension}', IFNULL({dimension}, ''), COUNT(*) FROM tasks "
+                               f"WHERE id > ? GROUP BY IFNULL({dimension}, '') "
+                               f"ON CONFLICT (dimension, value) DO UPDATE SET count = count + excluded.count",
+                               (last_id,))
+            cursor.execute("UPDATE task_changes SET version = version + 1")
+            # Одна запись "изменилось все" вместо записи на каждую строку
+            cursor.execute("INSERT INTO task_log (task_id) VALUES (NULL)")
+            self.sweep_overdue()
+
+    @contextmanager
+    def _triggers_off(self):
+        """Выключить GATED_TRIGGERS до конца блока (только внутри транзакции)"""
+        cursor = self.conn.cursor()
+        enabled = cursor.execute("SELECT enabled FROM trigger_flags").fetchone()[0]
+        cursor.execute("UPDATE trigger_flags SET enabled = 0")
+        try:
+            yield
+        finally:
+            cursor.execute("UPDATE trigger_flags SET enabled = ?", (enabled,))
+
+    def sweep_overdue(self):
+        """Привести статус "Просрочено" в соответствие с текущей датой.
+
+        Незавершенные задачи с прошедшей датой становятся просроченными,
+        просроченные с датой не раньше сегодняшней - новыми. Выборки идут по
+        индексу (status, due_date); если менять нечего, база не изменяется.
+        Иначе на время UPDATE выключаются построчные триггеры счетчиков,
+        версии и журнала (GATED_TRIGGERS), а счетчики пересчитываются по
+        числу перенесенных задач - это важно после массовой вставки старых
+        задач. Вызывается при открытии базы и при смене дня. Возвращает id
+        измененных задач.
+        """
+        active = ", ".join("?" * len(ACTIVE_STATUSES))
+        sweeps = [
+            (f"status IN ({active}) AND due_date < {TODAY_SQL}", ACTIVE_STATUSES, OVERDUE),
+            (f"status = ? AND due_date >= {TODAY_SQL}", (OVERDUE,), ACTIVE_STATUSES[0]),
+        ]
+        cursor = self.conn.cursor()
+        changed = []
+        with self.transaction():
+            moves = []
+            for condition, params, status in sweeps:
+                cursor.execute(f"SELECT status, COUNT(*) FROM tasks WHERE {condition} GROUP BY status", params)
+                counts = cursor.fetchall()
+                if counts:
+                    moves.append((condition, params, status, counts))
+            if not moves:
+                return changed
+
+            with self._triggers_off():
+                for condition, params, status, counts in moves:
+                    cursor.execute(f"UPDATE tasks SET status = ? WHERE {condition} RETURNING id",
+                                   (status, *params))
+                    changed.extend(row[0] for row in cursor.fetchall())
+                    for old_status, count in counts:
+                        cursor.execute("UPDATE task_counters SET count = count - ? "
+                                       "WHERE dimension = 'status' AND value = ?", (count, old_status))
+                    cursor.execute("INSERT INTO task_counters (dimension, value, count) VALUES ('status', ?, ?) "
+                                   "ON CONFLICT (dimension, value) DO UPDATE SET count = count + excluded.count",
+                                   (status, sum(count for _, count in counts)))
+            cursor.execute("UPDATE task_changes SET version = version + 1")
+            cursor.execute("INSERT INTO task_log (task_id) SELECT value FROM json_each(?)", (ids_param(changed),))
+        return changed
+
+    def _commit(self):
+        # Внутри transaction() фиксирует внешний блок
+        if self._transaction_depth == 0:
+            self.conn.commit()
+
+    def add_task(self, title, description, due_date, category):
+        cursor = self.conn.cursor()
+        status = overdue_status_sql(f"'{ACTIVE_STATUSES[0]}'", "?3")
+        cursor.execute(f"INSERT INTO tasks (title, description, due_date, status, category) "
+                       f"VALUES (?1, ?2, ?3, {status}, ?4)",
+                       (title, description, due_date, category))
+        self._commit()
+        return cursor.lastrowid
+
+    def add_tasks_bulk(self, rows):
+        """Добавляет задачи одним executemany в одной транзакции.
+
+        rows - последовательность (title, description, due_date, status, category).
+        Возвращает список id новых задач в порядке rows.
+        """
+        rows = list(rows)
+        if not rows:
+            return []
+        with self.transaction():
+            cursor = self.conn.cursor()
+            # Статус просрочки ставится сразу, без UPDATE после вставки
+            cursor.executemany(f"INSERT INTO tasks (title, description, due_date, status, category) "
+                               f"VALUES (?1, ?2, ?3, {overdue_status_sql('?4', '?3')}, ?5)", rows)
+            # AUTOINCREMENT под блокировкой записи выдает id подряд
+            cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'tasks'")
+            last_id = cursor.fetchone()[0]
+        return list(range(last_id - len(rows) + 1, last_id + 1))
+
+    def _tasks_filter(self, search_term, status_filter, category_filter, table="tasks"):
+        """Условие WHERE и параметры для фильтров списка задач"""
+        where = "WHERE 1=1"
+        params = []
+
+        if search_term.strip():
+            clause, clause_params = self._search_clause(search_term, table)
+            where += " AND " + clause
+            params.extend(clause_params)
+
+        if status_filter != "Все":
+            where += " AND status = ?"
+            params.append(status_filter)
+
+        if category_filter != "Все":
+            where += " AND category = ?"
+            params.append(category_filter)
+
+        return where, params
+
+    def get_all_tasks(self, search_term="", status_filter="Все", category_filter="Все", sort=DEFAULT_SORT):
+        return self.iter_tasks(search_term, status_filter, category_filter, sort).fetchall()
+
+    def iter_tasks(self, search_term="", status_filter="Все", category_filter="Все", sort=DEFAULT_SORT):
+        """Курсор по задачам с фильтрами в порядке sort (по умолчанию (due_date, id))"""
+        where, params = self._tasks_filter(search_term, status_filter, category_filter)
+        order_by, _ = order_by_sql(sort)
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT id, title, description, due_date, status, category FROM tasks "
+                       + where + " ORDER BY " + order_by, params)
+        return cursor
+
+    def _filtered_union(self, columns, search_term, status_filter, category_filter, include_archive):
+        """SELECT columns по tasks (и по архиву, UNION ALL) с фильтрами списка"""
+        queries, params = [], []
+        for table in ("tasks", ARCHIVE_TABLE) if include_archive else ("tasks",):
+            where, table_params = self._tasks_filter(search_term, status_filter, category_filter, table)
+            queries.append(f"SELECT {columns} FROM {table} {where}")
+            params.extend(table_params)
+        return " UNION ALL ".join(queries), params
+
+    def iter_export_rows(self, search_term="", status_filter="Все", category_filter="Все",
+                         include_archive=False):
+        """Курсор по задачам с фильтрами для экспорта: дата уже в формате ДД.ММ.ГГГГ.
+
+        Дата форматируется в SQL; некорректная дата остается как есть.
+        include_archive добавляет задачи из архива в общем порядке дат.
+        """
+        query, params = self._filtered_union(
+            "id, title, description, COALESCE(strftime('%d.%m.%Y', due_date), due_date) AS due, "
+            "status, category, due_date AS sort_date",
+            search_term, status_filter, category_filter, include_archive)
+        cursor = self.conn.cursor()
+        cursor.execute(f"SELECT id, title, description, due, status, category FROM ({query}) "
+                       f"ORDER BY sort_date, id", params)
+        return cursor
+
+    def count_tasks(self, search_term="", status_filter="Все", category_filter="Все", include_archive=False):
+        """Количество задач, подходящих под фильтры"""
+        query, params = self._filtered_union("1", search_term, status_filter, category_filter,
+                                             include_archive)
+        cursor = self.conn.cursor()
+        cursor.execute(f"SELECT COUNT(*) FROM ({query})", params)
+        return cursor.fetchone()[0]
+
+    def get_tasks_paged(self, search_term="", status_filter="Все", category_filter="Все", page_size=500,
+                        sort=DEFAULT_SORT):
+        """Задачи с фильтрами, которые читаются постранично по мере обращения"""
+        def fetch_page(after, limit):
+            return self.get_tasks_page(search_term, status_filter, category_filter, after, limit, sort)
+
+        def fetch_ids():
+            return self.get_task_ids(search_term, status_filter, category_filter)
+
+        return PagedResult(fetch_page, self.count_tasks(search_term, status_filter, category_filter),
+                           page_size, sort=sort, fetch_ids=fetch_ids)
+
+    def get_task_ids(self, search_term="", status_filter="Все", category_filter="Все"):
+        """id задач, подходящих под фильтры, без остальных столбцов"""
+        where, params = self._tasks_filter(search_term, status_filter, category_filter)
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT id FROM tasks " + where, params)
+        return [row[0] for row in cursor]
+
+    def get_tasks_page(self, search_term="", status_filter="Все", category_filter="Все", after=None,
+                       limit=500, sort=DEFAULT_SORT):
+        """Страница задач с фильтрами после ключа after = task_sort_key(строка, столбец).
+
+        sort = (столбец, по убыванию). Выборка идет по индексу столбца (для
+        due_date - (due_date, id)) с позиции ключа, поэтому стоимость
+        страницы не зависит от ее номера.
+        """
+        where, params = self._tasks_filter(search_term, status_filter, category_filter)
+        column, descending = sort
+        if {"status": status_filter, "category": category_filter}.get(column, "Все") != "Все":
+            # Столбец зафиксирован фильтром: тот же порядок дает один id
+            sort = ("id", descending)
+            after = after[1:] if after is not None else None
+        order_by, after_sql = order_by_sql(sort)
+        query = "SELECT id, title, description, due_date, status, category FROM tasks " + where
+        if after is not None:
+            query += " AND " + after_sql
+            params.extend(after)
+        cursor = self.conn.cursor()
+        cursor.execute(query + f" ORDER BY {order_by} LIMIT ?", params + [limit])
+        return cursor.fetchall()
+
+    def change_version(self):
+        """Версия данных задач: меняется при каждом изменении таблицы tasks"""
+        return self.conn.execute("SELECT version FROM task_changes").fetchone()[0]
+
+    def data_version(self):
+        """PRAGMA data_version: меняется после записи в базу другим соединением"""
+        return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def last_change_seq(self):
+        """Номер последней записи журнала изменений task_log"""
+        return self.conn.execute("SELECT IFNULL(MAX(seq), 0) FROM task_log").fetchone()[0]
+
+    def get_changes(self, after_seq):
+        """Изменения задач после записи журнала after_seq.
+
+        Возвращает (номер последней записи, id измененных задач) или None,
+        если изменения по журналу не восстановить: записи после after_seq
+        уже удалены prune_change_log или среди них есть "изменилось все".
+        """
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT seq, task_id FROM task_log WHERE seq > ? ORDER BY seq", (after_seq,))
+        rows = cursor.fetchall()
+        if not rows:
+            return after_seq, set()
+        # seq идут подряд: пропуск означает, что начало журнала обрезано
+        if rows[0][0] != after_seq + 1 or any(task_id is None for _, task_id in rows):
+            return None
+        return rows[-1][0], {task_id for _, task_id in rows}
+
+    def prune_change_log(self, keep=CHANGE_LOG_KEEP):
+        """Удалить из журнала изменений все, кроме keep последних записей"""
+        self.conn.execute("DELETE FROM task_log WHERE seq <= (SELECT MAX(seq) FROM task_log) - ?", (keep,))
+        self._commit()
+
+    def get_saved_views(self):
+        """Сохраненные виды списка по имени"""
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT name, search_term, status_filter, category_filter, sort_column, sort_desc "
+                       "FROM saved_views ORDER BY name")
+        return [SavedView(name, search_term, status_filter, category_filter, (sort_column, bool(sort_desc)))
+                for name, search_term, status_filter, category_filter, sort_column, sort_desc in cursor]
+
+    def get_saved_view(self, name):
+        """Сохраненный вид с именем name или None"""
+        for view in self.get_saved_views():
+            if view.name == name:
+                return view
+        return None
+
+    def save_view(self, name, search_term="", status_filter="Все", category_filter="Все", sort=DEFAULT_SORT):
+        """Сохранить вид списка; вид с тем же именем заменяется"""
+        sort_key_columns(sort[0])
+        self.conn.execute("INSERT INTO saved_views (name, search_term, status_filter, category_filter, "
+                          "sort_column, sort_desc) VALUES (?, ?, ?, ?, ?, ?) "
+                          "ON CONFLICT (name) DO UPDATE SET search_term = excluded.search_term, "
+                          "status_filter = excluded.status_filter, category_filter = excluded.category_filter, "
+                          "sort_column = excluded.sort_column, sort_desc = excluded.sort_desc",
+                          (name, search_term, status_filter, category_filter, sort[0], int(sort[1])))
+        self._commit()
+
+    def delete_view(self, name):
+        cursor = self.conn.execute("DELETE FROM saved_views WHERE name = ?", (name,))
+        self._commit()
+        return cursor.rowcount > 0
+
+    def get_task(self, task_id):
+        """Строка задачи в формате get_all_tasks или None"""
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT id, title, description, due_date, status, category FROM tasks WHERE id = ?",
+                       (task_id,))
+        return cursor.fetchone()
+
+    def search_tasks(self, search_term, limit=50, include_archive=False):
+        """Поиск задач, отсортированных по релевантности (BM25).
+
+        Без FTS5 релевантность недоступна, и результаты упорядочены по дате.
+        include_archive ищет и в архиве; BM25 у каждого индекса свой, поэтому
+        порядок между горячими и архивными задачами приблизительный.
+        """
+        tables = ("tasks", ARCHIVE_TABLE) if include_archive else ("tasks",)
+        cursor = self.conn.cursor()
+        match_query = self.build_match_query(search_term) if self.fts_enabled else ""
+        if match_query:
+            # Совпадения в названии весят больше, чем в описании
+            query = " UNION ALL ".join(
+                f"SELECT t.id, t.title, t.description, t.due_date, t.status, t.category, "
+                f"bm25({table}_fts, 10.0, 1.0) AS rank "
+                f"FROM {table}_fts JOIN {table} t ON t.id = {table}_fts.rowid WHERE {table}_fts MATCH ?"
+                for table in tables)
+            cursor.execute(f"SELECT id, title, description, due_date, status, category FROM ({query}) "
+                           f"ORDER BY rank LIMIT ?", (match_query,) * len(tables) + (limit,))
+            return cursor.fetchall()
+
+        query = " UNION ALL ".join(
+            f"SELECT id, title, description, due_date, status, category FROM {table} "
+            f"WHERE title LIKE ? OR description LIKE ?" for table in tables)
+        cursor.execute(f"SELECT * FROM ({query}) ORDER BY due_date LIMIT ?",
+                       (f"%{search_term}%", f"%{search_term}%") * len(tables) + (limit,))
+        return cursor.fetchall()
+
+    def archive_sources(self, start_date):
+        """[ARCHIVE_TABLE], если в архиве есть задачи с датой от start_date, иначе [].
+
+        В архив попадают только старые задачи, поэтому для текущих и будущих
+        дат календарь его не читает. Проверка - один шаг по индексу.
+        """
+        cursor = self.conn.execute(f"SELECT MAX(due_date) >= ? FROM {ARCHIVE_TABLE}", (start_date,))
+        return [ARCHIVE_TABLE] if cursor.fetchone()[0] else []
+
+    @staticmethod
+    def _union(select, tables, params):
+        """Один SELECT по нескольким таблицам: шаблон с {table} и параметры на каждую"""
+        return " UNION ALL ".join(select.format(table=table) for table in tables), tuple(params) * len(tables)
+
+    def get_tasks_by_date(self, date, sources=None):
+        """Получить задачи на конкретную дату.
+
+        sources - таблицы для выборки; по умолчанию tasks и, если нужно, архив.
+        """
+        if sources is None:
+            sources = ["tasks"] + self.archive_sources(date)
+        cursor = self.conn.cursor()
+        cursor.execute(*self._union("SELECT id, title, description, status, category FROM {table} "
+                                    "WHERE due_date = ?", sources, (date,)))
+        return cursor.fetchall()
+
+    def get_tasks_by_month(self, year, month, sources=None):
+        """Получить задачи за конкретный месяц (из архива - для прошедших месяцев)"""
+        start_date, end_date = month_range(year, month)
+        if sources is None:
+            sources = ["tasks"] + self.archive_sources(start_date)
+
+        cursor = self.conn.cursor()
+        cursor.execute(*self._union("SELECT id, title, due_date, status, category FROM {table} "
+                                    "WHERE due_date >= ? AND due_date < ?", sources, (start_date, end_date)))
+        return cursor.fetchall()
+
+    def get_month_day_counts(self, year, month, sources=None, include_series=True):
+        """Количество задач по дням месяца с разбивкой по статусам.
+
+        Возвращает {день: {статус: количество}} только для дней, на которые
+        есть задачи. Группировка идет по индексу (due_date, status), поэтому
+        стоимость зависит от числа задач в месяце, а результат - не больше
+        нескольких строк на день. Задачи из архива учитываются, если они
+        есть в этом месяце, повторения серий - если include_series.
+        """
+        start_date, end_date = month_range(year, month)
+        if sources is None:
+            sources = ["tasks"] + self.archive_sources(start_date)
+
+        query, params = self._union("SELECT due_date, status, COUNT(*) AS count FROM {table} "
+                                    "WHERE due_date >= ? AND due_date < ? GROUP BY due_date, status",
+                                    sources, (start_date, end_date))
+        if len(sources) > 1:
+            # Одни и те же (дата, статус) могут прийти из обеих таблиц
+            query = f"SELECT due_date, status, SUM(count) FROM ({query}) GROUP BY due_date, status"
+        cursor = self.conn.cursor()
+        cursor.execute(query, params)
+
+        day_counts = {}
+        for due_date, status, count in cursor:
+            day_counts.setdefault(int(due_date[8:10]), {})[status] = count
+        if include_series:
+            merge_day_counts(day_counts, self.get_occurrence_day_counts(year, month))
+        return day_counts
+
+    def add_series(self, title, description, category, start_date, frequency, interval=1, weekdays=(),
+                   month_day=None, until_date=None, count=None):
+        """Добавить серию повторяющихся задач; возвращает ее id.
+
+        Параметры правила - как у recurrence.make_rule, даты - в формате
+        due_date. Граница серии end_date (по count - дата последнего
+        повторения) вычисляется здесь один раз.
+        """
+        rule = make_rule(date.fromisoformat(start_date), frequency, interval, weekdays, month_day,
+                         date.fromisoformat(until_date) if until_date else None, count)
+        cursor = self.conn.cursor()
+        cursor.execute(f"INSERT INTO task_series (title, description, category, {RULE_COLUMNS}, until_date, count) "
+                       f"VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                       (title, description, category, start_date, frequency, interval,
+                        ",".join(map(str, rule.weekdays)) or None, rule.month_day,
+                        rule.until.isoformat() if rule.until else None, until_date or None, count))
+        self._commit()
+        return cursor.lastrowid
+
+    def get_series(self, series_id=None):
+        """Серии в порядке id (или только series_id), строки в порядке SERIES_FIELDS"""
+        cursor = self.conn.cursor()
+        if series_id is None:
+            cursor.execute(f"SELECT {', '.join(SERIES_FIELDS)} FROM task_series ORDER BY id")
+        else:
+            cursor.execute(f"SELECT {', '.join(SERIES_FIELDS)} FROM task_series WHERE id = ?", (series_id,))
+        return cursor.fetchall()
+
+    def delete_series(self, series_id):
+        """Удалить серию вместе с ее исключениями"""
+        with self.transaction():
+            self.conn.execute("DELETE FROM series_exceptions WHERE series_id = ?", (series_id,))
+            cursor = self.conn.execute("DELETE FROM task_series WHERE id = ?", (series_id,))
+        return cursor.rowcount > 0
+
+    def get_occurrences(self, start_date, end_date):
+        """Повторения серий в окне дат [start_date, end_date).
+
+        Строки (series_id, дата, title, description, status, category) в
+        порядке даты и id серии. Читаются только серии, пересекающие окно, и
+        их исключения внутри окна (по первичному ключу), а даты вычисляет
+        recurrence.occurrences - стоимость растет с шириной окна, а не с
+        длиной серий. Без исключения повторение "Новая", на прошедшую дату -
+        "Просрочено"; незавершенный статус исключения просрочивается так же.
+        """
+        cursor = self.conn.cursor()
+        cursor.execute(f"SELECT id, title, description, category, {RULE_COLUMNS} FROM task_series "
+                       f"WHERE start_date < ? AND (end_date IS NULL OR end_date >= ?)", (end_date, start_date))
+        series = cursor.fetchall()
+        if not series:
+            return []
+        cursor.execute(f"SELECT series_id, occurrence_date, status FROM series_exceptions "
+                       f"WHERE series_id IN {IDS_SQL} AND occurrence_date >= ? AND occurrence_date < ?",
+                       (ids_param(row[0] for row in series), start_date, end_date))
+        exceptions = {(series_id, day): status for series_id, day, status in cursor}
+
+        today = date.today().isoformat()
+        window_start, window_end = date.fromisoformat(start_date), date.fromisoformat(end_date)
+        rows = []
+        for series_id, title, description, category, *rule in series:
+            for day in occurrences(_series_rule(*rule), window_start, window_end):
+                day = day.isoformat()
+                status = overdue_status(exceptions.get((series_id, day), ACTIVE_STATUSES[0]), day, today)
+                rows.append((series_id, day, title, description, status, category))
+        rows.sort(key=lambda row: (row[1], row[0]))
+        return rows
+
+    def get_occurrence_day_counts(self, year, month):
+        """Количество повторений серий по дням месяца в формате get_month_day_counts"""
+        day_counts = {}
+        for series_id, day, title, description, status, category in self.get_occurrences(*month_range(year, month)):
+            statuses = day_counts.setdefault(int(day[8:10]), {})
+            statuses[status] = statuses.get(status, 0) + 1
+        return day_counts
+
+    def set_occurrence_status(self, series_id, occurrence_date, status):
+        """Статус одного повторения серии; False, если такого повторения нет.
+
+        "Новая" и "Просрочено" вычисляются по дате, поэтому для них
+        исключение удаляется: в series_exceptions остаются только повторения
+        с отличающимся статусом.
+        """
+        cursor = self.conn.cursor()
+        cursor.execute(f"SELECT {RULE_COLUMNS} FROM task_series WHERE id = ?", (series_id,))
+        row = cursor.fetchone()
+        if row is None or not occurs_on(_series_rule(*row), date.fromisoformat(occurrence_date)):
+            return False
+        if status in (ACTIVE_STATUSES[0], OVERDUE):
+            cursor.execute("DELETE FROM series_exceptions WHERE series_id = ? AND occurrence_date = ?",
+                           (series_id, occurrence_date))
+        else:
+            cursor.execute("INSERT INTO series_exceptions (series_id, occurrence_date, status) VALUES (?, ?, ?) "
+                           "ON CONFLICT (series_id, occurrence_date) DO UPDATE SET status = excluded.status",
+                           (series_id, occurrence_date, status))
+        self._commit()
+        return True
+
+    def archive_completed(self, older_than_days=ARCHIVE_AFTER_DAYS, batch_size=ARCHIVE_BATCH_SIZE,
+                          progress=None, cancelled=None):
+        """Перенести в архив выполненные задачи с датой старше older_than_days дней.
+
+        Задачи переносятся порциями по batch_size, каждая порция - отдельная
+        транзакция (INSERT в архив и DELETE из tasks по списку id), поэтому
+        запись не блокирует базу надолго, а прерванный перенос оставляет
+        базу целой. progress(done, total) вызывается после каждой порции,
+        cancelled() - перед каждой. Возвращает число перенесенных задач.
+        """
+        cursor = self.conn.cursor()
+        cursor.execute(f"SELECT date({TODAY_SQL}, ?)", (f"-{int(older_than_days)} days",))
+        cutoff = cursor.fetchone()[0]
+        condition = "status = ? AND due_date < ?"
+        cursor.execute(f"SELECT COUNT(*) FROM tasks WHERE {condition}", (DONE, cutoff))
+        total = cursor.fetchone()[0]
+        columns = ", ".join(TASKS_COLUMNS)
+        done = 0
+        while done < total and not (cancelled is not None and cancelled()):
+            with self.transaction():
+                cursor.execute(f"SELECT id FROM tasks WHERE {condition} ORDER BY due_date LIMIT ?",
+                               (DONE, cutoff, batch_size))
+                task_ids = ids_param(row[0] for row in cursor.fetchall())
+                cursor.execute(f"INSERT INTO {ARCHIVE_TABLE} ({columns}) "
+                               f"SELECT {columns} FROM tasks WHERE id IN {IDS_SQL}", (task_ids,))
+                cursor.execute(f"DELETE FROM tasks WHERE id IN {IDS_SQL}", (task_ids,))
+                moved = cursor.rowcount
+            if not moved:
+                break
+            done += moved
+            if progress is not None:
+                progress(done, total)
+        return done
+
+    def restore_tasks(self, task_ids):
+        """Вернуть задачи из архива в tasks с прежними id; возвращает их число"""
+        columns = ", ".join(TASKS_COLUMNS)
+        values = columns.replace("status", overdue_status_sql("status", "due_date"))
+        with self.transaction():
+            self.conn.execute(f"INSERT INTO tasks ({columns}) SELECT {values} FROM {ARCHIVE_TABLE} "
+                              f"WHERE id IN {IDS_SQL}", (ids_param(task_ids),))
+            cursor = self.conn.execute(f"DELETE FROM {ARCHIVE_TABLE} WHERE id IN {IDS_SQL}",
+                                       (ids_param(task_ids),))
+        return cursor.rowcount
+
+    def count_archived(self):
+        """Количество задач в архиве"""
+        return self.conn.execute(f"SELECT COUNT(*) FROM {ARCHIVE_TABLE}").fetchone()[0]
+
+    def update_task(self, task_id, title, description, due_date, status, category):
+        cursor = self.conn.cursor()
+        cursor.execute(f'''
+        UPDATE tasks
+        SET title = ?1, description = ?2, due_date = ?3, status = {overdue_status_sql("?4", "?3")}, category = ?5
+        WHERE id = ?6
+        ''', (title, description, due_date, status, category, task_id))
+        self._commit()
+
+    def update_tasks_bulk(self, rows):
+        """Обновляет задачи одним executemany в одной транзакции.
+
+        rows - последовательность (task_id, title, description, due_date, status, category).
+        """
+        with self.transaction():
+            self.conn.executemany(f'''
+            UPDATE tasks
+            SET title = ?1, description = ?2, due_date = ?3, status = {overdue_status_sql("?4", "?3")}, category = ?5
+            WHERE id = ?6
+            ''', ((*row[1:], row[0]) for row in rows))
+
+    def upsert_tasks_bulk(self, rows):
+        """Добавляет или обновляет задачи по id одним executemany.
+
+        rows - последовательность (task_id, title, description, due_date, status, category).
+        Совпадающие с базой строки (с учетом просрочки) не переписываются и не
+        запускают триггеры.
+        """
+        with self.transaction():
+            self.conn.executemany(f'''
+            INSERT INTO tasks (id, title, description, due_date, status, category)
+            VALUES (?1, ?2, ?3, ?4, {overdue_status_sql('?5', '?4')}, ?6)
+            ON CONFLICT (id) DO UPDATE SET
+                title = excluded.title, description = excluded.description, due_date = excluded.due_date,
+                status = excluded.status, category = excluded.category
+            WHERE title IS NOT excluded.title OR description IS NOT excluded.description
+                OR due_date IS NOT excluded.due_date OR status IS NOT excluded.status
+                OR category IS NOT excluded.category
+            ''', rows)
+
+    def delete_task(self, task_id):
+        cursor = self.conn.cursor()
+        cursor.execute("DELETE FROM tasks WHERE id = ?", (task_id,))
+        self._commit()
+
+    def delete_tasks_bulk(self, task_ids):
+        """Удаляет задачи с указанными id одним запросом"""
+        with self.transaction():
+            self.conn.execute(f"DELETE FROM tasks WHERE id IN {IDS_SQL}", (ids_param(task_ids),))
+
+    def set_status_bulk(self, task_ids, status):
+        """Меняет статус задач с указанными id одним запросом"""
+        with self.transaction():
+            self.conn.execute(f"UPDATE tasks SET status = {overdue_status_sql('?1', 'due_date')} "
+                              f"WHERE id IN (SELECT value FROM json_each(?2))",
+                              (status, ids_param(task_ids)))
+
+    def set_category_bulk(self, task_ids, category):
+        """Меняет категорию задач с указанными id одним запросом"""
+        with self.transaction():
+            self.conn.execute(f"UPDATE tasks SET category = ? WHERE id IN {IDS_SQL}",
+                              (category, ids_param(task_ids)))
+
+    def mark_done(self, task_id):
+        cursor = self.conn.cursor()
+        cursor.execute("UPDATE tasks SET status = 'Выполнено' WHERE id = ?", (task_id,))
+        self._commit()
+
+    def get_task_stats(self):
+        """Количество задач по статусам и по категориям.
+
+        Читается из счетчиков task_counters, которые ведут триггеры, в том же
+        порядке, в каком их вернул бы GROUP BY по таблице tasks.
+        """
+        cursor = self.conn.cursor()
+        stats = []
+        for dimension in ("status", "category"):
+            cursor.execute("SELECT NULLIF(value, ''), count FROM task_counters "
+                           "WHERE dimension = ? AND count > 0 ORDER BY value", (dimension,))
+            stats.append(dict(cursor.fetchall()))
+
+        status_stats, category_stats = stats
+        return status_stats, category_stats
+
+    def close(self):
+        """Вернуть соединение менеджеру (последний писатель закрывает все)"""
+        if self.dedicated:
+            self.conn.close()
+        elif self.read_only:
+            self.connections.release_reader(self.conn)
+        else:
+            self.connections.release_writer()
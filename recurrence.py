@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""Правила повторения задач и развертывание повторений по окну дат.
+
+Серия хранится одним правилом: ежедневно, еженедельно по дням недели или
+ежемесячно в заданное число, каждые interval дней, недель или месяцев, до
+даты окончания. Повторения не хранятся, а вычисляются для запрошенного окна
+[window_start, window_end): первое повторение в окне находится арифметикой
+от начала серии, поэтому стоимость зависит от ширины окна, а не от того,
+сколько повторений у серии было до него.
+"""
+import calendar
+from collections import namedtuple
+from datetime import date, timedelta
+
+DAILY = "daily"
+WEEKLY = "weekly"
+MONTHLY = "monthly"
+FREQUENCIES = (DAILY, WEEKLY, MONTHLY)
+
+
+class Rule(namedtuple("Rule", "start frequency interval weekdays month_day until")):
+    """Правило серии.
+
+    start - дата начала (date), weekdays - отсортированный кортеж дней недели
+    (0 - понедельник) для WEEKLY, month_day - число месяца для MONTHLY (в
+    коротких месяцах - последний день), until - последняя возможная дата
+    повторения или None, если серия бесконечна.
+    """
+    __slots__ = ()
+
+
+def make_rule(start, frequency, interval=1, weekdays=(), month_day=None, until=None, count=None):
+    """Проверенное правило; count ограничивает серию первыми count повторениями.
+
+    По умолчанию еженедельная серия повторяется в день недели start, а
+    ежемесячная - в число start. Ошибки параметров - ValueError.
+    """
+    if frequency not in FREQUENCIES:
+        raise ValueError(f"Неизвестная периодичность: {frequency}")
+    if interval < 1:
+        raise ValueError("Интервал повторения должен быть не меньше 1")
+    if frequency == WEEKLY:
+        weekdays = tuple(sorted(set(weekdays or (start.weekday(),))))
+        if not all(0 <= day <= 6 for day in weekdays):
+            raise ValueError("Дни недели - числа от 0 (понедельник) до 6")
+    else:
+        weekdays = ()
+    if frequency == MONTHLY:
+        month_day = month_day or start.day
+        if not 1 <= month_day <= 31:
+            raise ValueError("Число месяца - от 1 до 31")
+    else:
+        month_day = None
+    if until is not None and until < start:
+        raise ValueError("Дата окончания раньше начала серии")
+    rule = Rule(start, frequency, interval, weekdays, month_day, until)
+    if count is not None:
+        if count < 1:
+            raise ValueError("Количество повторений должно быть не меньше 1")
+        last = nth_occurrence(rule, count)
+        if until is None or last < until:
+            rule = rule._replace(until=last)
+    return rule
+
+
+def _month_index(day):
+    return day.year * 12 + day.month - 1
+
+
+def _month_date(index, month_day):
+    year, month = divmod(index, 12)
+    return date(year, month + 1, min(month_day, calendar.monthrange(year, month + 1)[1]))
+
+
+def _ceil_div(a, b):
+    return -(-a // b)
+
+
+def nth_occurrence(rule, n):
+    """Дата n-го (с 1) повторения без учета until - за постоянное время"""
+    if rule.frequency == DAILY:
+        return rule.start + timedelta(days=(n - 1) * rule.interval)
+    if rule.frequency == WEEKLY:
+        monday = rule.start - timedelta(days=rule.start.weekday())
+        # В первой неделе - только дни не раньше start, дальше по len(weekdays)
+        first_week = [day for day in rule.weekdays if day >= rule.start.weekday()]
+        if n <= len(first_week):
+            return monday + timedelta(days=first_week[n - 1])
+        weeks, position = divmod(n - len(first_week) - 1, len(rule.weekdays))
+        return monday + timedelta(weeks=(weeks + 1) * rule.interval, days=rule.weekdays[position])
+    first = _month_index(rule.start)
+    if _month_date(first, rule.month_day) < rule.start:
+        first += rule.interval
+    return _month_date(first + (n - 1) * rule.interval, rule.month_day)
+
+
+def occurrences(rule, window_start, window_end):
+    """Даты повторений в окне [window_start, window_end) по возрастанию"""
+    start = max(window_start, rule.start)
+    end = window_end if rule.until is None else min(window_end, rule.until + timedelta(days=1))
+    if start >= end:
+        return
+
+    if rule.frequency == DAILY:
+        step = timedelta(days=rule.interval)
+        day = rule.start + step * _ceil_div((start - rule.start).days, rule.interval)
+        while day < end:
+            yield day
+            day += step
+
+    elif rule.frequency == WEEKLY:
+        monday = rule.start - timedelta(days=rule.start.weekday())
+        # Первая неделя серии (номер кратен interval), пересекающая окно
+        week = (start - monday).days // 7
+        week = _ceil_div(week, rule.interval) * rule.interval
+        week_start = monday + timedelta(weeks=week)
+        step = timedelta(weeks=rule.interval)
+        while week_start < end:
+            for weekday in rule.weekdays:
+                day = week_start + timedelta(days=weekday)
+                if day >= end:
+                    return
+                if day >= start:
+                    yield day
+            week_start += step
+
+    else:
+        first = _month_index(rule.start)
+        index = first + _ceil_div(_month_index(start) - first, rule.interval) * rule.interval
+        while True:
+            day = _month_date(index, rule.month_day)
+            if day >= end:
+                return
+            if day >= start:
+                yield day
+            index += rule.interval
+
+
+def occurs_on(rule, day):
+    """Есть ли у серии повторение в дату day"""
+    return next(occurrences(rule, day, day + timedelta(days=1)), None) is not None
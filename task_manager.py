@@ -1,111 +1,21 @@
 ﻿# -*- coding: utf-8 -*-
+import sys
+
+# С аргументами - командная строка (cli.py), без загрузки tkinter и графики
+if __name__ == "__main__" and len(sys.argv) > 1:
+    from cli import main
+    sys.exit(main(sys.argv[1:]))
+
 import tkinter as tk
-from tkinter import ttk, messagebox, filedialog
+from tkinter import ttk, messagebox, filedialog, simpledialog
 import sqlite3
 from datetime import datetime, timedelta
-import csv
 import calendar
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import matplotlib.pyplot as plt
-import matplotlib.colors as mcolors
-
-class Database:
-    def __init__(self):
-        self.conn = sqlite3.connect('tasks.db')
-        self.create_table()
-    
-    def create_table(self):
-        cursor = self.conn.cursor()
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS tasks (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            title TEXT NOT NULL,
-            description TEXT,
-            due_date TEXT NOT NULL,
-            status TEXT DEFAULT 'Новая',
-            category TEXT DEFAULT 'Общие'
-        )
-        ''')
-        self.conn.commit()
-    
-    def add_task(self, title, description, due_date, category):
-        cursor = self.conn.cursor()
-        cursor.execute("INSERT INTO tasks (title, description, due_date, category) VALUES (?, ?, ?, ?)",
-                      (title, description, due_date, category))
-        self.conn.commit()
-        return cursor.lastrowid
-    
-    def get_all_tasks(self, search_term="", status_filter="Все", category_filter="Все"):
-        cursor = self.conn.cursor()
-        query = "SELECT id, title, description, due_date, status, category FROM tasks WHERE 1=1"
-        params = []
-        
-        if search_term:
-            query += " AND (title LIKE ? OR description LIKE ?)"
-            params.extend([f"%{search_term}%", f"%{search_term}%"])
-        
-        if status_filter != "Все":
-            query += " AND status = ?"
-            params.append(status_filter)
-        
-        if category_filter != "Все":
-            query += " AND category = ?"
-            params.append(category_filter)
-        
-        query += " ORDER BY due_date"
-        cursor.execute(query, params)
-        return cursor.fetchall()
-    
-    def get_tasks_by_date(self, date):
-        """Получить задачи на конкретную дату"""
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT id, title, description, status, category FROM tasks WHERE due_date = ?", (date,))
-        return cursor.fetchall()
-    
-    def get_tasks_by_month(self, year, month):
-        """Получить задачи за конкретный месяц"""
-        start_date = f"{year}-{month:02d}-01"
-        if month == 12:
-            end_date = f"{year+1}-01-01"
-        else:
-            end_date = f"{year}-{month+1:02d}-01"
-        
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT id, title, due_date, status, category FROM tasks WHERE due_date >= ? AND due_date < ?", 
-                      (start_date, end_date))
-        return cursor.fetchall()
-    
-    def update_task(self, task_id, title, description, due_date, status, category):
-        cursor = self.conn.cursor()
-        cursor.execute('''
-        UPDATE tasks 
-        SET title = ?, description = ?, due_date = ?, status = ?, category = ?
-        WHERE id = ?
-        ''', (title, description, due_date, status, category, task_id))
-        self.conn.commit()
-    
-    def delete_task(self, task_id):
-        cursor = self.conn.cursor()
-        cursor.execute("DELETE FROM tasks WHERE id = ?", (task_id,))
-        self.conn.commit()
-    
-    def mark_done(self, task_id):
-        cursor = self.conn.cursor()
-        cursor.execute("UPDATE tasks SET status = 'Выполнено' WHERE id = ?", (task_id,))
-        self.conn.commit()
-    
-    def get_task_stats(self):
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT status, COUNT(*) FROM tasks GROUP BY status")
-        status_stats = dict(cursor.fetchall())
-        
-        cursor.execute("SELECT category, COUNT(*) FROM tasks GROUP BY category")
-        category_stats = dict(cursor.fetchall())
-        
-        return status_stats, category_stats
-    
-    def close(self):
-        self.conn.close()
+import queue
+import threading
+import csv_io
+from database import ARCHIVE_AFTER_DAYS, DEFAULT_SORT, WORD_RE, Database, PagedResult, ResultCache
+from task_store import TaskStore
 
 class CalendarTab:
     def __init__(self, parent, db, on_date_select=None):
@@ -154,6 +64,7 @@ class CalendarTab:
         # Календарная сетка
         self.calendar_frame = ttk.Frame(self.parent)
         self.calendar_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        self.create_grid()
         
         # Панель задач для выбранного дня
         self.selected_day_frame = ttk.LabelFrame(self.parent, text="Задачи на выбранный день", 
@@ -186,6 +97,10 @@ class CalendarTab:
         self.day_tasks_tree.tag_configure('completed', background='#e6f7ea')
         self.day_tasks_tree.tag_configure('overdue', background='#fde8e8')
         self.day_tasks_tree.tag_configure('in_progress', background='#e6f0ff')
+        
+        # Повторения серий в списке дня: id элемента -> (серия, дата, статус)
+        self.day_occurrences = {}
+        self.day_tasks_tree.bind("<Double-1>", self.toggle_occurrence)
     
     def change_month(self, delta):
         """Переключить месяц вперед или назад"""
@@ -207,25 +122,66 @@ class CalendarTab:
         self.current_date = datetime.now()
         self.update_calendar()
     
+    def create_grid(self):
+        """Создает сетку 6x7 ячеек один раз; обновление меняет только их содержимое"""
+        self.cells = []
+        for index in range(42):
+            week_idx, day_idx = divmod(index, 7)
+            frame = ttk.Frame(self.calendar_frame, width=100, height=80, relief=tk.FLAT)
+            frame.grid(row=week_idx, column=day_idx, sticky="nsew", padx=1, pady=1)
+            frame.grid_propagate(False)
+            
+            # Число месяца
+            day_label = ttk.Label(frame, font=('Segoe UI', 10, 'bold'))
+            day_label.pack(anchor=tk.NW, padx=5, pady=5)
+            
+            # Количество задач на день
+            tasks_label = ttk.Label(frame, font=('Segoe UI', 8, 'bold'))
+            tasks_label.pack(anchor=tk.SW, padx=5)
+            
+            # Из них выполнено и просрочено
+            status_label = ttk.Label(frame, font=('Segoe UI', 8), foreground='#7f8c8d')
+            status_label.pack(anchor=tk.SW, padx=5)
+            
+            # Обработчик клика привязывается к ячейке, а не к числу месяца
+            for widget in (frame, day_label, tasks_label, status_label):
+                widget.bind("<Button-1>", lambda e, i=index: self.on_cell_click(i))
+            
+            self.cells.append((frame, day_label, tasks_label, status_label))
+        
+        # Число месяца в каждой ячейке (0 - день не в текущем месяце) и
+        # показанное состояние: None - ячейка скрыта, () - еще не заполнена
+        self.cell_days = [0] * 42
+        self.cell_states = [()] * 42
+        
+        # Настраиваем пропорции колонок и строк
+        for i in range(7):
+            self.calendar_frame.columnconfigure(i, weight=1)
+        for i in range(6):
+            self.calendar_frame.rowconfigure(i, weight=1)
+    
+    def on_cell_click(self, index):
+        if self.cell_days[index]:
+            self.select_day(self.cell_days[index])
+    
+    @staticmethod
+    def count_color(num_tasks):
+        """Цвет счетчика в зависимости от количества задач"""
+        if num_tasks > 5:
+            return '#e74c3c'  # Красный для большого количества задач
+        elif num_tasks > 2:
+            return '#f39c12'  # Оранжевый для среднего количества
+        return '#2ecc71'  # Зеленый для малого количества
+    
     def update_calendar(self):
         """Обновить отображение календаря"""
-        # Очищаем предыдущий календарь
-        for widget in self.calendar_frame.winfo_children():
-            widget.destroy()
-        
         # Устанавливаем заголовок
         month_name = ["Январь", "Февраль", "Март", "Апрель", "Май", "Июнь", 
                      "Июль", "Август", "Сентябрь", "Октябрь", "Ноябрь", "Декабрь"][self.current_date.month - 1]
         self.month_year_var.set(f"{month_name} {self.current_date.year}")
         
-        # Получаем задачи на месяц
-        month_tasks = self.db.get_tasks_by_month(self.current_date.year, self.current_date.month)
-        tasks_by_day = {}
-        for task in month_tasks:
-            day = int(task[2].split('-')[2])
-            if day not in tasks_by_day:
-                tasks_by_day[day] = []
-            tasks_by_day[day].append(task)
+        # Получаем количество задач по дням и статусам
+        day_counts = self.db.get_month_day_counts(self.current_date.year, self.current_date.month)
         
         # Создаем календарь на месяц
         cal = calendar.Calendar(firstweekday=0)  # Понедельник первый день недели
@@ -234,104 +190,651 @@ class CalendarTab:
         # Отображаем календарь
         today = datetime.now().date()
         
-        for week_idx, week in enumerate(month_days):
-            for day_idx, day in enumerate(week):
-                if day == 0:  # День не в текущем месяце
-                    frame = ttk.Frame(self.calendar_frame, width=100, height=80, relief=tk.FLAT)
-                    frame.grid(row=week_idx, column=day_idx, sticky="nsew", padx=1, pady=1)
-                    continue
-                
-                # Создаем фрейм для дня
+        for index, (frame, day_label, tasks_label, status_label) in enumerate(self.cells):
+            week_idx, day_idx = divmod(index, 7)
+            if week_idx >= len(month_days):
+                # Лишняя неделя для этого месяца
+                state = None
+                day = 0
+            else:
+                day = month_days[week_idx][day_idx]
                 is_today = (self.current_date.year == today.year and 
                            self.current_date.month == today.month and 
                            day == today.day)
-                
-                frame = ttk.Frame(self.calendar_frame, relief=tk.RAISED, borderwidth=1, 
-                                 style='Today.TFrame' if is_today else 'Card.TFrame')
-                frame.grid(row=week_idx, column=day_idx, sticky="nsew", padx=1, pady=1)
-                frame.grid_propagate(False)
-                frame.config(width=100, height=80)
-                
-                # Число месяца
-                day_label = ttk.Label(frame, text=str(day), 
-                                    font=('Segoe UI', 10, 'bold'),
-                                    foreground='#e74c3c' if is_today else '#2c3e50')
-                day_label.pack(anchor=tk.NW, padx=5, pady=5)
-                
-                # Отображаем задачи для этого дня
-                if day in tasks_by_day:
-                    num_tasks = len(tasks_by_day[day])
-                    
-                    # Определяем цвет в зависимости от количества задач
-                    if num_tasks > 5:
-                        color = '#e74c3c'  # Красный для большого количества задач
-                    elif num_tasks > 2:
-                        color = '#f39c12'  # Оранжевый для среднего количества
-                    else:
-                        color = '#2ecc71'  # Зеленый для малого количества
-                    
-                    tasks_label = ttk.Label(frame, text=f"Задач: {num_tasks}", 
-                                          foreground=color, font=('Segoe UI', 8, 'bold'))
-                    tasks_label.pack(anchor=tk.SW, padx=5, pady=5)
-                
-                # Привязываем обработчик клика
-                frame.bind("<Button-1>", lambda e, d=day: self.select_day(d))
-                day_label.bind("<Button-1>", lambda e, d=day: self.select_day(d))
-        
-        # Настраиваем пропорции колонок и строк
-        for i in range(7):
-            self.calendar_frame.columnconfigure(i, weight=1)
-        for i in range(6):
-            self.calendar_frame.rowconfigure(i, weight=1)
+                statuses = day_counts.get(day, {})
+                num_tasks = sum(statuses.values())
+                done = statuses.get("Выполнено", 0)
+                overdue = statuses.get("Просрочено", 0)
+                state = (day, is_today, num_tasks, done, overdue)
+            
+            self.cell_days[index] = day
+            previous = self.cell_states[index]
+            self.cell_states[index] = state
+            # Ячейка не изменилась - не трогаем виджеты
+            if state == previous:
+                continue
+            
+            if state is None:
+                frame.grid_remove()
+                continue
+            if previous is None:
+                frame.grid()
+            
+            day, is_today, num_tasks, done, overdue = state
+            if day == 0:  # День не в текущем месяце
+                frame.configure(style='TFrame', relief=tk.FLAT, borderwidth=0)
+                day_label.configure(text="")
+                tasks_label.configure(text="")
+                status_label.configure(text="")
+                continue
+            
+            frame.configure(style='Today.TFrame' if is_today else 'Card.TFrame', 
+                            relief=tk.RAISED, borderwidth=1)
+            day_label.configure(text=str(day), foreground='#e74c3c' if is_today else '#2c3e50')
+            
+            # Отображаем задачи для этого дня
+            if num_tasks:
+                tasks_label.configure(text=f"Задач: {num_tasks}", foreground=self.count_color(num_tasks))
+            else:
+                tasks_label.configure(text="")
+            
+            details = []
+            if done:
+                details.append(f"✅ {done}")
+            if overdue:
+                details.append(f"⏰ {overdue}")
+            status_label.configure(text="  ".join(details), 
+                                   foreground='#e74c3c' if overdue else '#7f8c8d')
+    
+    @staticmethod
+    def status_tags(status):
+        """Теги цветовой индикации строки по статусу"""
+        if status == "Выполнено":
+            return ['completed']
+        elif status == "Просрочено":
+            return ['overdue']
+        elif status == "В процессе":
+            return ['in_progress']
+        return []
     
     def select_day(self, day):
         """Обработка выбора дня в календаре"""
         selected_date = f"{self.current_date.year}-{self.current_date.month:02d}-{day:02d}"
+        self.show_day(selected_date)
         
+        # Если есть обработчик выбора даты
+        if self.on_date_select:
+            self.on_date_select(selected_date)
+    
+    def show_day(self, selected_date):
+        """Заполнить список задачами и повторениями серий на дату ГГГГ-ММ-ДД"""
         # Получаем задачи на выбранный день
         tasks = self.db.get_tasks_by_date(selected_date)
+        # Повторения серий вычисляются только для этого дня
+        day = datetime.strptime(selected_date, "%Y-%m-%d")
+        occurrences = self.db.get_occurrences(selected_date, (day + timedelta(days=1)).strftime("%Y-%m-%d"))
         
         # Очищаем предыдущие задачи
         for item in self.day_tasks_tree.get_children():
             self.day_tasks_tree.delete(item)
+        self.day_occurrences = {}
         
         # Добавляем новые задачи
         for task in tasks:
-            tags = []
-            if task[3] == "Выполнено":
-                tags.append('completed')
-            elif task[3] == "Просрочено":
-                tags.append('overdue')
-            elif task[3] == "В процессе":
-                tags.append('in_progress')
-                
             self.day_tasks_tree.insert("", tk.END, values=(
-                task[0], 
-                task[1], 
-                task[3], 
+                task[0],
+                task[1],
+                task[3],
                 task[4]
-            ), tags=tags)
+            ), tags=self.status_tags(task[3]))
+        
+        # Повторения помечены ↻ и id серии
+        for series_id, date, title, description, status, category in occurrences:
+            item = self.day_tasks_tree.insert("", tk.END, values=(f"↻{series_id}", title, status, category),
+                                              tags=self.status_tags(status))
+            self.day_occurrences[item] = (series_id, date, status)
         
         # Обновляем заголовок
-        self.selected_day_frame.configure(text=f"Задачи на {day:02d}.{self.current_date.month:02d}.{self.current_date.year}")
+        self.selected_day_frame.configure(text=f"Задачи на {day:%d.%m.%Y}")
+    
+    def toggle_occurrence(self, event):
+        """Двойной щелчок по повторению серии отмечает его выполненным или снимает отметку"""
+        occurrence = self.day_occurrences.get(self.day_tasks_tree.identify_row(event.y))
+        if occurrence is None:
+            return
+        series_id, date, status = occurrence
+        self.db.set_occurrence_status(series_id, date, "Новая" if status == "Выполнено" else "Выполнено")
+        self.update_calendar()
+        self.show_day(date)
+
+class VirtualTreeview:
+    """Виртуальный режим для ttk.Treeview.
+
+    В дереве живет столько элементов, сколько строк помещается в окне, плюс
+    небольшой запас; при прокрутке элементы не пересоздаются, а получают
+    значения следующих строк. Источник строк - список или PagedResult,
+    строки форматируются функцией format_row только в момент показа. Полоса прокрутки отражает положение
+    во всем источнике, выделение хранится по id задач и переживает прокрутку.
+    """
+    BUFFER = 1
+    WHEEL_UNITS = 3
+
+    def __init__(self, tree, scrollbar, format_row):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.format_row = format_row
+        self.rows = []
+        self.offset = 0
+        self.visible = int(tree.cget("height"))
+        self.selected = set()
+        self.focus_id = None
+        self._shown_ids = []
+        self._items = {}
+        self._item_rows = {}
+        self._expected_selection = None
+        
+        scrollbar.configure(command=self.on_scrollbar)
+        tree.configure(yscrollcommand="")
+        tree.bind("<Configure>", self.on_resize)
+        tree.bind("<<TreeviewSelect>>", self.on_select)
+        tree.bind("<MouseWheel>", self.on_wheel)
+        tree.bind("<Button-4>", self.on_wheel)
+        tree.bind("<Button-5>", self.on_wheel)
+        tree.bind("<Up>", lambda e: self.move_focus(-1))
+        tree.bind("<Down>", lambda e: self.move_focus(1))
+        tree.bind("<Prior>", lambda e: self.move_focus(-self.visible))
+        tree.bind("<Next>", lambda e: self.move_focus(self.visible))
+        tree.bind("<Home>", lambda e: self.move_focus(-len(self.rows)))
+        tree.bind("<End>", lambda e: self.move_focus(len(self.rows)))
+    
+    def set_rows(self, rows, keep_position=False):
+        """Показать новый набор строк.
+
+        При keep_position (обновление того же списка) сохраняются позиция
+        прокрутки и выделение, иначе список открывается с начала.
+        """
+        if isinstance(rows, list):
+            rows = PagedResult.from_rows(rows)
+        self.rows = rows
+        if not keep_position:
+            self.offset = 0
+            self.selected.clear()
+            self.focus_id = None
+        # Видимые строки будут отформатированы заново (например, сменилась дата)
+        self._item_rows.clear()
+        self.render()
+    
+    def update_row(self, task_id, row):
+        """Отразить изменение одной задачи без перезагрузки списка.
+
+        row - новая строка задачи или None, если задача удалена или больше
+        не подходит под фильтры. Строка переносится на свое место в порядке
+        (due_date, id), а в дереве меняются только затронутые элементы.
+        """
+        old_row = self._item_rows.get(self._items.get(task_id))
+        self.rows.remove_row(task_id, old_row)
+        if row is not None:
+            self.rows.insert_row(row)
+        else:
+            self.selected.discard(task_id)
+        self.render()
+    
+    def selected_ids(self):
+        """id выделенных задач, в том числе прокрученных за пределы окна"""
+        return sorted(self.selected)
+    
+    def select_item(self, item):
+        """Выделить только показанную строку item (например, по правому щелчку)"""
+        shown = dict(zip(self.tree.get_children(), self._shown_ids))
+        if item in shown:
+            self.focus_id = shown[item]
+            self.selected = {self.focus_id}
+            self.render()
+    
+    def select_all(self):
+        """Выделить все строки источника, а не только показанные"""
+        # Только id: недочитанные страницы не загружаются
+        self.selected = set(self.rows.ids())
+        self.render()
+        return "break"
+    
+    def render(self):
+        total = len(self.rows)
+        self.offset = max(0, min(self.offset, total - self.visible))
+        window = self.rows[self.offset:self.offset + self.visible + self.BUFFER]
+        
+        # Сверка по id задач: элементы уже показанных задач остаются как есть,
+        # освободившиеся элементы получают строки, появившиеся в окне
+        wanted = {row[0] for row in window}
+        free = [item for task_id, item in self._items.items() if task_id not in wanted]
+        items = {}
+        for row in window:
+            item = self._items.get(row[0])
+            if item is None:
+                item = free.pop() if free else self.tree.insert("", tk.END)
+            if self._item_rows.get(item) != row:
+                values, tags = self.format_row(row)
+                self.tree.item(item, values=values, tags=tags)
+                self._item_rows[item] = row
+            items[row[0]] = item
+        if free:
+            self.tree.delete(*free)
+            for item in free:
+                self._item_rows.pop(item, None)
+        
+        self._items = items
+        self._shown_ids = list(items)
+        order = tuple(items.values())
+        if order != self.tree.get_children():
+            self.tree.set_children("", *order)
+        
+        selection = tuple(items[task_id] for task_id in self._shown_ids if task_id in self.selected)
+        if selection != self.tree.selection():
+            # Событие <<TreeviewSelect>> от этого вызова не должно менять self.selected
+            self._expected_selection = selection
+            self.tree.selection_set(selection)
+        if self.focus_id in items:
+            self.tree.focus(items[self.focus_id])
+        
+        self.tree.yview_moveto(0)
+        if total:
+            self.scrollbar.set(self.offset / total, min(1.0, (self.offset + self.visible) / total))
+        else:
+            self.scrollbar.set(0, 1)
+    
+    def scroll_to(self, offset):
+        self.offset = offset
+        self.render()
+    
+    def see(self, index):
+        """Прокрутить так, чтобы строка с номером index была видна"""
+        if index < self.offset:
+            self.scroll_to(index)
+        elif index >= self.offset + self.visible:
+            self.scroll_to(index - self.visible + 1)
+    
+    def on_resize(self, event):
+        rowheight = int(ttk.Style().lookup("Treeview", "rowheight") or 20)
+        items = self.tree.get_children()
+        bbox = self.tree.bbox(items[0]) if items else None
+        heading = bbox[1] if bbox else rowheight
+        visible = max(1, (event.height - heading) // rowheight)
+        if visible != self.visible:
+            self.visible = visible
+            self.render()
+    
+    def on_scrollbar(self, *args):
+        if args[0] == "moveto":
+            self.scroll_to(int(float(args[1]) * len(self.rows)))
+        elif args[0] == "scroll":
+            step = self.visible if args[2] == "pages" else 1
+            self.scroll_to(self.offset + int(args[1]) * step)
+    
+    def on_wheel(self, event):
+        direction = -1 if event.num == 4 or event.delta > 0 else 1
+        self.scroll_to(self.offset + direction * self.WHEEL_UNITS)
+        return "break"
+    
+    def on_select(self, event):
+        selection = self.tree.selection()
+        if selection == self._expected_selection:
+            self._expected_selection = None
+            return
+        self._expected_selection = None
+        shown = dict(zip(self.tree.get_children(), self._shown_ids))
+        chosen = {shown[item] for item in selection if item in shown}
+        if str(self.tree.cget("selectmode")) == "browse":
+            self.selected = chosen
+        else:
+            self.selected = (self.selected - set(self._shown_ids)) | chosen
+        self.focus_id = shown.get(self.tree.focus())
+    
+    def move_focus(self, delta):
+        """Перемещение выделения с клавиатуры с прокруткой окна"""
+        if not self.rows:
+            return "break"
+        if self.focus_id in self._shown_ids:
+            current = self.offset + self._shown_ids.index(self.focus_id)
+        else:
+            current = self.offset
+        target = max(0, min(len(self.rows) - 1, current + delta))
+        self.focus_id = self.rows[target][0]
+        self.selected = {self.focus_id}
+        self.see(target)
+        self.render()
+        return "break"
+
+class TaskSearch:
+    """Фоновый поиск задач для списка на вкладке задач.
+
+    Ввод откладывается на delay мс, запрос выполняется в отдельном потоке
+    со своим соединением только для чтения, а результаты устаревших
+    запросов отбрасываются. Если новый запрос уточняет предыдущий (та же
+    строка с дописанными символами и те же фильтры), уже полученные
+    задачи фильтруются в памяти без обращения к базе. Без строки поиска
+    фильтры обслуживаются из хранилища в памяти сразу, без потока. Порядок
+    сортировки входит в условия запроса. Полученные id запоминаются в кэше
+    (ResultCache) с версией данных: повторный поиск с теми же условиями,
+    пока задачи не менялись, берет строки из хранилища без запроса к tasks.
+    """
+    POLL_INTERVAL = 30
+
+    def __init__(self, root, store, on_results, delay=250):
+        self.root = root
+        self.store = store
+        self.on_results = on_results
+        self.delay = delay
+        self.generation = 0
+        self.last_key = None
+        self.last_rows = None
+        self.last_version = None
+        self.cache = ResultCache()
+        self._wanted = None
+        self._after_id = None
+        self._poll_id = None
+        self._reader = None
+        self._requests = queue.Queue()
+        self._results = queue.Queue()
+        threading.Thread(target=self._worker, daemon=True).start()
+    
+    def schedule(self, search_term, status_filter, category_filter, sort=DEFAULT_SORT, delay=None):
+        """Запланировать поиск; повторный запрос с теми же условиями игнорируется"""
+        key = (search_term, status_filter, category_filter, sort)
+        if key == self._wanted:
+            return
+        self._wanted = key
+        if self._after_id:
+            self.root.after_cancel(self._after_id)
+        self._after_id = self.root.after(self.delay if delay is None else delay, self._submit)
+    
+    def remember(self, key, rows, version=None):
+        """Запомнить актуальный результат, от которого можно уточнять поиск
+
+        rows=None означает, что результат не загружен в память целиком;
+        version - версия данных, при которой получен результат.
+        """
+        self.last_key = key
+        self.last_rows = rows
+        self.last_version = version
+        self._wanted = key
+    
+    def invalidate(self):
+        """Отменить отложенный и выполняющийся поиск"""
+        if self._after_id:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+        self.generation += 1
+        self._interrupt()
+    
+    @staticmethod
+    def narrows(previous, current):
+        """Уточняет ли запрос current запрос previous"""
+        if previous is None:
+            return False
+        previous_term, *previous_filters = previous
+        term, *filters = current
+        # Запрос без букв и цифр (") в FTS5 не находит ничего, а его продолжение - находит
+        return (filters == previous_filters and WORD_RE.search(previous_term) is not None
+                and term.startswith(previous_term))
+    
+    def _submit(self):
+        self._after_id = None
+        self.generation += 1
+        key = self._wanted
+        if not key[0].strip():
+            self._interrupt()
+            search_term, status_filter, category_filter, sort = key
+            rows = self.store.get_tasks_paged(search_term, status_filter, category_filter, sort=sort)
+            self.remember(key, None)
+            self.on_results(rows)
+            return
+        version = self.store.db.change_version()
+        task_ids = self.cache.get(key, version)
+        if task_ids is not None:
+            self._interrupt()
+            rows = [self.store.get_task(task_id) for task_id in task_ids]
+            self.remember(key, rows, version)
+            self.on_results(PagedResult.from_rows(rows, key[3]))
+            return
+        # Копия: показанный список меняется на месте при правке задач.
+        # Уточненный результат кэшируется, только если база не менялась
+        base = base_version = None
+        if self.last_rows is not None and self.narrows(self.last_key, key):
+            base = list(self.last_rows)
+            base_version = version if self.last_version == version else None
+        self._interrupt()
+        self._requests.put((self.generation, key, base, base_version))
+        if self._poll_id is None:
+            self._poll_id = self.root.after(self.POLL_INTERVAL, self._poll)
+    
+    def _interrupt(self):
+        # interrupt() можно вызывать из любого потока, он прерывает только
+        # выполняющийся в этот момент запрос
+        if self._reader is not None:
+            self._reader.conn.interrupt()
+    
+    def _worker(self):
+        self._reader = Database(self.store.db.db_path, read_only=True)
+        while True:
+            request = self._requests.get()
+            # Из накопившихся запросов актуален только последний
+            while not self._requests.empty():
+                request = self._requests.get_nowait()
+            generation, key, base, version = request
+            if generation != self.generation:
+                continue
+            
+            search_term, status_filter, category_filter, sort = key
+            try:
+                if base is not None:
+                    rows = [row for row in base
+                            if self._reader.matches_search(search_term, row[1], row[2])]
+                else:
+                    # Версия читается до запроса: изменение между ними только
+                    # сделает запись кэша устаревшей раньше времени
+                    version = self._reader.change_version()
+                    rows = self._reader.get_all_tasks(search_term, status_filter, category_filter, sort)
+            except sqlite3.Error as e:
+                rows = e
+            self._results.put((generation, key, rows, version))
+    
+    def _poll(self):
+        self._poll_id = None
+        while True:
+            try:
+                generation, key, rows, version = self._results.get_nowait()
+            except queue.Empty:
+                break
+            if generation != self.generation:
+                continue
+            # Ошибка поиска (в том числе прерванный запрос) - оставляем список как есть
+            if not isinstance(rows, Exception):
+                if version is not None:
+                    self.cache.put(key, version, (row[0] for row in rows))
+                self.remember(key, rows, version)
+                self.on_results(PagedResult.from_rows(rows, key[3]))
+            return
+        self._poll_id = self.root.after(self.POLL_INTERVAL, self._poll)
+
+class ProgressDialog:
+    """Окно с полосой прогресса и отменой для долгой фоновой операции.
+
+    work(progress, cancelled) выполняется в отдельном потоке: progress(done,
+    total) сообщает ход работы, cancelled() становится истинным после
+    нажатия "Отмена". Результат или исключение передаются в on_done или
+    on_error уже в потоке Tk.
+    """
+    POLL_INTERVAL = 100
+    
+    def __init__(self, root, title, describe=None):
+        self.root = root
+        self.describe = describe or (lambda done, total: f"{done} из {total}")
+        self.window = tk.Toplevel(root)
+        self.window.title(title)
+        self.window.resizable(False, False)
+        self.window.configure(bg="#f5f7fa")
+        self.window.transient(root)
+        self.window.protocol("WM_DELETE_WINDOW", self.cancel)
+        
+        frame = ttk.Frame(self.window, style="Card.TFrame")
+        frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        self.label = ttk.Label(frame, text="Подготовка...")
+        self.label.pack(padx=10, pady=(10, 5), anchor=tk.W)
+        self.bar = ttk.Progressbar(frame, length=320, mode="determinate")
+        self.bar.pack(padx=10, pady=5)
+        self.cancel_button = ttk.Button(frame, text="Отмена", command=self.cancel)
+        self.cancel_button.pack(pady=(5, 10))
+        self.window.grab_set()
+        
+        self._cancelled = threading.Event()
+        self._progress = None
+        self._result = None
+    
+    def cancel(self):
+        self._cancelled.set()
+        self.cancel_button.state(["disabled"])
+        self.label.configure(text="Отмена...")
+    
+    def run(self, work, on_done, on_error):
+        self.on_done = on_done
+        self.on_error = on_error
         
-        # Если есть обработчик выбора даты
-        if self.on_date_select:
-            self.on_date_select(selected_date)
+        def target():
+            try:
+                self._result = (True, work(self._report, self._cancelled.is_set))
+            except Exception as e:
+                self._result = (False, e)
+        
+        self._thread = threading.Thread(target=target, daemon=True)
+        self._thread.start()
+        self.root.after(self.POLL_INTERVAL, self._poll)
+    
+    def _report(self, done, total):
+        # Вызывается из рабочего потока: только запоминаем, окно обновит _poll
+        self._progress = (done, total)
+    
+    def _poll(self):
+        if self._progress is not None and not self._cancelled.is_set():
+            done, total = self._progress
+            self.bar.configure(maximum=max(total, 1), value=done)
+            self.label.configure(text=self.describe(done, total))
+        if self._thread.is_alive():
+            self.root.after(self.POLL_INTERVAL, self._poll)
+            return
+        self.window.grab_release()
+        self.window.destroy()
+        ok, value = self._result
+        if ok:
+            self.on_done(value)
+        else:
+            self.on_error(value)
+
+class RefreshScheduler:
+    """Отложенное обновление представлений после изменения задач.
+
+    Изменения только помечают представления устаревшими (invalidate) с
+    набором затронутых id. Обновление выполняется одним проходом after_idle
+    и только для видимых представлений; скрытые остаются устаревшими до
+    показа (flush при переключении вкладки). Серия изменений между
+    проходами сливается в одно обновление каждого представления.
+    """
+    
+    def __init__(self, root):
+        self.root = root
+        self.views = {}
+        self.dirty = {}
+        self._after_id = None
+    
+    def register(self, name, refresh, visible=lambda: True):
+        """refresh(task_ids) получает накопленные id или None - "обновить все" """
+        self.views[name] = (refresh, visible)
+    
+    def invalidate(self, task_ids=None, views=None):
+        """Пометить представления (по умолчанию все) устаревшими"""
+        for name in views or self.views:
+            if task_ids is None or self.dirty.get(name, set()) is None:
+                self.dirty[name] = None
+            else:
+                self.dirty.setdefault(name, set()).update(task_ids)
+        if self._after_id is None:
+            self._after_id = self.root.after_idle(self.flush)
+    
+    def flush(self):
+        """Обновить устаревшие видимые представления"""
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+        for name in list(self.dirty):
+            refresh, visible = self.views[name]
+            if visible():
+                refresh(self.dirty.pop(name))
 
 class TaskManagerApp:
+    # Столбцы списка, по которым сортирует щелчок по заголовку
+    SORT_HEADINGS = {"ID": "id", "Название": "title", "Дата": "due_date",
+                     "Статус": "status", "Категория": "category"}
+    # Варианты повтора в форме добавления: еженедельно - в день недели даты,
+    # ежемесячно - в ее число
+    REPEATS = {"Нет": None, "Ежедневно": "daily", "Еженедельно": "weekly", "Ежемесячно": "monthly"}
+    # Период проверки изменений от других процессов, мс
+    CHANGES_POLL_INTERVAL = 500
+    
     def __init__(self, root):
         self.root = root
         self.root.title("Менеджер задач")
         self.root.geometry("1100x800")
         self.root.configure(bg="#f5f7fa")
         
-        self.check_database()
-        
         self.db = Database()
+        # До загрузки хранилища: запись между ними сменит версию и будет подхвачена
+        self.data_version = self.db.data_version()
+        self.store = TaskStore(self.db)
+        self.search = TaskSearch(self.root, self.store, self.render_tasks)
+        self.task_sort = DEFAULT_SORT
+        self.refresh = RefreshScheduler(self.root)
         self.create_styles()
         self.create_widgets()
         self.load_tasks()
+        self.db.prune_change_log()
+        self.schedule_overdue_sweep()
+        self.root.after(self.CHANGES_POLL_INTERVAL, self.poll_changes)
+    
+    def poll_changes(self):
+        """Подхватить изменения базы, записанные другими процессами и соединениями.
+
+        PRAGMA data_version не читает таблицы, поэтому проверка без изменений
+        почти ничего не стоит; при смене версии хранилище применяет журнал
+        изменений, а представления обновляются только для измененных задач.
+        """
+        version = self.db.data_version()
+        if version != self.data_version:
+            self.data_version = version
+            task_ids = self.store.apply_changes()
+            if task_ids is None:
+                self.refresh.invalidate()
+            else:
+                if task_ids:
+                    self.refresh.invalidate(task_ids)
+                # Серии в журнал изменений не попадают, а календарь читает их из базы
+                self.refresh.invalidate(views=["calendar"])
+        self.root.after(self.CHANGES_POLL_INTERVAL, self.poll_changes)
+    
+    def schedule_overdue_sweep(self):
+        """Запустить sweep_overdue в начале следующих суток"""
+        now = datetime.now()
+        midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+        # Секунда запаса, чтобы date('now') в SQLite уже показывала новый день
+        delay = int((midnight - now).total_seconds() * 1000) + 1000
+        self.root.after(delay, self.sweep_overdue)
+    
+    def sweep_overdue(self):
+        self.db.prune_change_log()
+        task_ids = self.store.sweep_overdue()
+        if task_ids:
+            self.refresh.invalidate(task_ids, views=["tasks", "stats"])
+        # Со сменой дня меняется и подсветка сегодняшнего дня в календаре
+        self.refresh.invalidate(views=["calendar"])
+        self.schedule_overdue_sweep()
     
     def create_styles(self):
         self.style = ttk.Style()
@@ -411,17 +914,28 @@ class TaskManagerApp:
         # Вкладка статистики
         self.stats_tab = ttk.Frame(self.notebook)
         self.notebook.add(self.stats_tab, text="📊 Статистика")
+        self.notebook.bind("<<NotebookTabChanged>>", self.on_tab_changed)
         
-        # Создаем содержимое вкладок
+        # Создаем содержимое вкладок; статистика (и matplotlib) - при первом открытии
         self.create_tasks_tab()
         self.create_calendar_tab()
-        self.create_stats_tab()
+        self.stats_built = False
+        
+        # Представления, которые обновляются после изменения задач
+        self.refresh.register("tasks", self.refresh_tasks, lambda: self.tab_visible(self.tasks_tab))
+        self.refresh.register("calendar", lambda task_ids: self.calendar.update_calendar(),
+                              lambda: self.tab_visible(self.calendar_tab))
+        self.refresh.register("stats", lambda task_ids: self.update_stats(),
+                              lambda: self.stats_built and self.tab_visible(self.stats_tab))
+        self.refresh.invalidate(views=["stats"])
         
         # Панель инструментов
         toolbar = ttk.Frame(self.root, style="Card.TFrame")
         toolbar.pack(fill=tk.X, padx=10, pady=(0, 10))
         
         ttk.Button(toolbar, text="📤 Экспорт в CSV", command=self.export_to_csv).pack(side=tk.LEFT, padx=5, pady=5)
+        ttk.Button(toolbar, text="📥 Импорт из CSV", command=self.import_from_csv).pack(side=tk.LEFT, padx=5, pady=5)
+        ttk.Button(toolbar, text="🗄 В архив", command=self.archive_completed).pack(side=tk.LEFT, padx=5, pady=5)
         ttk.Button(toolbar, text="🔄 Обновить", command=self.load_tasks).pack(side=tk.LEFT, padx=5, pady=5)
         ttk.Button(toolbar, text="❌ Выход", command=self.root.destroy, style="Accent.TButton").pack(side=tk.RIGHT, padx=5, pady=5)
     
@@ -454,6 +968,22 @@ class TaskManagerApp:
         self.category_combo.set("Общие")
         self.category_combo.grid(row=3, column=1, padx=10, pady=5, sticky=tk.W)
         
+        # Повтор: задача становится серией с первым повторением в указанную дату
+        ttk.Label(input_frame, text="Повтор:").grid(row=0, column=2, sticky=tk.W, padx=10, pady=5)
+        self.repeat_var = tk.StringVar()
+        self.repeat_combo = ttk.Combobox(input_frame, textvariable=self.repeat_var,
+                                         values=list(self.REPEATS), state="readonly", width=17)
+        self.repeat_combo.set("Нет")
+        self.repeat_combo.grid(row=0, column=3, padx=10, pady=5, sticky=tk.W)
+        
+        ttk.Label(input_frame, text="До (ДД.ММ.ГГГГ):").grid(row=1, column=2, sticky=tk.W, padx=10, pady=5)
+        self.until_entry = ttk.Entry(input_frame, width=20)
+        self.until_entry.grid(row=1, column=3, padx=10, pady=5, sticky=tk.W)
+        
+        ttk.Label(input_frame, text="Повторений:").grid(row=2, column=2, sticky=tk.W, padx=10, pady=5)
+        self.count_entry = ttk.Entry(input_frame, width=20)
+        self.count_entry.grid(row=2, column=3, padx=10, pady=5, sticky=tk.W)
+        
         # Кнопки
         btn_frame = ttk.Frame(self.tasks_tab, style="Card.TFrame")
         btn_frame.pack(pady=10)
@@ -471,15 +1001,15 @@ class TaskManagerApp:
         ttk.Label(filter_frame, text="Поиск:").grid(row=0, column=0, sticky=tk.W, padx=10, pady=5)
         self.search_entry = ttk.Entry(filter_frame, width=30)
         self.search_entry.grid(row=0, column=1, padx=10, pady=5, sticky=tk.W)
-        self.search_entry.bind("<KeyRelease>", lambda e: self.load_tasks())
+        self.search_entry.bind("<KeyRelease>", lambda e: self.schedule_search())
         
         # Фильтр по статусу
         ttk.Label(filter_frame, text="Статус:").grid(row=0, column=2, sticky=tk.W, padx=10, pady=5)
         self.status_var = tk.StringVar(value="Все")
-        statuses = ["Все", "Новая", "В процессе", "Выполнено"]
+        statuses = ["Все", "Новая", "В процессе", "Просрочено", "Выполнено"]
         ttk.Combobox(filter_frame, textvariable=self.status_var, 
                     values=statuses, state="readonly", width=12).grid(row=0, column=3, padx=10, pady=5)
-        self.status_var.trace_add("write", lambda *args: self.load_tasks())
+        self.status_var.trace_add("write", lambda *args: self.schedule_search(delay=0))
         
         # Фильтр по категории
         ttk.Label(filter_frame, text="Категория:").grid(row=0, column=4, sticky=tk.W, padx=10, pady=5)
@@ -487,20 +1017,32 @@ class TaskManagerApp:
         categories_filter = ["Все"] + categories
         ttk.Combobox(filter_frame, textvariable=self.category_filter_var, 
                     values=categories_filter, state="readonly", width=12).grid(row=0, column=5, padx=10, pady=5)
-        self.category_filter_var.trace_add("write", lambda *args: self.load_tasks())
+        self.category_filter_var.trace_add("write", lambda *args: self.schedule_search(delay=0))
+        
+        # Сохраненные виды: именованные условия поиска, фильтров и сортировки
+        ttk.Label(filter_frame, text="Вид:").grid(row=1, column=0, sticky=tk.W, padx=10, pady=5)
+        self.view_var = tk.StringVar()
+        self.view_combo = ttk.Combobox(filter_frame, textvariable=self.view_var, state="readonly", width=27)
+        self.view_combo.grid(row=1, column=1, padx=10, pady=5, sticky=tk.W)
+        self.view_combo.bind("<<ComboboxSelected>>", lambda e: self.apply_view(self.view_var.get()))
+        ttk.Button(filter_frame, text="💾 Сохранить вид", command=self.save_view).grid(
+            row=1, column=2, columnspan=2, padx=10, pady=5, sticky=tk.W)
+        ttk.Button(filter_frame, text="🗑 Удалить вид", command=self.delete_view).grid(
+            row=1, column=4, columnspan=2, padx=10, pady=5, sticky=tk.W)
+        self.load_views()
         
         # Таблица задач
         tree_frame = ttk.Frame(self.tasks_tab, style="Card.TFrame")
         tree_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
         
         self.tree = ttk.Treeview(tree_frame, columns=("ID", "Название", "Описание", "Дата", "Статус", "Категория"), 
-                                show="headings", selectmode="browse")
+                                show="headings", selectmode="extended")
         
-        # Настройка скроллбара
-        scrollbar = ttk.Scrollbar(tree_frame, orient="vertical", command=self.tree.yview)
-        self.tree.configure(yscrollcommand=scrollbar.set)
+        # Настройка скроллбара: прокруткой управляет виртуальный список
+        scrollbar = ttk.Scrollbar(tree_frame, orient="vertical")
         scrollbar.pack(side="right", fill="y")
         self.tree.pack(fill="both", expand=True)
+        self.task_list = VirtualTreeview(self.tree, scrollbar, self.format_task_row)
         
         # Заголовки столбцов
         columns = {
@@ -515,6 +1057,9 @@ class TaskManagerApp:
         for col, settings in columns.items():
             self.tree.heading(col, text=col)
             self.tree.column(col, **settings)
+        for col, column in self.SORT_HEADINGS.items():
+            self.tree.heading(col, command=lambda c=column: self.sort_tasks(c))
+        self.show_task_sort()
         
         # Теги для цветовой индикации
         self.tree.tag_configure('completed', background='#e6f7ea')
@@ -523,10 +1068,34 @@ class TaskManagerApp:
         
         # Привязка двойного клика для редактирования
         self.tree.bind("<Double-1>", self.edit_task)
+        
+        # Контекстное меню для выделенных задач
+        self.task_menu = tk.Menu(self.tree, tearoff=0)
+        self.task_menu.add_command(label="✅ Выполнено", command=self.mark_done)
+        status_menu = tk.Menu(self.task_menu, tearoff=0)
+        for status in statuses[1:]:
+            status_menu.add_command(label=status, command=lambda s=status: self.set_status(s))
+        self.task_menu.add_cascade(label="Статус", menu=status_menu)
+        category_menu = tk.Menu(self.task_menu, tearoff=0)
+        for category in categories:
+            category_menu.add_command(label=category, command=lambda c=category: self.set_category(c))
+        self.task_menu.add_cascade(label="Категория", menu=category_menu)
+        self.task_menu.add_separator()
+        self.task_menu.add_command(label="❌ Удалить", command=self.delete_task)
+        self.tree.bind("<Button-3>", self.show_task_menu)
+        self.tree.bind("<Control-a>", lambda e: self.task_list.select_all())
+        self.tree.bind("<Delete>", lambda e: self.delete_task())
+    
+    def show_task_menu(self, event):
+        item = self.tree.identify_row(event.y)
+        if item and item not in self.tree.selection():
+            self.task_list.select_item(item)
+        if self.task_list.selected_ids():
+            self.task_menu.tk_popup(event.x_root, event.y_root)
     
     def create_calendar_tab(self):
         """Создаем вкладку календаря"""
-        self.calendar = CalendarTab(self.calendar_tab, self.db, self.on_date_select)
+        self.calendar = CalendarTab(self.calendar_tab, self.store, self.on_date_select)
     
     def on_date_select(self, date):
         """Обработчик выбора даты в календаре"""
@@ -543,6 +1112,8 @@ class TaskManagerApp:
             pass
     
     def create_stats_tab(self):
+        import charts
+        
         # Фрейм для статистики
         stats_frame = ttk.Frame(self.stats_tab)
         stats_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
@@ -561,99 +1132,18 @@ class TaskManagerApp:
                                      style="Card.TLabelframe")
         category_frame.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True, padx=10, pady=10)
         
-        # Обновление статистики
-        self.update_stats(status_frame, category_frame)
+        # Диаграммы создаются один раз; дальше меняются только данные
+        self.status_chart = charts.PieChart(status_frame, 'Статусы задач', title_size=14, dpi=80, 
+                                            colors=charts.status_colors, explode=0.05)
+        self.category_chart = charts.PieChart(category_frame, 'Категории задач', title_size=12, dpi=100, 
+                                              colors=charts.category_colors)
+        self.stats_built = True
     
-    def update_stats(self, status_frame, category_frame):
-        # Очищаем предыдущие графики
-        for widget in status_frame.winfo_children():
-            widget.destroy()
-        
-        for widget in category_frame.winfo_children():
-            widget.destroy()
-        
-        # Получаем данные
-        status_stats, category_stats = self.db.get_task_stats()
-        
-        # Создаем график для статусов
-        fig1 = plt.Figure(figsize=(6, 4), dpi=80, facecolor='#f5f7fa')
-        ax1 = fig1.add_subplot(111, facecolor='#f5f7fa')
-        
-        if status_stats:
-            colors = ['#3498db', '#2ecc71', '#e74c3c', '#f39c12', '#9b59b6']
-            explode = [0.05] * len(status_stats)
-            
-            wedges, texts, autotexts = ax1.pie(
-                status_stats.values(), 
-                labels=status_stats.keys(), 
-                autopct=lambda p: f'{p:.1f}%\n({int(p*sum(status_stats.values())/100)})',
-                explode=explode,
-                colors=colors[:len(status_stats)],
-                shadow=True,
-                startangle=90,
-                textprops={'fontsize': 10}
-            )
-            
-            # Делаем подписи жирными
-            for text in texts:
-                text.set_fontweight('bold')
-                
-            for autotext in autotexts:
-                autotext.set_fontweight('bold')
-                autotext.set_fontsize(10)
-                
-            ax1.set_title('Статусы задач', fontsize=14, fontweight='bold', color='#2c3e50', pad=10)
-            ax1.axis('equal')
-            
-        else:
-            ax1.text(0.5, 0.5, 'Нет данных', ha='center', va='center', 
-                    fontsize=12, fontweight='bold', color='#7f8c8d')
-            ax1.set_axis_off()
-        
-        canvas1 = FigureCanvasTkAgg(fig1, master=status_frame)
-        canvas1.draw()
-        canvas1.get_tk_widget().pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
-        
-        # Создаем график для категорий
-        fig2 = plt.Figure(figsize=(6, 4), dpi=100, facecolor='#f5f7fa')
-        ax2 = fig2.add_subplot(111, facecolor='#f5f7fa')
-        
-        if category_stats:
-            # Генерируем цвета на основе количества категорий
-            colors = list(mcolors.TABLEAU_COLORS.values())
-            if len(category_stats) > len(colors):
-                colors = list(plt.cm.tab20.colors)
-            
-            wedges, texts, autotexts = ax2.pie(
-                category_stats.values(), 
-                labels=category_stats.keys(), 
-                autopct=lambda p: f'{p:.1f}%\n({int(p*sum(category_stats.values())/100)})',
-                colors=colors[:len(category_stats)],
-                shadow=True,
-                startangle=90,
-                textprops={'fontsize': 10}
-            )
-            
-            # Делаем подписи жирными
-            for text in texts:
-                text.set_fontweight('bold')
-                
-            for autotext in autotexts:
-                autotext.set_fontweight('bold')
-                autotext.set_fontsize(10)
-                
-            ax2.set_title('Категории задач', fontsize=12, fontweight='bold', color='#2c3e50', pad=10)
-            ax2.axis('equal')
-            
-            
-        else:
-            ax2.text(0.5, 0.5, 'Нет данных', ha='center', va='center', 
-                    fontsize=12, fontweight='bold', color='#7f8c8d')
-            ax2.set_axis_off()
-        
-        canvas2 = FigureCanvasTkAgg(fig2, master=category_frame)
-        canvas2.draw()
-        canvas2.get_tk_widget().pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+    def update_stats(self):
+        """Перерисовать диаграммы по текущим счетчикам"""
+        status_stats, category_stats = self.store.get_task_stats()
+        self.status_chart.update(status_stats)
+        self.category_chart.update(category_stats)
     
     def add_task(self):
         title = self.title_entry.get().strip()
@@ -673,82 +1163,202 @@ class TaskManagerApp:
             messagebox.showerror("Ошибка", "Неверный формат даты! Используйте ДД.ММ.ГГГГ")
             return
         
-        self.db.add_task(title, description, db_date, category)
+        frequency = self.REPEATS[self.repeat_var.get()]
+        if frequency is None:
+            task_id = self.store.add_task(title, description, db_date, category)
+            self.clear_entries()
+            self.refresh.invalidate([task_id])
+            return
+        
+        until_text = self.until_entry.get().strip()
+        count_text = self.count_entry.get().strip()
+        try:
+            until_date = datetime.strptime(until_text, "%d.%m.%Y").strftime("%Y-%m-%d") if until_text else None
+            count = int(count_text) if count_text else None
+        except ValueError:
+            messagebox.showerror("Ошибка", "Окончание повтора: дата ДД.ММ.ГГГГ и целое число повторений")
+            return
+        try:
+            self.store.add_series(title, description, category, db_date, frequency,
+                                  until_date=until_date, count=count)
+        except ValueError as e:
+            messagebox.showerror("Ошибка", str(e))
+            return
         self.clear_entries()
-        self.load_tasks()
-        self.update_stats_tab()
-        self.calendar.update_calendar()  # Обновляем календарь
+        # Серия не попадает в список задач: ее повторения показывает календарь
+        self.refresh.invalidate(views=["calendar"])
+    
+    def schedule_search(self, delay=None):
+        """Запустить фоновый поиск по текущим условиям фильтров"""
+        self.search.schedule(self.search_entry.get(), self.status_var.get(),
+                             self.category_filter_var.get(), self.task_sort, delay)
+    
+    def sort_tasks(self, column):
+        """Сортировать список по столбцу; повторный щелчок меняет направление"""
+        sort_column, descending = self.task_sort
+        self.task_sort = (column, not descending if column == sort_column else False)
+        self.show_task_sort()
+        self.schedule_search(delay=0)
+    
+    def show_task_sort(self):
+        """Стрелка направления в заголовке столбца сортировки"""
+        sort_column, descending = self.task_sort
+        for col, column in self.SORT_HEADINGS.items():
+            arrow = (" ▼" if descending else " ▲") if column == sort_column else ""
+            self.tree.heading(col, text=col + arrow)
+    
+    def load_views(self):
+        """Перечитать список сохраненных видов"""
+        self.views = {view.name: view for view in self.db.get_saved_views()}
+        self.view_combo.configure(values=list(self.views))
+    
+    def apply_view(self, name):
+        """Показать список с условиями сохраненного вида"""
+        view = self.views.get(name)
+        if view is None:
+            return
+        self.task_sort = view.sort
+        self.show_task_sort()
+        self.search_entry.delete(0, tk.END)
+        self.search_entry.insert(0, view.search_term)
+        self.status_var.set(view.status_filter)
+        self.category_filter_var.set(view.category_filter)
+        self.schedule_search(delay=0)
+    
+    def save_view(self):
+        """Сохранить текущие условия списка как именованный вид"""
+        name = simpledialog.askstring("Сохранить вид", "Название вида:",
+                                      initialvalue=self.view_var.get(), parent=self.root)
+        if not name or not name.strip():
+            return
+        name = name.strip()
+        if name in self.views and not messagebox.askyesno("Подтверждение", f"Заменить вид «{name}»?"):
+            return
+        self.db.save_view(name, self.search_entry.get(), self.status_var.get(),
+                          self.category_filter_var.get(), self.task_sort)
+        self.load_views()
+        self.view_var.set(name)
+    
+    def delete_view(self):
+        name = self.view_var.get()
+        if not name:
+            messagebox.showwarning("Внимание", "Выберите вид!")
+            return
+        if messagebox.askyesno("Подтверждение", f"Удалить вид «{name}»?"):
+            self.db.delete_view(name)
+            self.view_var.set("")
+            self.load_views()
     
     def load_tasks(self):
         search_term = self.search_entry.get()
         status_filter = self.status_var.get()
         category_filter = self.category_filter_var.get()
         
-        tasks = self.db.get_all_tasks(search_term, status_filter, category_filter)
-        
-        # Очистка таблицы
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-            
-        # Заполнение данными
-        today = datetime.now().date()
+        # Синхронная загрузка заменяет результат любого незавершенного поиска.
+        # Строки читаются из курсора по мере прокрутки, поэтому уточнять
+        # следующий поиск в памяти не от чего
+        self.search.invalidate()
+        tasks = self.store.get_tasks_paged(search_term, status_filter, category_filter, sort=self.task_sort)
+        self.search.remember((search_term, status_filter, category_filter, self.task_sort), None)
+        self.task_list.set_rows(tasks, keep_position=True)
+    
+    def refresh_task(self, task_id):
+        """Обновить в списке одну задачу после ее изменения в базе"""
+        row = self.store.get_task(task_id)
+        if row is not None and not self.task_matches(row):
+            row = None
+        self.task_list.update_row(task_id, row)
+    
+    def task_matches(self, task):
+        """Подходит ли задача под фильтры показанного списка"""
+        search_term, status_filter, category_filter, sort = self.search.last_key
+        task_id, title, description, due_date, status, category = task
+        if status_filter != "Все" and status != status_filter:
+            return False
+        if category_filter != "Все" and category != category_filter:
+            return False
+        return not search_term.strip() or self.store.matches_search(search_term, title, description)
+    
+    def render_tasks(self, tasks):
+        self.task_list.set_rows(tasks)
+    
+    def format_task_row(self, task):
+        """Значения и теги строки списка задач"""
+        task_id, title, description, due_date, status, category = task
+        description = description or ""
+        display_date = due_date
         
-        for task in tasks:
-            task_id, title, description, due_date, status, category = task
-            
-            try:
-                # Преобразование даты из БД в формат ДД.ММ.ГГГГ
-                if due_date:
-                    task_date = datetime.strptime(due_date, "%Y-%m-%d").date()
-                    display_date = task_date.strftime("%d.%m.%Y")
-                    
-                    # Проверка на просроченность
-                    if status != "Выполнено" and task_date < today:
-                        status = "Просрочено"
-            except ValueError:
-                display_date = "Некорректная дата"
-            
-            tags = []
-            if status == "Выполнено":
-                tags.append('completed')
-            elif status == "Просрочено":
-                tags.append('overdue')
-            elif status == "В процессе":
-                tags.append('in_progress')
-            
-            self.tree.insert("", tk.END, values=(
-                task_id, 
-                title, 
-                description[:50] + "..." if len(description) > 50 else description,
-                display_date,
-                status,
-                category
-            ), tags=tags)
+        try:
+            # Преобразование даты из БД в формат ДД.ММ.ГГГГ; статус
+            # "Просрочено" уже записан в базе
+            if due_date:
+                display_date = datetime.strptime(due_date, "%Y-%m-%d").strftime("%d.%m.%Y")
+        except ValueError:
+            display_date = "Некорректная дата"
+        
+        tags = []
+        if status == "Выполнено":
+            tags.append('completed')
+        elif status == "Просрочено":
+            tags.append('overdue')
+        elif status == "В процессе":
+            tags.append('in_progress')
+        
+        return (
+            task_id, 
+            title, 
+            description[:50] + "..." if len(description) > 50 else description,
+            display_date,
+            status,
+            category
+        ), tags
+    
+    def refresh_tasks(self, task_ids):
+        """Обновить список после изменения задач task_ids (None - всех)"""
+        if task_ids is None:
+            self.load_tasks()
+        elif len(task_ids) == 1:
+            self.refresh_task(next(iter(task_ids)))
+        else:
+            # Задачи, ушедшие из списка, не должны оставаться выделенными
+            for task_id in task_ids:
+                task = self.store.get_task(task_id)
+                if task is None or not self.task_matches(task):
+                    self.task_list.selected.discard(task_id)
+            self.load_tasks()
     
     def mark_done(self):
-        selected = self.tree.selection()
+        self.set_status("Выполнено")
+    
+    def set_status(self, status):
+        selected = self.task_list.selected_ids()
         if not selected:
             messagebox.showwarning("Внимание", "Выберите задачу!")
             return
         
-        task_id = self.tree.item(selected[0])['values'][0]
-        self.db.mark_done(task_id)
-        self.load_tasks()
-        self.update_stats_tab()
-        self.calendar.update_calendar()  # Обновляем календарь
+        self.store.set_status_bulk(selected, status)
+        self.refresh.invalidate(selected)
+    
+    def set_category(self, category):
+        selected = self.task_list.selected_ids()
+        if not selected:
+            messagebox.showwarning("Внимание", "Выберите задачу!")
+            return
+        
+        self.store.set_category_bulk(selected, category)
+        self.refresh.invalidate(selected)
     
     def delete_task(self):
-        selected = self.tree.selection()
+        selected = self.task_list.selected_ids()
         if not selected:
             messagebox.showwarning("Внимание", "Выберите задачу!")
             return
         
-        task_id = self.tree.item(selected[0])['values'][0]
-        if messagebox.askyesno("Подтверждение", "Удалить выбранную задачу?"):
-            self.db.delete_task(task_id)
-            self.load_tasks()
-            self.update_stats_tab()
-            self.calendar.update_calendar()  # Обновляем календарь
+        question = ("Удалить выбранную задачу?" if len(selected) == 1
+                    else f"Удалить выбранные задачи ({len(selected)})?")
+        if messagebox.askyesno("Подтверждение", question):
+            self.store.delete_tasks_bulk(selected)
+            self.refresh.invalidate(selected)
     
     def edit_task(self, event):
         selected = self.tree.selection()
@@ -757,14 +1367,10 @@ class TaskManagerApp:
         
         item = selected[0]
         task_data = self.tree.item(item, 'values')
-        task_id = task_data[0]
+        task_id = int(task_data[0])
         
-        # Получаем полные данные о задаче из БД
-        conn = sqlite3.connect('tasks.db')
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM tasks WHERE id = ?", (task_id,))
-        task = cursor.fetchone()
-        conn.close()
+        # Получаем полные данные о задаче из хранилища
+        task = self.store.get_task(task_id)
         
         if not task:
             return
@@ -842,11 +1448,9 @@ class TaskManagerApp:
             messagebox.showerror("Ошибка", "Неверный формат даты! Используйте ДД.ММ.ГГГГ")
             return
         
-        self.db.update_task(task_id, title, description, db_date, status, category)
+        self.store.update_task(task_id, title, description, db_date, status, category)
         window.destroy()
-        self.load_tasks()
-        self.update_stats_tab()
-        self.calendar.update_calendar()  # Обновляем календарь
+        self.refresh.invalidate([task_id])
         messagebox.showinfo("Успех", "Задача успешно обновлена!")
     
     def export_to_csv(self):
@@ -858,88 +1462,147 @@ class TaskManagerApp:
         if not filename:
             return
         
-        try:
-            tasks = self.db.get_all_tasks()
-            with open(filename, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f, delimiter=';')
-                writer.writerow(['ID', 'Название', 'Описание', 'Дата', 'Статус', 'Категория'])
-                
-                for task in tasks:
-                    # Преобразование даты в формат ДД.ММ.ГГГГ
-                    try:
-                        task_date = datetime.strptime(task[3], "%Y-%m-%d")
-                        formatted_date = task_date.strftime("%d.%m.%Y")
-                    except:
-                        formatted_date = task[3]
-                    
-                    writer.writerow([
-                        task[0],
-                        task[1],
-                        task[2],
-                        formatted_date,
-                        task[4],
-                        task[5]
-                    ])
-            
-            messagebox.showinfo("Успех", f"Данные экспортированы в:\n{filename}")
-        except Exception as e:
+        # Экспортируются задачи, подходящие под текущие фильтры списка
+        filters = (self.search_entry.get(), self.status_var.get(), self.category_filter_var.get())
+        archived = self.db.count_archived()
+        include_archive = bool(archived) and messagebox.askyesno(
+            "Экспорт в CSV", f"Включить в экспорт задачи из архива ({archived})?")
+        db_path = self.db.db_path
+        
+        def export(progress, cancelled):
+            reader = Database(db_path, read_only=True)
+            try:
+                return csv_io.export_tasks(reader, filename, *filters, progress=progress,
+                                           cancelled=cancelled, include_archive=include_archive)
+            finally:
+                reader.close()
+        
+        def done(count):
+            if count is not None:
+                messagebox.showinfo("Успех", f"Экспортировано задач: {count}\nФайл:\n{filename}")
+        
+        def failed(e):
             messagebox.showerror("Ошибка", f"Не удалось экспортировать данные:\n{str(e)}")
+        
+        ProgressDialog(self.root, "Экспорт в CSV").run(export, done, failed)
     
-    def update_stats_tab(self):
-        """Обновляет вкладку статистики"""
-        status_frame = None
-        category_frame = None
+    def import_from_csv(self):
+        filename = filedialog.askopenfilename(
+            filetypes=[("CSV файлы", "*.csv"), ("Все файлы", "*.*")]
+        )
+        
+        if not filename:
+            return
         
-        for widget in self.stats_tab.winfo_children():
-            if isinstance(widget, ttk.Frame):
-                for child in widget.winfo_children():
-                    if "статусам" in child.cget("text"):
-                        status_frame = child
-                    elif "категориям" in child.cget("text"):
-                        category_frame = child
+        options = self.ask_import_options()
+        if options is None:
+            return
+        upsert, dry_run = options
+        db_path = self.db.db_path
         
-        if status_frame and category_frame:
-            self.update_stats(status_frame, category_frame)
+        def load(progress, cancelled):
+            # Запись идет из рабочего потока через его собственное соединение
+            writer = Database(db_path, dedicated=True)
+            try:
+                return csv_io.import_tasks(writer, filename, upsert, dry_run,
+                                           progress=progress, cancelled=cancelled)
+            finally:
+                writer.close()
+        
+        def done(result):
+            if result is None:
+                return
+            if not dry_run:
+                self.store.reload()
+                self.refresh.invalidate()
+            
+            title = "Проверка файла" if dry_run else "Импорт завершен"
+            message = f"Добавлено задач: {result.inserted}\nОбновлено задач: {result.updated}"
+            if result.errors:
+                message += f"\nПропущено записей с ошибками: {len(result.errors)}"
+                message += "".join(f"\n  запись {line}: {error}" for line, error in result.errors[:10])
+            messagebox.showinfo(title, message)
+        
+        def failed(e):
+            messagebox.showerror("Ошибка", f"Не удалось импортировать данные:\n{str(e)}")
+        
+        ProgressDialog(self.root, "Импорт из CSV",
+                       lambda done, total: f"Прочитано {done * 100 // max(total, 1)}%").run(load, done, failed)
+    
+    def archive_completed(self):
+        """Перенести старые выполненные задачи в архив"""
+        if not messagebox.askyesno("Архив", f"Перенести в архив выполненные задачи "
+                                            f"старше {ARCHIVE_AFTER_DAYS} дней?"):
+            return
+        db_path = self.db.db_path
+        
+        def archive(progress, cancelled):
+            writer = Database(db_path, dedicated=True)
+            try:
+                return writer.archive_completed(progress=progress, cancelled=cancelled)
+            finally:
+                writer.close()
+        
+        def done(count):
+            # Часть задач могла уйти в архив и при отмене
+            self.store.reload()
+            self.refresh.invalidate()
+            messagebox.showinfo("Архив", f"Перенесено в архив задач: {count}")
+        
+        def failed(e):
+            messagebox.showerror("Ошибка", f"Не удалось перенести задачи в архив:\n{str(e)}")
+        
+        ProgressDialog(self.root, "Перенос в архив").run(archive, done, failed)
+    
+    def ask_import_options(self):
+        """Окно параметров импорта; возвращает (upsert, dry_run) или None"""
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Импорт из CSV")
+        dialog.resizable(False, False)
+        dialog.configure(bg="#f5f7fa")
+        dialog.transient(self.root)
+        
+        frame = ttk.Frame(dialog, style="Card.TFrame")
+        frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        upsert_var = tk.BooleanVar(value=False)
+        dry_run_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(frame, text="Обновлять задачи с совпадающим ID", 
+                        variable=upsert_var).pack(padx=10, pady=(10, 2), anchor=tk.W)
+        ttk.Checkbutton(frame, text="Только проверить файл, без записи", 
+                        variable=dry_run_var).pack(padx=10, pady=2, anchor=tk.W)
+        
+        result = []
+        
+        def accept():
+            result.append((upsert_var.get(), dry_run_var.get()))
+            dialog.destroy()
+        
+        btn_frame = ttk.Frame(frame)
+        btn_frame.pack(pady=10)
+        ttk.Button(btn_frame, text="Импорт", command=accept, style="Accent.TButton").pack(side=tk.LEFT, padx=10)
+        ttk.Button(btn_frame, text="Отмена", command=dialog.destroy).pack(side=tk.LEFT, padx=10)
+        
+        dialog.grab_set()
+        self.root.wait_window(dialog)
+        return result[0] if result else None
+    
+    def tab_visible(self, tab):
+        return self.notebook.select() == str(tab)
+    
+    def on_tab_changed(self, event):
+        if not self.stats_built and self.tab_visible(self.stats_tab):
+            self.create_stats_tab()
+        # Открытая вкладка догоняет изменения, сделанные, пока она была скрыта
+        self.refresh.flush()
     
     def clear_entries(self):
         self.title_entry.delete(0, tk.END)
         self.desc_entry.delete(0, tk.END)
         self.due_entry.delete(0, tk.END)
         self.category_combo.set("Общие")
-
-    def check_database(self):
-        """Проверяет существование БД и создает при необходимости"""
-        try:
-            conn = sqlite3.connect('tasks.db')
-            cursor = conn.cursor()
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='tasks'")
-            table_exists = cursor.fetchone()
-            conn.close()
-            
-            if not table_exists:
-                self.initialize_database()
-        except:
-            self.initialize_database()
-    
-    def initialize_database(self):
-        """Иницфиализирует базу данных"""
-        # Используем тот же код, что и в скрипте инициализации
-        conn = sqlite3.connect('tasks.db')
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS tasks (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                title TEXT NOT NULL,
-                description TEXT,
-                due_date TEXT NOT NULL,
-                status TEXT DEFAULT 'Новая',
-                category TEXT DEFAULT 'Общие',
-                created_at TEXT DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        conn.commit()
-        conn.close()
+        self.repeat_combo.set("Нет")
+        self.until_entry.delete(0, tk.END)
+        self.count_entry.delete(0, tk.END)
 
 if __name__ == "__main__":
     root = tk.Tk()
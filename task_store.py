@@ -0,0 +1,357 @@
+# -*- coding: utf-8 -*-
+import bisect
+import calendar
+from collections import Counter, namedtuple
+
+from database import (ACTIVE_STATUSES, DEFAULT_SORT, IDS_SQL, PagedResult, ids_param, merge_day_counts,
+                      overdue_status, task_sort_key)
+
+# Строка задачи в формате Database.get_all_tasks. namedtuple не заводит
+# __dict__ у экземпляров, поэтому занимает столько же, сколько обычный кортеж
+Task = namedtuple("Task", "id title description due_date status category")
+
+
+class TaskStore:
+    """Задачи в памяти процесса с записью изменений в базу (write-through).
+
+    Таблица читается один раз при создании (и заново по reload). Чтение
+    обслуживается из памяти по вторичным индексам: отсортированным ключам
+    (due_date, id) всего списка, каждого статуса и каждой категории, задачам
+    по дате и счетчикам пар (статус, категория). Изменения сначала
+    записываются в Database, затем применяются к индексам. Для календаря
+    дополнительно ведутся счетчики статусов по каждой дате. Методы чтения
+    возвращают строки в тех же форматах, что и одноименные методы Database;
+    полнотекстовый поиск по-прежнему выполняется индексом FTS5 в базе, а
+    список в порядке, отличном от (due_date, id), - по индексам столбцов.
+    Записанный статус с учетом просрочки вычисляется заранее (overdue_status),
+    поэтому после изменения задача из базы не перечитывается. Изменения,
+    сделанные другими соединениями и процессами, применяет apply_changes по
+    журналу task_log.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.reload()
+
+    def reload(self):
+        """Перечитать все задачи из базы"""
+        self.tasks = {}
+        self.order = []
+        self.by_status = {}
+        self.by_category = {}
+        self.by_date = {}
+        self.day_counts = {}
+        self.counts = Counter()
+        # Повторяющиеся даты, статусы и категории хранятся одним объектом
+        self._strings = {}
+        # Позиция в журнале изменений читается до задач: изменение между
+        # ними будет применено повторно, но не потеряется
+        self.change_seq = self.db.last_change_seq()
+
+        cursor = self.db.conn.cursor()
+        cursor.execute("SELECT id, title, description, due_date, status, category FROM tasks "
+                       "ORDER BY due_date, id")
+        # Горячий цикл: строки приходят отсортированными, поэтому индексы
+        # заполняются добавлением в конец, без bisect и вызовов методов
+        intern = self._strings.setdefault
+        tasks, order, counts = self.tasks, self.order, self.counts
+        by_status, by_category, by_date = self.by_status, self.by_category, self.by_date
+        day_counts = self.day_counts
+        for task_id, title, description, due_date, status, category in cursor:
+            due_date = intern(due_date, due_date)
+            status = intern(status, status)
+            category = intern(category, category)
+            key = (due_date, task_id)
+            tasks[task_id] = Task(task_id, title, description, due_date, status, category)
+            order.append(key)
+            by_status.setdefault(status, []).append(key)
+            by_category.setdefault(category, []).append(key)
+            by_date.setdefault(due_date, set()).add(task_id)
+            day_counts.setdefault(due_date, Counter())[status] += 1
+            counts[status, category] += 1
+
+    def _fetch(self, task_ids):
+        """Задачи с указанными id в том виде, в каком они записаны в базе"""
+        cursor = self.db.conn.execute("SELECT id, title, description, due_date, status, category FROM tasks "
+                                      f"WHERE id IN {IDS_SQL}", (ids_param(task_ids),))
+        return [self._make(*row) for row in cursor]
+
+    def _intern(self, value):
+        return self._strings.setdefault(value, value)
+
+    def _make(self, task_id, title, description, due_date, status, category):
+        return Task(task_id, title, description,
+                    self._intern(due_date), self._intern(status), self._intern(category))
+
+    def _insert(self, task):
+        key = (task.due_date, task.id)
+        self.tasks[task.id] = task
+        bisect.insort(self.order, key)
+        bisect.insort(self.by_status.setdefault(task.status, []), key)
+        bisect.insort(self.by_category.setdefault(task.category, []), key)
+        self.by_date.setdefault(task.due_date, set()).add(task.id)
+        self.day_counts.setdefault(task.due_date, Counter())[task.status] += 1
+        self.counts[task.status, task.category] += 1
+
+    def _insert_many(self, tasks):
+        # Для пачки ключи дописываются в конец, а списки сортируются один раз:
+        # insort на каждую задачу сдвигал бы весь список
+        if len(tasks) < 64:
+            for task in tasks:
+                self._insert(task)
+            return
+        touched = {id(self.order): self.order}
+        for task in tasks:
+            key = (task.due_date, task.id)
+            self.tasks[task.id] = task
+            self.order.append(key)
+            for keys in (self.by_status.setdefault(task.status, []),
+                         self.by_category.setdefault(task.category, [])):
+                keys.append(key)
+                touched[id(keys)] = keys
+            self.by_date.setdefault(task.due_date, set()).add(task.id)
+            self.day_counts.setdefault(task.due_date, Counter())[task.status] += 1
+            self.counts[task.status, task.category] += 1
+        for keys in touched.values():
+            keys.sort()
+
+    def _remove_many(self, task_ids):
+        # Для пачки списки ключей фильтруются за один проход (на месте -
+        # на них ссылаются открытые постраничные результаты)
+        if len(task_ids) < 64:
+            return [self._remove(task_id) for task_id in task_ids]
+        removed = [self.tasks.pop(task_id, None) for task_id in task_ids]
+        gone = {task.id for task in removed if task is not None}
+        touched = {id(self.order): self.order}
+        for task in removed:
+            if task is None:
+                continue
+            for keys in (self.by_status[task.status], self.by_category[task.category]):
+                touched[id(keys)] = keys
+            self._uncount(task)
+        for keys in touched.values():
+            keys[:] = [key for key in keys if key[1] not in gone]
+        return removed
+
+    def _remove(self, task_id):
+        task = self.tasks.pop(task_id, None)
+        if task is None:
+            return None
+        key = (task.due_date, task.id)
+        # Пустые списки ключей не удаляются: на них могут ссылаться
+        # открытые постраничные результаты
+        for keys in (self.order, self.by_status[task.status], self.by_category[task.category]):
+            index = bisect.bisect_left(keys, key)
+            if index < len(keys) and keys[index] == key:
+                del keys[index]
+        self._uncount(task)
+        return task
+
+    def _uncount(self, task):
+        day = self.by_date[task.due_date]
+        day.discard(task.id)
+        if not day:
+            del self.by_date[task.due_date]
+        statuses = self.day_counts[task.due_date]
+        statuses[task.status] -= 1
+        if not statuses[task.status]:
+            del statuses[task.status]
+        if not statuses:
+            del self.day_counts[task.due_date]
+        self.counts[task.status, task.category] -= 1
+        if not self.counts[task.status, task.category]:
+            del self.counts[task.status, task.category]
+
+    # Изменения
+
+    def add_task(self, title, description, due_date, category):
+        task_id = self.db.add_task(title, description, due_date, category)
+        self._insert(self._make(task_id, title, description, due_date,
+                                overdue_status(ACTIVE_STATUSES[0], due_date), category))
+        return task_id
+
+    def update_task(self, task_id, title, description, due_date, status, category):
+        self.db.update_task(task_id, title, description, due_date, status, category)
+        if self._remove(task_id) is not None:
+            self._insert(self._make(task_id, title, description, due_date, overdue_status(status, due_date),
+                                    category))
+
+    def delete_tasks_bulk(self, task_ids):
+        task_ids = list(task_ids)
+        self.db.delete_tasks_bulk(task_ids)
+        self._remove_many(task_ids)
+
+    def set_status_bulk(self, task_ids, status):
+        task_ids = list(task_ids)
+        self.db.set_status_bulk(task_ids, status)
+        removed = self._remove_many(task_ids)
+        self._insert_many([task._replace(status=self._intern(overdue_status(status, task.due_date)))
+                           for task in removed if task is not None])
+
+    def set_category_bulk(self, task_ids, category):
+        task_ids = list(task_ids)
+        self.db.set_category_bulk(task_ids, category)
+        self._replace_many(task_ids, category=self._intern(category))
+
+    def _replace_many(self, task_ids, **fields):
+        removed = self._remove_many(task_ids)
+        self._insert_many([task._replace(**fields) for task in removed if task is not None])
+
+    def _refresh_many(self, task_ids):
+        self._remove_many(task_ids)
+        self._insert_many(self._fetch(task_ids))
+
+    def sweep_overdue(self):
+        """Database.sweep_overdue; возвращает id задач, у которых сменился статус"""
+        task_ids = self.db.sweep_overdue()
+        if task_ids:
+            self._refresh_many(task_ids)
+        return task_ids
+
+    def apply_changes(self):
+        """Применить изменения из журнала task_log после прочитанной позиции.
+
+        Задачи из журнала перечитываются из базы (удаленные убираются), в
+        том числе изменения самого хранилища - это безвредно. Возвращает
+        id измененных задач или None, если хранилище перечитано целиком.
+        """
+        changes = self.db.get_changes(self.change_seq)
+        if changes is None:
+            self.reload()
+            return None
+        self.change_seq, task_ids = changes
+        if task_ids:
+            self._refresh_many(task_ids)
+        return task_ids
+
+    # Чтение
+
+    def get_task(self, task_id):
+        return self.tasks.get(task_id)
+
+    def _filtered_keys(self, status_filter, category_filter):
+        """Отсортированные ключи самого узкого индекса и проверка для второго фильтра"""
+        if status_filter != "Все" and category_filter != "Все":
+            keys = self.by_status.setdefault(status_filter, [])
+            return keys, lambda task: task.category == category_filter
+        if status_filter != "Все":
+            return self.by_status.setdefault(status_filter, []), None
+        if category_filter != "Все":
+            return self.by_category.setdefault(category_filter, []), None
+        return self.order, None
+
+    def _filtered_ids(self, status_filter, category_filter):
+        """id задач под фильтры по индексам в памяти"""
+        keys, extra = self._filtered_keys(status_filter, category_filter)
+        if extra is None:
+            return [key[1] for key in keys]
+        return [key[1] for key in keys if extra(self.tasks[key[1]])]
+
+    def _matches(self, task, status_filter, category_filter):
+        return ((status_filter == "Все" or task.status == status_filter)
+                and (category_filter == "Все" or task.category == category_filter))
+
+    def get_all_tasks(self, search_term="", status_filter="Все", category_filter="Все", sort=DEFAULT_SORT):
+        if search_term.strip():
+            tasks = (self.tasks.get(task_id) for task_id in self.db.get_matching_ids(search_term))
+            found = [task for task in tasks
+                     if task is not None and self._matches(task, status_filter, category_filter)]
+            column, descending = sort
+            found.sort(key=lambda task: task_sort_key(task, column), reverse=descending)
+            return found
+        if sort != DEFAULT_SORT:
+            return self.db.get_all_tasks("", status_filter, category_filter, sort)
+
+        keys, extra = self._filtered_keys(status_filter, category_filter)
+        tasks = (self.tasks[key[1]] for key in keys)
+        return [task for task in tasks if extra is None or extra(task)]
+
+    def count_tasks(self, search_term="", status_filter="Все", category_filter="Все"):
+        if search_term.strip():
+            return len(self.get_all_tasks(search_term, status_filter, category_filter))
+        return sum(count for (status, category), count in self.counts.items()
+                   if (status_filter == "Все" or status == status_filter)
+                   and (category_filter == "Все" or category == category_filter))
+
+    def get_tasks_paged(self, search_term="", status_filter="Все", category_filter="Все", page_size=500,
+                        sort=DEFAULT_SORT):
+        """Задачи с фильтрами, отдаваемые из памяти постранично.
+
+        Страницы берутся из живых списков ключей по ключу последней
+        загруженной строки, поэтому результат остается согласованным с
+        изменениями, сделанными после его открытия. В порядке sort, отличном
+        от (due_date, id), страницы читаются из базы (Database.get_tasks_page),
+        а размер результата берется из счетчиков в памяти.
+        """
+        if search_term.strip():
+            return PagedResult.from_rows(self.get_all_tasks(search_term, status_filter, category_filter, sort),
+                                         sort)
+        if sort != DEFAULT_SORT:
+            def fetch_page(after, limit):
+                return self.db.get_tasks_page("", status_filter, category_filter, after, limit, sort)
+
+            return PagedResult(fetch_page, self.count_tasks("", status_filter, category_filter), page_size,
+                               sort=sort, fetch_ids=lambda: self._filtered_ids(status_filter, category_filter))
+
+        keys, extra = self._filtered_keys(status_filter, category_filter)
+
+        def fetch_page(after, limit):
+            start = bisect.bisect_right(keys, after) if after is not None else 0
+            page = []
+            for index in range(start, len(keys)):
+                task = self.tasks[keys[index][1]]
+                if extra is None or extra(task):
+                    page.append(task)
+                    if len(page) == limit:
+                        break
+            return page
+
+        return PagedResult(fetch_page, self.count_tasks("", status_filter, category_filter), page_size,
+                           fetch_ids=lambda: self._filtered_ids(status_filter, category_filter))
+
+    # Архив в памяти не держится: для дат, которые в нем есть, календарные
+    # выборки дополняются запросом к архиву в базе
+
+    def get_tasks_by_date(self, date):
+        """Получить задачи на конкретную дату"""
+        tasks = (self.tasks[task_id] for task_id in sorted(self.by_date.get(date, ())))
+        rows = [(task.id, task.title, task.description, task.status, task.category) for task in tasks]
+        archived = self.db.archive_sources(date)
+        if archived:
+            rows = sorted(rows + self.db.get_tasks_by_date(date, archived))
+        return rows
+
+    def get_month_day_counts(self, year, month):
+        """Количество задач по дням месяца с разбивкой по статусам"""
+        prefix = f"{year}-{month:02d}-"
+        day_counts = {}
+        for day in range(1, calendar.monthrange(year, month)[1] + 1):
+            statuses = self.day_counts.get(f"{prefix}{day:02d}")
+            if statuses:
+                day_counts[day] = dict(statuses)
+        archived = self.db.archive_sources(f"{prefix}01")
+        if archived:
+            merge_day_counts(day_counts, self.db.get_month_day_counts(year, month, archived, include_series=False))
+        # Повторения серий в памяти не держатся: они вычисляются только для месяца
+        return merge_day_counts(day_counts, self.db.get_occurrence_day_counts(year, month))
+
+    def add_series(self, title, description, category, start_date, frequency, **rule):
+        return self.db.add_series(title, description, category, start_date, frequency, **rule)
+
+    def get_occurrences(self, start_date, end_date):
+        return self.db.get_occurrences(start_date, end_date)
+
+    def set_occurrence_status(self, series_id, occurrence_date, status):
+        return self.db.set_occurrence_status(series_id, occurrence_date, status)
+
+    def get_task_stats(self):
+        status_stats = Counter()
+        category_stats = Counter()
+        for (status, category), count in self.counts.items():
+            status_stats[status] += count
+            category_stats[category] += count
+        # Порядок как у GROUP BY в Database.get_task_stats
+        return dict(sorted(status_stats.items())), dict(sorted(category_stats.items()))
+
+    def matches_search(self, search_term, title, description):
+        return self.db.matches_search(search_term, title, description)
@@ -0,0 +1,12 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from database import Database
+
+
+@pytest.fixture
+def db(tmp_path):
+    """Пустая база во временном каталоге, закрывается после теста"""
+    database = Database(str(tmp_path / "tasks.db"))
+    yield database
+    database.close()
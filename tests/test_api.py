@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""Обработчики api_server без сервера: (db, match, query или тело) -> ответ"""
+import pytest
+
+import api_server
+
+
+def test_patch_returns_stored_row(db):
+    status, created = api_server.create_task(db, {}, {"title": "a", "due_date": "2999-01-01"})
+    assert status == 201 and created["status"] == "Новая"
+    status, updated = api_server.update_task(db, {"id": str(created["id"])}, {"due_date": "2020-01-01"})
+    assert status == 200
+    assert updated == api_server.task_dict(db.get_task(created["id"]))
+    assert updated["status"] == "Просрочено"
+
+
+@pytest.mark.parametrize("body", [{"title": "a", "due_date": "2999-01-01", "status": "Готово"},
+                                  {"title": "a", "due_date": "2999-01-01", "category": "Хобби"}])
+def test_unknown_status_or_category(db, body):
+    with pytest.raises(api_server.HTTPError) as error:
+        api_server.create_task(db, {}, body)
+    assert error.value.status == 400
+
+
+def test_unknown_occurrence_status(db):
+    series_id = db.add_series("a", "", "Общие", "2020-01-01", "daily")
+    with pytest.raises(api_server.HTTPError) as error:
+        api_server.update_occurrence(db, {"id": str(series_id), "day": "2020-01-02"}, {"status": "Готово"})
+    assert error.value.status == 400
+
+
+@pytest.mark.parametrize("handler", [api_server.update_task, api_server.delete_task])
+def test_id_beyond_int64(db, handler):
+    with pytest.raises(api_server.HTTPError) as error:
+        handler(db, {"id": str(2**63)}, {})
+    assert error.value.status == 404
+    with pytest.raises(api_server.HTTPError) as error:
+        api_server.get_task(db, {"id": str(2**63)}, {})
+    assert error.value.status == 404
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+"""cli.main при базе, заблокированной другим процессом для записи"""
+import io
+import json
+import sqlite3
+
+import pytest
+
+import cli
+
+
+@pytest.fixture
+def locked_db(tmp_path):
+    path = str(tmp_path / "tasks.db")
+    assert cli.main(["--db", path, "add", "a", "--due", "2999-01-01"], io.StringIO()) == 0
+    other = sqlite3.connect(path, isolation_level=None)
+    # Задача, которую sweep_overdue отметил бы просроченной
+    other.execute("UPDATE tasks SET due_date = '2020-01-01'")
+    other.execute("BEGIN IMMEDIATE")
+    yield path
+    other.rollback()
+    other.close()
+
+
+@pytest.mark.parametrize("command", [["list"], ["stats"], ["search", "a"], ["views"]])
+def test_read_commands_do_not_write(locked_db, command):
+    assert cli.main(["--db", locked_db, *command], io.StringIO()) == 0
+
+
+def test_locked_database_reported_as_json(locked_db, capsys):
+    assert cli.main(["--db", locked_db, "add", "b", "--due", "2999-01-01"], io.StringIO()) == 1
+    assert "locked" in json.loads(capsys.readouterr().err)["error"]
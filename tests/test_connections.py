@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+"""Соединения только для чтения открывают тот же файл, что и соединение записи"""
+import pytest
+
+from database import Database
+
+
+@pytest.mark.parametrize("name", ["a#b", "a?b", "a%20b", "a#?%b"])
+def test_reader_path_with_uri_characters(tmp_path, name):
+    directory = tmp_path / name
+    directory.mkdir()
+    db = Database(str(directory / "tasks.db"))
+    try:
+        task_id = db.add_task("задача", "", "2999-01-01", "Общие")
+        reader = Database(db.db_path, read_only=True)
+        try:
+            assert reader.get_task(task_id) == db.get_task(task_id)
+        finally:
+            reader.close()
+    finally:
+        db.close()
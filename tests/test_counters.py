@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""Счетчики task_counters совпадают с GROUP BY по таблице tasks"""
+from database import Database
+
+PAST = "2020-01-01"
+FUTURE = "2999-01-01"
+
+
+def assert_counters_match(db):
+    status_stats, category_stats = db.get_task_stats()
+    for dimension, stats in (("status", status_stats), ("category", category_stats)):
+        grouped = db.conn.execute(f"SELECT {dimension}, COUNT(*) FROM tasks GROUP BY {dimension} "
+                                  f"ORDER BY {dimension}").fetchall()
+        assert stats == dict(grouped)
+
+
+def test_add_task_past_date(db):
+    task_id = db.add_task("старая", "", PAST, "Общие")
+    assert db.get_task(task_id)[4] == "Просрочено"
+    assert db.get_task_stats() == ({"Просрочено": 1}, {"Общие": 1})
+    assert_counters_match(db)
+
+
+def test_add_tasks_bulk(db):
+    db.add_tasks_bulk([("a", "", PAST, "Новая", "Работа"), ("b", "", FUTURE, "Новая", "Личное"),
+                       ("c", "", PAST, "Выполнено", "Работа"), ("d", "", FUTURE, "Просрочено", "Общие")])
+    assert_counters_match(db)
+    assert db.get_task_stats()[0] == {"Выполнено": 1, "Новая": 2, "Просрочено": 1}
+
+
+def schema_version(db):
+    return db.conn.execute("PRAGMA schema_version").fetchone()[0]
+
+
+def test_deferred_indexing(db):
+    before = schema_version(db)
+    with db.deferred_indexing():
+        db.add_tasks_bulk([("a", "", PAST, "Новая", "Работа"), ("b", "", FUTURE, "В процессе", "Общие")])
+    assert_counters_match(db)
+    assert db.get_matching_ids("a") == {1}
+    # Триггеры выключаются флагом, а не DROP TRIGGER: схема не меняется
+    assert schema_version(db) == before
+    db.add_task("c", "", FUTURE, "Общие")
+    assert_counters_match(db)
+    assert db.get_matching_ids("c") == {3}
+
+
+def test_deferred_indexing_rollback_keeps_triggers(db):
+    try:
+        with db.deferred_indexing():
+            db.add_tasks_bulk([("a", "", PAST, "Новая", "Работа")])
+            raise RuntimeError
+    except RuntimeError:
+        pass
+    assert db.conn.execute("SELECT enabled FROM trigger_flags").fetchone()[0] == 1
+    db.add_task("b", "", FUTURE, "Общие")
+    assert_counters_match(db)
+    assert db.get_matching_ids("b") == {db.get_all_tasks()[0][0]}
+
+
+def test_upsert_insert_and_update(db):
+    task_id = db.add_task("a", "", FUTURE, "Общие")
+    db.upsert_tasks_bulk([(task_id, "a", "", PAST, "Новая", "Работа"),
+                          (task_id + 10, "b", "", PAST, "В процессе", "Общие")])
+    assert_counters_match(db)
+    assert db.get_task(task_id)[4] == "Просрочено"
+    assert db.get_task(task_id + 10)[4] == "Просрочено"
+
+
+def test_updates_moving_dates(db):
+    first = db.add_task("a", "", PAST, "Общие")
+    second = db.add_task("b", "", FUTURE, "Общие")
+    db.update_task(first, "a", "", FUTURE, "Просрочено", "Работа")
+    db.update_task(second, "b", "", PAST, "Новая", "Работа")
+    assert [db.get_task(task_id)[4] for task_id in (first, second)] == ["Новая", "Просрочено"]
+    assert_counters_match(db)
+    db.update_tasks_bulk([(first, "a", "", PAST, "В процессе", "Личное"),
+                          (second, "b", "", FUTURE, "Просрочено", "Общие")])
+    db.set_status_bulk([first, second], "Новая")
+    db.set_category_bulk([first], "Семья")
+    assert [db.get_task(task_id)[4] for task_id in (first, second)] == ["Просрочено", "Новая"]
+    assert_counters_match(db)
+
+
+def test_counters_survive_reopen(db):
+    db.add_task("a", "", PAST, "Общие")
+    db.delete_task(db.add_task("b", "", PAST, "Работа"))
+    reopened = Database(db.db_path)
+    try:
+        assert_counters_match(reopened)
+    finally:
+        reopened.close()
+
+
+def test_sweep_overdue(db):
+    task_id = db.add_task("a", "", FUTURE, "Общие")
+    # Как смена дня: дата уже прошла, а статус еще нет
+    db.conn.execute("UPDATE tasks SET due_date = ? WHERE id = ?", (PAST, task_id))
+    db.conn.commit()
+    before, seq = schema_version(db), db.last_change_seq()
+    assert db.sweep_overdue() == [task_id]
+    assert db.get_task(task_id)[4] == "Просрочено"
+    assert_counters_match(db)
+    assert schema_version(db) == before
+    assert db.get_changes(seq)[1] == {task_id}
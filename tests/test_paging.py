@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""Постраничная выборка по ключу (keyset) дает тот же порядок, что LIMIT/OFFSET"""
+import pytest
+
+from database import SORT_COLUMNS, order_by_sql, task_sort_key
+from task_store import TaskStore
+
+PAGE = 7
+FILTERS = [("", "Все", "Все"), ("", "Новая", "Все"), ("", "Все", "Работа"), ("отчет", "Все", "Все")]
+
+
+@pytest.fixture
+def db(db):
+    # Повторяющиеся значения во всех столбцах: порядок внутри них задает id
+    statuses = ["Новая", "В процессе", "Выполнено"]
+    categories = ["Работа", "Личное", "Общие"]
+    db.add_tasks_bulk([(f"{['Отчет', 'звонок', 'Встреча'][i % 3]} {i % 5}", "", f"2999-0{i % 4 + 1}-01",
+                        statuses[i % len(statuses)], categories[i // 2 % len(categories)])
+                       for i in range(60)])
+    return db
+
+
+def offset_pages(db, filters, sort):
+    where, params = db._tasks_filter(*filters)
+    order_by, _ = order_by_sql(sort)
+    rows, offset = [], 0
+    while True:
+        page = db.conn.execute("SELECT id, title, description, due_date, status, category FROM tasks "
+                               f"{where} ORDER BY {order_by} LIMIT ? OFFSET ?",
+                               params + [PAGE, offset]).fetchall()
+        rows.extend(page)
+        if len(page) < PAGE:
+            return rows
+        offset += PAGE
+
+
+def keyset_pages(db, filters, sort):
+    rows, after = [], None
+    while True:
+        page = db.get_tasks_page(*filters, after, PAGE, sort)
+        rows.extend(page)
+        if len(page) < PAGE:
+            return rows
+        after = task_sort_key(page[-1], sort[0])
+
+
+@pytest.mark.parametrize("descending", [False, True])
+@pytest.mark.parametrize("column", list(SORT_COLUMNS))
+@pytest.mark.parametrize("filters", FILTERS)
+def test_keyset_matches_offset(db, filters, column, descending):
+    sort = (column, descending)
+    expected = offset_pages(db, filters, sort)
+    assert expected
+    assert keyset_pages(db, filters, sort) == expected
+    assert list(db.get_tasks_paged(*filters, page_size=PAGE, sort=sort)) == expected
+
+
+@pytest.mark.parametrize("sort", [("due_date", False), ("title", True)])
+@pytest.mark.parametrize("filters", FILTERS)
+def test_ids_without_loading_rows(db, filters, sort):
+    expected = sorted(row[0] for row in offset_pages(db, filters, sort))
+    for source in (db, TaskStore(db)):
+        result = source.get_tasks_paged(*filters, page_size=PAGE, sort=sort)
+        assert sorted(result.ids()) == expected
+        # Выборка с поиском в TaskStore загружается целиком сразу
+        assert result.rows == [] or result.fetch_page is None
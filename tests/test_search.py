@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+"""Проверка задачи в памяти (matches_search) совпадает с поиском FTS5"""
+import pytest
+
+TASKS = [
+    ("Отчет за квартал", "сдать до пятницы"),
+    ("Straße", "Adresse prüfen"),
+    ("strasse", None),
+    ("Café-bar", "встреча с Ёлкиным"),
+    ("e-mail", "ответить на письма"),
+    ("Ёлка", "купить игрушки"),
+    ("Отчёт", "черновик \"важно\""),
+    ("snake_case", "переименовать"),
+]
+
+QUERIES = ["отч", "ОТЧЕТ кварт", "straße", "strasse", "STRASSE", "cafe", "café-b", "e-mail", "mail",
+           "ёлк", "елк", "\"", "*", "'", "отч \"", "отч *", "\"важно\"", "snake", "case", "snake_c",
+           "пятн сдать", "пятн нет"]
+
+
+@pytest.fixture
+def rows(db):
+    for title, description in TASKS:
+        db.add_task(title, description, "2999-01-01", "Общие")
+    return db.conn.execute("SELECT id, title, description FROM tasks").fetchall()
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_matches_search_equals_fts(db, rows, query):
+    assert db.fts_enabled
+    in_memory = {task_id for task_id, title, description in rows
+                 if db.matches_search(query, title, description)}
+    assert in_memory == db.get_matching_ids(query)
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+"""TaskStore после записи совпадает с хранилищем, заново прочитанным из базы"""
+from task_store import TaskStore
+
+PAST = "2020-01-01"
+FUTURE = "2999-01-01"
+
+
+def assert_store_matches_db(store):
+    fresh = TaskStore(store.db)
+    assert store.tasks == fresh.tasks
+    assert store.order == fresh.order
+    assert store.get_task_stats() == store.db.get_task_stats()
+
+
+def test_writes_compute_overdue_status(db):
+    store = TaskStore(db)
+    old = store.add_task("старая", "", PAST, "Работа")
+    new = store.add_task("новая", None, FUTURE, "Общие")
+    assert store.get_task(old).status == "Просрочено"
+    assert_store_matches_db(store)
+
+    store.update_task(new, "новая", "", PAST, "В процессе", "Личное")
+    store.update_task(old, "старая", "", FUTURE, "Просрочено", "Работа")
+    assert (store.get_task(new).status, store.get_task(old).status) == ("Просрочено", "Новая")
+    assert_store_matches_db(store)
+
+    store.set_status_bulk([old, new], "Новая")
+    assert_store_matches_db(store)
+    store.set_status_bulk([old, new], "Выполнено")
+    assert_store_matches_db(store)